@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import Header
+from core.errors import InvalidRequestError
+from core.scheduler import Priority
+
+
+def get_api_key(
+    authorization: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+) -> Optional[str]:
+    """The caller's API key, from `Authorization: Bearer <key>` or `X-API-Key`."""
+    if x_api_key:
+        return x_api_key
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return None
+
+
+def get_priority(x_priority: Optional[str] = Header(None)) -> Priority:
+    """Scheduling class from the `X-Priority` header: `interactive` (default) or `batch`."""
+    if not x_priority:
+        return Priority.INTERACTIVE
+    try:
+        return Priority[x_priority.strip().upper()]
+    except KeyError:
+        raise InvalidRequestError(
+            f"Invalid X-Priority '{x_priority}'; expected one of {[p.name.lower() for p in Priority]}"
+        )
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from config import settings
+from core.deadline import CANCELLATIONS, Deadline, current_deadline
+from core.errors import DeadlineExceededError, InvalidRequestError, LLMGatewayError
+from core.profiler import profiler
+from core.telemetry import ERRORS, HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, RequestTiming, count_error, current_timing
+from core.tracing import StageTrace, current_trace
+from core.usage import current_records, error_record, usage_tracker
+
+logger = logging.getLogger("llm_gateway")
+
+# Routes whose failures are recorded as usage, by the usage endpoint name they record under
+USAGE_ENDPOINTS = {"/api/v1/chat/completions": "chat", "/api/v1/embeddings": "embeddings"}
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every request: the HTTP latency histogram by route and
+    status, the in-flight gauge, and (through `core.telemetry.RequestTiming`) latency by
+    endpoint, provider and model, with gateway overhead split from upstream time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            ERRORS.labels("internal_error", 500).inc()
+            raise
+        finally:
+            current_timing.reset(token)
+            HTTP_IN_FLIGHT.dec()
+            elapsed = timing.finish()
+            HTTP_REQUEST_DURATION.labels(scope["method"], _route_template(scope), status_code).observe(elapsed)
+
+
+def _route_template(scope) -> str:
+    """
+    The matched route's full path template, e.g. `/api/v1/models/{model_id}`.
+
+    Routes in included routers only know their path relative to the router, so the
+    prefix is recovered from the request path; unmatched requests share one label.
+    """
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path_format"):
+        return "unmatched"
+    try:
+        rendered = route.path_format.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return route.path
+    path = scope["path"]
+    if rendered and path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + route.path
+    return route.path
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware giving each request a `core.tracing.StageTrace`.
+
+    The stage breakdown is sent in a `Server-Timing` header when the response starts
+    and, with `STAGE_TIMING_LOG_ENABLED`, logged with the stages as structured fields
+    once the response is complete. With `PROFILING_ENABLED` the request is also
+    sampled by `core.profiler.profiler`. Added innermost, so it runs in the handler's
+    task and a streamed response's stages cover the time to its first chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        server_timing, log = settings.SERVER_TIMING_ENABLED, settings.STAGE_TIMING_LOG_ENABLED
+        if scope["type"] != "http" or not (server_timing or log or profiler.enabled):
+            await self.app(scope, receive, send)
+            return
+
+        trace = StageTrace()
+        token = current_trace.set(trace)
+        profile = profiler.track(f"{scope['method']} {scope['path']}")
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total = trace.responded()
+                if server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", trace.server_timing(total))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started
+            if profile is not None:
+                profiler.finish(profile, elapsed)
+            if log:
+                stages = trace.fields()
+                logger.info(
+                    f"{scope['method']} {scope['path']} {status_code} {elapsed * 1000:.1f}ms "
+                    + " ".join(f"{name}={ms}" for name, ms in stages.items()),
+                    extra={"path": scope["path"], "status_code": status_code,
+                           "duration_ms": round(elapsed * 1000, 3), "stages": stages}
+                )
+
+
+class UsageMiddleware:
+    """
+    Pure ASGI middleware that finishes the usage records made while handling a request.
+
+    Routers attach records with `core.usage.record_usage`; once the response (including a
+    streamed body) has been sent, they get the request latency and status code and are
+    queued on the tracker's ring buffer. Chat and embedding requests that fail before a
+    record was made get a zero-token one, so errors show up in usage. Nothing is written
+    on the response path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not usage_tracker.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        records = []
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = current_records.set(records)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_records.reset(token)
+            endpoint = USAGE_ENDPOINTS.get(_route_template(scope))
+            if status_code >= 400 and not records and endpoint is not None:
+                records.append(error_record(endpoint, current_timing.get()))
+            latency_ms = (time.perf_counter() - started) * 1000
+            for record in records:
+                record.latency_ms = latency_ms
+                record.status_code = status_code
+                usage_tracker.push(record)
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware that stops work nobody will read.
+
+    Each request gets a `core.deadline.Deadline` from the `X-Request-Timeout` header
+    (seconds, capped at `REQUEST_TIMEOUT_MAX_SECONDS`) or the default timeout, which
+    routers narrow per model. The handler runs in its own task, cancelled when the
+    deadline passes or the client disconnects; the cancellation reaches the upstream
+    call, closing its connection and freeing its scheduler slot. A request that times
+    out before its response started gets a 504; once the response is complete
+    (background tasks included) nothing is cancelled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            deadline = _request_deadline(scope)
+        except LLMGatewayError as e:
+            await _send_error(send, e)
+            return
+
+        body_received = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_started = response_complete = False
+        reason: Optional[str] = None
+
+        async def receive_wrapper():
+            if body_received.is_set():
+                # The watcher owns the real channel now; the app only ever hears about the disconnect
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_received.set()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        def cancel(why: str) -> None:
+            nonlocal reason
+            if reason is None and not response_complete and not handler.done():
+                reason = why
+                CANCELLATIONS.labels(why, "streaming" if response_started else "before_response").inc()
+                handler.cancel()
+
+        async def watch_disconnect():
+            await body_received.wait()
+            while not disconnected.is_set():
+                if (await receive())["type"] == "http.disconnect":
+                    disconnected.set()
+            cancel("client_disconnect")
+
+        token = current_deadline.set(deadline)
+        try:
+            handler = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        finally:
+            current_deadline.reset(token)
+        deadline.arm(lambda: cancel("deadline"))
+        watchers = [asyncio.ensure_future(watch_disconnect())]
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if reason is None:
+                raise
+            if reason == "deadline":
+                if not response_started:
+                    await _send_error(send, DeadlineExceededError(
+                        "The request did not complete before its deadline",
+                        {"timeout": round(deadline.at - deadline.started, 3)}
+                    ))
+                else:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            deadline.disarm()
+            for watcher in watchers:
+                watcher.cancel()
+            if not handler.done():
+                handler.cancel()
+            await asyncio.gather(handler, *watchers, return_exceptions=True)
+
+
+def _request_deadline(scope) -> Deadline:
+    for name, value in scope["headers"]:
+        if name == b"x-request-timeout":
+            try:
+                timeout = float(value)
+            except ValueError:
+                timeout = 0
+            if timeout <= 0:
+                raise InvalidRequestError(
+                    f"Invalid X-Request-Timeout '{value.decode(errors='replace')}'; expected a positive number of seconds"
+                )
+            if settings.REQUEST_TIMEOUT_MAX_SECONDS:
+                timeout = min(timeout, settings.REQUEST_TIMEOUT_MAX_SECONDS)
+            return Deadline(timeout, explicit=True)
+    return Deadline(settings.REQUEST_TIMEOUT_SECONDS)
+
+
+async def _send_error(send, error: LLMGatewayError) -> None:
+    count_error(error)
+    body = json.dumps(error.to_dict()).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    headers += [(k.lower().encode(), v.encode()) for k, v in (error.headers or {}).items()]
+    await send({"type": "http.response.start", "status": error.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body, "more_body": False})
@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from core.cache import response_cache
+from core.embedding_cache import embedding_cache
+from core.semantic_cache import semantic_cache
+from core.tracing import TracedRoute
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("/stats")
+async def get_cache_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "embedding_cache": embedding_cache.stats()
+    }
+
+@router.delete("")
+async def clear_cache():
+    response_cache.clear()
+    semantic_cache.clear()
+    embedding_cache.clear()
+    return {"cleared": True}
@@ -1,24 +1,271 @@
-from fastapi import APIRouter, Body, HTTPException, BackgroundTasks, Depends
-from core.models import ChatCompletionRequest, ChatCompletionResponse
+import json
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Body, BackgroundTasks, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from api.dependencies import get_api_key, get_priority
+from core.cache import is_cacheable, is_deterministic, response_cache
+from core.context import fit_context
+from core.errors import LLMGatewayError
+from core.deadline import apply_model_deadline, current_deadline
+from core.rate_limit import Reservation, rate_limiter
+from core.scheduler import Priority, scheduler
+from core.models import ChatCompletionChunk, ChatCompletionRequest, ChatCompletionResponse, Role, TextEmbeddingRequest, Usage
+from core.semantic_cache import normalize_prompt, semantic_cache
+from core.serialization import dumps, model_response
+from core.singleflight import chat_flights
+from core.streaming import DuplexStreamingResponse, buffered, prime, split_lines, sse_events
+from core.telemetry import (
+    STREAM_TOKENS_PER_SECOND, STREAM_TTFT, UNKNOWN_LABEL, label_request, mark_streaming, since_request_start
+)
+from core.tokenizer import token_counter
+from core.tracing import TracedRoute, stage
+from core.usage import record_usage
+from core.utils import calculate_cache_key
 from services import service_factory
+from services.base import BaseLLMService
+from services.batch import batch_runner
+from services.health import health_monitor
+from services.hedging import hedger
+from services.model_catalog import model_catalog
+from services.resilience import resilient
 from config import settings
 
-router = APIRouter()
+logger = logging.getLogger("llm_gateway")
+
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("/completions", response_model=ChatCompletionResponse)
-async def create_chat_completion(request: ChatCompletionRequest = Body(...)):
-    # Use provider in request or default provider from configuration.
+async def create_chat_completion(
+    http_response: Response,
+    background_tasks: BackgroundTasks,
+    request: ChatCompletionRequest = Body(...),
+    api_key: Optional[str] = Depends(get_api_key),
+    priority: Priority = Depends(get_priority)
+):
+    # Use provider in request; otherwise the default provider from configuration or, with latency
+    # routing, the healthiest and fastest provider serving an equivalent model.
     provider_name = request.provider or settings.DEFAULT_PROVIDER.lower()
+    if request.provider is None and settings.LATENCY_ROUTING_ENABLED:
+        provider_name, model = health_monitor.route(request.model, provider_name)
+        if model != request.model:
+            request = request.model_copy(update={"model": model})
+    # Per-model default deadline, unless the client sent X-Request-Timeout
+    apply_model_deadline(request.model)
 
-    # Retrieve the appropriate service adapter from the factory.
+    # Retrieve the cached service adapter from the registry (raises if unavailable).
     service = service_factory.get_service(provider_name)
-    if not service:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Provider '{provider_name}' not available."
-        )
-
-    # Call the service method to get the chat completion.
-    response = await service.get_chat_completion(request)
-   
+    provider = service.provider.value
+    # Labelled now so failures are attributed; success re-labels with the provider that served it.
+    # The model is only used as a label once the catalogue lists it, so clients can't mint series.
+    label_request("chat", provider, UNKNOWN_LABEL)
+    if settings.VALIDATE_MODELS:
+        model_catalog.validate(provider, request.model)
+    if model_catalog.lookup(provider, request.model) is not None:
+        label_request("chat", provider, request.model)
+
+    # Reject or trim conversations that cannot fit the model's context before going upstream.
+    request, trimmed_tokens = fit_context(
+        request,
+        model_catalog.max_tokens(provider, request.model),
+        settings.CONTEXT_POLICY,
+        settings.CONTEXT_KEEP_LAST_TURNS
+    )
+
+    # Charge the caller's and the provider's limits with the estimated tokens (raises 429 when exhausted).
+    reservation = rate_limiter.acquire(
+        request.user, api_key, provider,
+        token_counter.count_messages(request.messages, request.model) + (request.max_tokens or 0)
+    )
+    try:
+        if request.stream:
+            mark_streaming()
+            # Relay chunks as they arrive; wait for the first one so upstream errors keep their status code
+            # and can still be retried or failed over.
+            async def open_stream(svc: BaseLLMService, req: ChatCompletionRequest):
+                upstream = scheduler.stream(svc.provider.value, priority, lambda: svc.stream_chat_completion(req))
+                # The stream's upstream stage is the wait for its first chunk
+                with stage("upstream"):
+                    return await prime(buffered(upstream, settings.STREAM_BUFFER_SIZE))
+
+            chunks, served_by = await resilient.call(service, request, open_stream)
+            return _with_gateway_headers(StreamingResponse(
+                sse_events(_metered(chunks, served_by, request, reservation)),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                         "X-Provider": served_by.provider.value}
+            ), reservation, trimmed_tokens)
+
+        cache_key = semantic_scope = prompt_vector = None
+        if is_cacheable(request):
+            # Exact and semantic cache lookups, including embedding the prompt
+            with stage("cache"):
+                if settings.ENABLE_CACHE:
+                    cache_key = calculate_cache_key(provider, service.convert_request(request))
+                    cached = await response_cache.get(cache_key)
+                    if cached is not None:
+                        # Cached payloads were validated when stored, so they are returned as-is.
+                        _record(service, request, reservation, None, "exact_hit")
+                        return _with_gateway_headers(
+                            _cached_response(cached, "exact"), reservation, trimmed_tokens
+                        )
+
+                if settings.SEMANTIC_CACHE_ENABLED:
+                    semantic_scope = _semantic_scope(service, request)
+                    if semantic_scope is not None:
+                        prompt_vector = await _embed_prompt(request.messages[-1].content)
+                    if prompt_vector is not None:
+                        match = semantic_cache.lookup(semantic_scope, prompt_vector)
+                        if match is not None:
+                            similarity, cached = match
+                            _record(service, request, reservation, None, "semantic_hit")
+                            return _with_gateway_headers(
+                                _cached_response(cached, "semantic", {"X-Cache-Similarity": f"{similarity:.4f}"}),
+                                reservation, trimmed_tokens
+                            )
+
+        # Call the service method once a provider slot is free, with retries and failover; identical
+        # deterministic requests already in flight share that call instead of making their own.
+        def call_upstream():
+            def attempt(svc: BaseLLMService, req: ChatCompletionRequest):
+                return scheduler.run(svc.provider.value, priority, lambda: svc.get_chat_completion(req))
+            # Requests safe to send twice get a hedged second attempt when the first is slow
+            if hedger.eligible(request):
+                return hedger.call(service, request, attempt)
+            return resilient.call(service, request, attempt)
+
+        if settings.SINGLE_FLIGHT_ENABLED and is_deterministic(request):
+            flight_key = cache_key or calculate_cache_key(provider, service.convert_request(request))
+            response, served_by = await chat_flights.do(flight_key, call_upstream, label=provider)
+        else:
+            response, served_by = await call_upstream()
+        http_response.headers["X-Provider"] = served_by.provider.value
+
+        # Encoded once: the payload stored in the caches is also the response body
+        payload = None
+        if cache_key is not None or prompt_vector is not None:
+            payload = dumps(response)
+            if cache_key is not None:
+                response_cache.set(cache_key, payload)
+                background_tasks.add_task(response_cache.persist, cache_key, payload)
+            if prompt_vector is not None:
+                semantic_cache.add(semantic_scope, prompt_vector, payload)
+            http_response.headers["X-Cache"] = "MISS"
+
+        cache_status = "miss" if cache_key is not None or prompt_vector is not None else "bypass"
+        _record(served_by, request, reservation, response.usage, cache_status)
+        _with_gateway_headers(http_response, reservation, trimmed_tokens)
+        return model_response(payload if payload is not None else response, http_response)
+    except BaseException:
+        # Failed, shed or cancelled before anything was served: give the token estimate back
+        reservation.settle(0)
+        raise
+
+
+@router.post("/batch")
+async def create_chat_batch(http_request: Request, api_key: Optional[str] = Depends(get_api_key)):
+    """
+    Run a JSONL stream of chat completion requests, each with an `id`, and stream the
+    results back as JSONL in completion order. The request body is read as results
+    are sent, so neither side is ever held in memory whole.
+    """
+    # The batch as a whole gets its own deadline; each record is bounded by its model's
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.apply_default(settings.BATCH_REQUEST_TIMEOUT_SECONDS)
+
+    lines = split_lines(http_request.stream(), settings.BATCH_MAX_LINE_BYTES)
+    results = batch_runner.run(lines, api_key=api_key)
+    return DuplexStreamingResponse(_jsonl(results), media_type="application/x-ndjson")
+
+
+async def _jsonl(results: AsyncIterator[dict]) -> AsyncIterator[str]:
+    try:
+        async for result in results:
+            yield json.dumps(result) + "\n"
+    except LLMGatewayError as e:
+        # The response has started, so a failure reading the input can only be reported in-band
+        yield json.dumps({"id": None, "status": e.status_code, "error": e.to_dict()}) + "\n"
+
+
+def _record(
+    service: BaseLLMService,
+    request: ChatCompletionRequest,
+    reservation: Reservation,
+    usage: Optional[Usage],
+    cache: str
+) -> None:
+    reservation.settle(usage.total_tokens if usage else 0)
+    record_usage("chat", service.provider.value, request.model, usage, request.user, cache)
+
+
+async def _metered(
+    chunks: AsyncIterator[ChatCompletionChunk],
+    service: BaseLLMService,
+    request: ChatCompletionRequest,
+    reservation: Reservation
+) -> AsyncIterator[ChatCompletionChunk]:
+    """Relay a stream and record its usage, estimated with the tokenizer, TTFT and throughput once it ends."""
+    parts = []
+    first_chunk_at = None
+    provider = service.provider.value
+    try:
+        async for chunk in chunks:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+                ttft = since_request_start()
+                if ttft is not None:
+                    STREAM_TTFT.labels(provider, request.model).observe(ttft)
+            parts.extend(choice.delta.content for choice in chunk.choices if choice.delta.content)
+            yield chunk
+    finally:
+        prompt_tokens = token_counter.count_messages(request.messages, request.model)
+        completion_tokens = token_counter.count("".join(parts), request.model)
+        usage = Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                      total_tokens=prompt_tokens + completion_tokens)
+        _record(service, request, reservation, usage, "bypass")
+        if first_chunk_at is not None and completion_tokens:
+            generating = time.perf_counter() - first_chunk_at
+            if generating > 0:
+                STREAM_TOKENS_PER_SECOND.labels(provider, request.model).observe(completion_tokens / generating)
+
+
+def _with_gateway_headers(response: Response, reservation: Reservation, trimmed_tokens: int) -> Response:
+    """Rate limit and context trimming headers, written only once a response is actually served."""
+    reservation.write_headers(response.headers)
+    if trimmed_tokens:
+        response.headers["X-Context-Trimmed-Tokens"] = str(trimmed_tokens)
     return response
+
+
+def _cached_response(payload: bytes, layer: str, headers: Optional[dict] = None) -> Response:
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"X-Cache": "HIT", "X-Cache-Layer": layer, **(headers or {})}
+    )
+
+
+def _semantic_scope(service: BaseLLMService, request: ChatCompletionRequest) -> Optional[str]:
+    """Everything but the final user message must match exactly for a semantic hit."""
+    if not request.messages or request.messages[-1].role != Role.USER:
+        return None
+    request_data = service.convert_request(request)
+    request_data["messages"] = request_data["messages"][:-1]
+    return calculate_cache_key(service.provider.value, request_data)
+
+
+async def _embed_prompt(text: str) -> Optional[List[float]]:
+    try:
+        embedder = service_factory.get_service(settings.SEMANTIC_CACHE_EMBEDDING_PROVIDER)
+        result = await embedder.get_embeddings(TextEmbeddingRequest(
+            model=settings.SEMANTIC_CACHE_EMBEDDING_MODEL,
+            input=normalize_prompt(text),
+            dimensions=settings.SEMANTIC_CACHE_EMBEDDING_DIMENSIONS
+        ))
+        return result.data[0].embedding
+    except Exception as e:
+        # The semantic cache is best-effort: never fail a completion because embedding failed
+        logger.warning(f"Semantic cache embedding failed: {e}")
+        return None
@@ -1,20 +1,117 @@
-from fastapi import APIRouter, Body, HTTPException
-from core.models import TextEmbeddingRequest, TextEmbeddingResponse
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Response
+from api.dependencies import get_api_key, get_priority
+from core.batching import embedding_batcher
+from core.deadline import apply_model_deadline
+from core.embedding_cache import embedding_cache
+from core.models import TextEmbeddingRequest, TextEmbeddingResponse, Usage
+from core.rate_limit import rate_limiter
+from core.scheduler import Priority, scheduler
+from core.serialization import model_response
+from core.tokenizer import token_counter
+from core.telemetry import UNKNOWN_LABEL, label_request
+from core.tracing import TracedRoute, stage
+from core.usage import record_usage
 from services import service_factory
+from services.base import BaseLLMService
+from services.model_catalog import model_catalog
+from services.resilience import resilient
 from config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.post("", response_model=TextEmbeddingResponse)
-async def create_text_embedding(request: TextEmbeddingRequest = Body(...)):
+async def create_text_embedding(
+    http_response: Response,
+    background_tasks: BackgroundTasks,
+    request: TextEmbeddingRequest = Body(...),
+    api_key: Optional[str] = Depends(get_api_key),
+    priority: Priority = Depends(get_priority)
+):
     provider_name = request.provider or settings.DEFAULT_PROVIDER.lower()
     service = service_factory.get_service(provider_name)
+    # The model is only used as a label once the catalogue lists it, so clients can't mint series
+    label_request("embeddings", service.provider.value, UNKNOWN_LABEL)
+    if settings.VALIDATE_MODELS:
+        model_catalog.validate(service.provider.value, request.model)
+    if model_catalog.lookup(service.provider.value, request.model) is not None:
+        label_request("embeddings", service.provider.value, request.model)
+    apply_model_deadline(request.model)
 
-    if not service:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Provider '{provider_name}' not available."
-        )
-    
-    response = await service.get_embeddings(request)
+    inputs = [request.input] if isinstance(request.input, str) else request.input
+    reservation = rate_limiter.acquire(
+        request.user, api_key, service.provider.value, sum(token_counter.count_many(inputs, request.model))
+    )
+    reservation.write_headers(http_response.headers)
+
+    try:
+        if settings.ENABLE_EMBEDDING_CACHE:
+            response = await _get_embeddings_cached(service, request, priority, http_response, background_tasks)
+            reservation.settle(response.usage.total_tokens)
+            return model_response(response, http_response)
+
+        response = await _fetch_embeddings(service, request, priority)
+    except BaseException:
+        # Failed, shed or cancelled before anything was served: give the token estimate back
+        reservation.settle(0)
+        raise
+    reservation.settle(response.usage.total_tokens)
+    record_usage("embeddings", service.provider.value, request.model, response.usage, request.user)
+    return model_response(response, http_response)
+
+
+async def _fetch_embeddings(
+    service: BaseLLMService,
+    request: TextEmbeddingRequest,
+    priority: Priority
+) -> TextEmbeddingResponse:
+    """
+    Call the provider once a slot is free, or through the micro-batcher when batching is enabled.
+    Failures are retried but never failed over: other providers' vectors live in another space.
+    """
+    if settings.EMBEDDING_BATCHING_ENABLED:
+        return await embedding_batcher.submit(service, request, priority)
+    response, _ = await resilient.call(service, request, lambda svc, req: scheduler.run(
+        svc.provider.value, priority, lambda: svc.get_embeddings(req)
+    ), failover=False)
     return response
+
+
+async def _get_embeddings_cached(
+    service: BaseLLMService,
+    request: TextEmbeddingRequest,
+    priority: Priority,
+    http_response: Response,
+    background_tasks: BackgroundTasks
+) -> TextEmbeddingResponse:
+    """Serve cached inputs locally and fetch only the distinct misses in one upstream call."""
+    inputs = [request.input] if isinstance(request.input, str) else request.input
+    scope = (service.provider.value, request.model, request.dimensions)
+    with stage("cache"):
+        vectors = embedding_cache.get_many(scope, inputs)
+    hits = sum(1 for vector in vectors if vector is not None)
+
+    # Dict keys dedupe repeated strings while keeping first-seen order
+    misses = list(dict.fromkeys(text for text, vector in zip(inputs, vectors) if vector is None))
+    response_id, model = "embedding-cache", request.model
+    usage = Usage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+    if misses:
+        upstream = await _fetch_embeddings(service, request.model_copy(update={"input": misses}), priority)
+        fetched = [item.embedding for item in sorted(upstream.data, key=lambda item: item.index)]
+        embedding_cache.set_many(scope, misses, fetched)
+        background_tasks.add_task(embedding_cache.persist_many, scope, misses, fetched)
+        by_text = dict(zip(misses, fetched))
+        vectors = [vector if vector is not None else by_text[text] for text, vector in zip(inputs, vectors)]
+        response_id, model, usage = upstream.id, upstream.model, upstream.usage
+
+    http_response.headers["X-Cache-Hits"] = str(hits)
+    http_response.headers["X-Cache-Misses"] = str(len(misses))
+    cache = "miss" if not hits else "partial_hit" if misses else "hit"
+    record_usage("embeddings", service.provider.value, request.model, usage, request.user, cache)
+    return TextEmbeddingResponse.from_vectors(
+        id=response_id,
+        model=model,
+        vectors=vectors,
+        usage=usage,
+        provider=service.provider
+    )
@@ -1,32 +1,25 @@
 from fastapi import APIRouter, HTTPException
 from core.models import ModelInfo
+from core.tracing import TracedRoute
 from services import service_factory
+from services.model_catalog import model_catalog
 from config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 @router.get("", response_model=list[ModelInfo])
 async def list_models(provider: str = None):
     provider_name = provider or settings.DEFAULT_PROVIDER.lower()
     service = service_factory.get_service(provider_name)
-    if not service:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Provider '{provider_name}' not available."
-        )
-    models = await service.list_models()
+    # Served from the in-memory catalogue, which is refreshed in the background
+    models = await model_catalog.list_models(service.provider.value)
     return models
 
 @router.get("/{model_id}", response_model=ModelInfo)
 async def get_model_info(model_id: str, provider: str = None):
     provider_name = provider or settings.DEFAULT_PROVIDER.lower()
     service = service_factory.get_service(provider_name)
-    if not service:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Provider '{provider_name}' not available."
-        )
-    model_info = await service.get_model_info(model_id)
+    model_info = await model_catalog.get_model(service.provider.value, model_id)
     if not model_info:
         raise HTTPException(status_code=404, detail="Model not found")
     return model_info
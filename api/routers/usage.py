@@ -0,0 +1,33 @@
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, Query
+from core.tracing import TracedRoute
+from core.usage import ROLLUP_FIELDS, usage_tracker
+
+router = APIRouter(route_class=TracedRoute)
+
+@router.get("")
+async def get_usage(
+    start: Optional[datetime] = Query(None, description="Start of the window (default: one hour before end)"),
+    end: Optional[datetime] = Query(None, description="End of the window (default: now)"),
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    user: Optional[str] = None,
+    endpoint: Optional[str] = None
+):
+    """Per-minute token usage rollups and their totals over a time window."""
+    end_ts = end.timestamp() if end else time.time()
+    start_ts = start.timestamp() if start else end_ts - 3600
+    rows = await usage_tracker.query(start_ts, end_ts, provider=provider, model=model, user=user, endpoint=endpoint)
+
+    totals = {field: sum(row[field] for row in rows) for field in ROLLUP_FIELDS}
+    for row in rows:
+        row["minute"] = datetime.fromtimestamp(row["minute"], timezone.utc).isoformat()
+    return {
+        "start": datetime.fromtimestamp(start_ts, timezone.utc).isoformat(),
+        "end": datetime.fromtimestamp(end_ts, timezone.utc).isoformat(),
+        "totals": totals,
+        "rollups": rows,
+        "pipeline": usage_tracker.stats()
+    }
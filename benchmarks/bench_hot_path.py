@@ -0,0 +1,326 @@
+"""
+Per-request CPU cost of the gateway's hot-path code, one component at a time.
+
+Each case is timed in-process with no I/O: the best of `--repeat` runs of as many
+calls as fit in `--min-time` seconds, reported per call. Cases cover request
+validation, provider request/response conversion, embedding response construction,
+cache keys, token counting, and response serialization as the routers do it
+(`model_response`), next to the way FastAPI does it for a returned model
+(`fastapi_response_model/*`: validate it again against `response_model`, then dump it).
+
+    python -m benchmarks.bench_hot_path                     # run and print
+    python -m benchmarks.bench_hot_path -k embedding        # only cases matching "embedding"
+    python -m benchmarks.bench_hot_path --save              # append to the history, tagged with the commit
+    python -m benchmarks.bench_hot_path --compare           # fail if slower than the last saved run
+
+Results are tracked per commit in `--history` (JSONL, one run per line). `--compare`
+checks against the latest saved run of another commit (or `--compare <commit>`) and
+exits 1 if any case is slower by more than `--threshold`.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from core.models import ChatCompletionRequest, Provider, TextEmbeddingResponse, Usage
+from core.serialization import loads, model_response
+from core.tokenizer import TokenCounter
+from core.utils import calculate_cache_key
+
+DEFAULT_HISTORY = os.path.join(".benchmarks", "hot_path.jsonl")
+
+WORDS = "the gateway spends its time in validation serialization and hashing rather than on the network".split()
+
+
+def _text(words: int, seed: int = 0) -> str:
+    return " ".join(WORDS[(seed + i * 7) % len(WORDS)] for i in range(words))
+
+
+def _conversation(messages: int, words: int) -> Dict[str, Any]:
+    roles = ("user", "assistant")
+    return {
+        "model": "gpt-4o-mini",
+        "temperature": 0,
+        "messages": [{"role": "system", "content": _text(words)}]
+        + [{"role": roles[i % 2], "content": _text(words, seed=i)} for i in range(messages - 1)],
+    }
+
+
+def _chat_payload(words: int) -> Dict[str, Any]:
+    """An OpenAI chat completion body, as decoded from the upstream response."""
+    return {
+        "id": "chatcmpl-bench", "object": "chat.completion", "created": 1, "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": _text(words)}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 50, "completion_tokens": words, "total_tokens": 50 + words},
+    }
+
+
+def _embedding_payload(dimensions: int, batch: int) -> Dict[str, Any]:
+    """An OpenAI embeddings body, as decoded from the upstream response."""
+    vector = [((i * 37) % 1000) / 1000.0 - 0.5 for i in range(dimensions)]
+    return {
+        "object": "list", "model": "text-embedding-3-large",
+        "data": [{"object": "embedding", "index": i, "embedding": list(vector)} for i in range(batch)],
+        "usage": {"prompt_tokens": batch * 8, "total_tokens": batch * 8},
+    }
+
+
+def _openai_service():
+    from services.openai_service import OpenAIService
+
+    # No calls are made: any key will do, and it is only set while the service is built
+    if os.environ.get("OPENAI_API_KEY"):
+        return OpenAIService()
+    os.environ["OPENAI_API_KEY"] = "bench"
+    try:
+        return OpenAIService()
+    finally:
+        del os.environ["OPENAI_API_KEY"]
+
+
+def _response_field(endpoint_name: str):
+    """The `response_model` field FastAPI validates and serializes an endpoint's return value with."""
+    from api.routers import chat, embeddings
+
+    for route in chat.router.routes + embeddings.router.routes:
+        if getattr(route, "name", None) == endpoint_name:
+            return route.response_field
+    raise LookupError(endpoint_name)
+
+
+def _fastapi_response(endpoint_name: str, response) -> Callable[[], bytes]:
+    field = _response_field(endpoint_name)
+
+    def run() -> bytes:
+        value, errors = field.validate(response, {}, loc=("response",))
+        return field.serialize_json(value, by_alias=True)
+    return run
+
+
+def build_cases(embedding_batch: int) -> List[Tuple[str, Callable[[], Callable[[], Any]]]]:
+    """(name, setup) pairs; setup builds the inputs and returns the call to time."""
+    service = _openai_service
+
+    def validate(conversation):
+        return lambda: (lambda: ChatCompletionRequest.model_validate(conversation))
+
+    def convert_request(conversation):
+        def setup():
+            svc, request = service(), ChatCompletionRequest.model_validate(conversation)
+            return lambda: svc.convert_request(request)
+        return setup
+
+    def cache_key(conversation):
+        def setup():
+            svc, request = service(), ChatCompletionRequest.model_validate(conversation)
+            return lambda: calculate_cache_key("openai", svc.convert_request(request))
+        return setup
+
+    def convert_chat(words):
+        def setup():
+            svc, payload = service(), _chat_payload(words)
+            return lambda: svc.convert_response(payload, request_type="chat")
+        return setup
+
+    def convert_embeddings(dimensions):
+        def setup():
+            svc, payload = service(), _embedding_payload(dimensions, embedding_batch)
+            return lambda: svc.convert_response(payload, request_type="embedding")
+        return setup
+
+    def decode_embeddings(dimensions):
+        def setup():
+            body = json.dumps(_embedding_payload(dimensions, embedding_batch)).encode()
+            return lambda: loads(body)
+        return setup
+
+    def embedding_response(dimensions):
+        def setup():
+            payload = _embedding_payload(dimensions, embedding_batch)
+            vectors = [item["embedding"] for item in payload["data"]]
+            usage = Usage(**payload["usage"], completion_tokens=0)
+            return lambda: TextEmbeddingResponse.from_vectors(id="emb-bench", model=payload["model"],
+                                                              vectors=vectors, usage=usage, provider=Provider.OPENAI)
+        return setup
+
+    def count_tokens(conversation, cached):
+        def setup():
+            counter = TokenCounter(settings.TOKENIZER_VOCAB_DIR, settings.TOKENIZER_CACHE_SIZE if cached else 0)
+            request = ChatCompletionRequest.model_validate(conversation)
+            counter.count_messages(request.messages, request.model)
+            return lambda: counter.count_messages(request.messages, request.model)
+        return setup
+
+    def chat_response(words):
+        return service().convert_response(_chat_payload(words), "chat")
+
+    def embeddings_response(dimensions):
+        return service().convert_response(_embedding_payload(dimensions, embedding_batch), "embedding")
+
+    def serialize(build):
+        def setup():
+            response = build()
+            return lambda: model_response(response).body
+        return setup
+
+    def fastapi_serialize(endpoint_name, build):
+        return lambda: _fastapi_response(endpoint_name, build())
+
+    def dump_json(build):
+        def setup():
+            response = build()
+            return lambda: response.model_dump_json()
+        return setup
+
+    small, large = _conversation(2, 20), _conversation(500, 150)
+    batch = embedding_batch
+    return [
+        ("request_validate/small", validate(small)),
+        ("request_validate/500_messages", validate(large)),
+        ("openai_convert_request/small", convert_request(small)),
+        ("openai_convert_request/500_messages", convert_request(large)),
+        ("cache_key/small", cache_key(small)),
+        ("cache_key/500_messages", cache_key(large)),
+        ("count_tokens/small", count_tokens(small, cached=True)),
+        ("count_tokens/500_messages", count_tokens(large, cached=True)),
+        ("count_tokens/500_messages_uncached", count_tokens(large, cached=False)),
+        ("openai_convert_response/chat", convert_chat(200)),
+        (f"openai_convert_response/embeddings_1536x{batch}", convert_embeddings(1536)),
+        (f"openai_convert_response/embeddings_3072x{batch}", convert_embeddings(3072)),
+        (f"upstream_json_decode/embeddings_1536x{batch}", decode_embeddings(1536)),
+        (f"embedding_response/1536x{batch}", embedding_response(1536)),
+        (f"embedding_response/3072x{batch}", embedding_response(3072)),
+        ("response_serialize/chat", serialize(lambda: chat_response(200))),
+        (f"response_serialize/embeddings_1536x{batch}", serialize(lambda: embeddings_response(1536))),
+        (f"response_serialize/embeddings_3072x{batch}", serialize(lambda: embeddings_response(3072))),
+        ("fastapi_response_model/chat", fastapi_serialize("create_chat_completion", lambda: chat_response(200))),
+        (f"fastapi_response_model/embeddings_1536x{batch}",
+         fastapi_serialize("create_text_embedding", lambda: embeddings_response(1536))),
+        ("model_dump_json/chat", dump_json(lambda: chat_response(200))),
+        (f"model_dump_json/embeddings_1536x{batch}", dump_json(lambda: embeddings_response(1536))),
+    ]
+
+
+def measure(fn: Callable[[], Any], min_time: float, repeat: int) -> float:
+    """Seconds per call: the best of `repeat` runs, each of enough calls to last `min_time`."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def run_cases(pattern: Optional[str] = None, min_time: float = 0.2, repeat: int = 5,
+              embedding_batch: int = 128) -> Dict[str, float]:
+    """Nanoseconds per call for every case whose name matches `pattern`."""
+    results = {}
+    for name, setup in build_cases(embedding_batch):
+        if pattern and not re.search(pattern, name):
+            continue
+        results[name] = round(measure(setup(), min_time, repeat) * 1e9, 1)
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Cases slower than in `baseline` by more than `threshold` (relative), as messages."""
+    regressions = []
+    for name, ns in results.items():
+        previous = baseline.get(name)
+        if previous and (ns - previous) / previous > threshold:
+            regressions.append(f"{name}: {_format(previous)} -> {_format(ns)} ({(ns - previous) / previous:+.1%})")
+    return regressions
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def baseline_run(history: List[Dict[str, Any]], commit: Optional[str], current: Optional[str]) -> Optional[Dict[str, Any]]:
+    """The latest saved run of `commit` (a prefix is enough), or else of any commit other than `current`."""
+    for run in reversed(history):
+        if commit is not None:
+            if (run.get("commit") or "").startswith(commit):
+                return run
+        elif run.get("commit") != current:
+            return run
+    return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name matches this regex")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--embedding-batch", type=int, default=128, help="vectors per embedding response")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSONL file of saved runs")
+    parser.add_argument("--save", action="store_true", help="append this run to the history")
+    parser.add_argument("--compare", nargs="?", const="", metavar="COMMIT",
+                        help="compare with the latest saved run (of COMMIT, if given)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown per case (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    results = run_cases(args.pattern, args.min_time, args.repeat, args.embedding_batch)
+    width = max(map(len, results), default=0)
+    for name, ns in results.items():
+        print(f"{name:<{width}}  {_format(ns):>10}  {1e9 / ns:>12,.0f}/s")
+
+    if args.compare is not None:
+        run = baseline_run(load_history(args.history), args.compare or None, commit)
+        if run is None:
+            print(f"No saved run to compare with in {args.history}")
+        else:
+            regressions = compare(results, run["results"], args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            print(f"{len(regressions)} regressions against {(run.get('commit') or 'unknown')[:12]} "
+                  f"(threshold {args.threshold:.0%})")
+            if regressions:
+                sys.exit(1)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "commit": commit, "timestamp": int(time.time()), "python": platform.python_version(),
+                "machine": platform.machine(), "results": results,
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Semantic cache lookup latency at scale.
+
+Fills a VectorIndex with random unit vectors and measures top-1 lookup latency
+and recall for near-duplicate queries.
+
+    python -m benchmarks.bench_semantic_cache --entries 100000 --dim 256
+"""
+import argparse
+import time
+
+import numpy as np
+
+from core.semantic_cache import VectorIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--nlist", type=int, default=128)
+    parser.add_argument("--nprobe", type=int, default=4)
+    parser.add_argument("--noise", type=float, default=0.05, help="perturbation applied to queries")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.entries, args.dim)).astype(np.float32)
+    index = VectorIndex(args.dim, capacity=args.entries, nlist=args.nlist, nprobe=args.nprobe)
+
+    started = time.perf_counter()
+    for start in range(0, args.entries, 1000):
+        batch = vectors[start:start + 1000]
+        index.add_many(batch, list(range(start, start + len(batch))))
+    build_seconds = time.perf_counter() - started
+
+    targets = rng.integers(0, args.entries, args.queries)
+    latencies = []
+    found = 0
+    for target in targets:
+        query = vectors[target] / np.linalg.norm(vectors[target])
+        query = query + rng.standard_normal(args.dim).astype(np.float32) * args.noise / np.sqrt(args.dim)
+        started = time.perf_counter()
+        _, payload = index.search(query)
+        latencies.append(time.perf_counter() - started)
+        found += payload == target
+
+    latencies_us = np.array(latencies) * 1e6
+    print(f"entries={args.entries} dim={args.dim} nlist={args.nlist} nprobe={args.nprobe}")
+    print(f"build: {build_seconds:.2f}s")
+    print(f"lookup: p50={np.percentile(latencies_us, 50):.0f}us "
+          f"p99={np.percentile(latencies_us, 99):.0f}us mean={latencies_us.mean():.0f}us")
+    print(f"recall@1: {found / args.queries:.3f}")
+
+
+if __name__ == "__main__":
+    main()
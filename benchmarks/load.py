@@ -0,0 +1,336 @@
+"""
+End-to-end load generator for the gateway.
+
+Replays recorded requests against a running gateway, either at a fixed rate (`--qps`,
+open loop: requests are sent on schedule however slow the gateway gets) or with a
+fixed number in flight (`--concurrency`, closed loop), for `--duration` seconds.
+It reports throughput, latency, time to first token for streams, and gateway
+overhead for other requests. Overhead is the client-observed latency minus the
+`upstream` stage of the response's `Server-Timing` header.
+
+Traffic is JSONL, one request per line, cycled through in order. A line is either a
+chat completion body, an embeddings body (it has `input`), or
+`{"path": ..., "body": ..., "headers": {...}}`. Without a file, one short chat
+completion is sent over and over.
+
+    python -m benchmarks.load traffic.jsonl --url http://127.0.0.1:8000 --qps 50 --duration 30 -o result.json
+
+`--spawn` starts the mock providers (`benchmarks.mock_providers`) and a gateway
+pointed at them, so a run needs no keys and is reproducible. `--baseline` compares
+the result with an earlier one and exits 1 if anything regressed by more than
+`--tolerance`:
+
+    python -m benchmarks.load --spawn --concurrency 32 --duration 20 -o result.json --baseline baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+DEFAULT_CALL = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "Say hello!"}]}
+
+# (section, statistic, whether higher is better) compared against a baseline
+CHECKS = [
+    ("throughput_rps", None, True),
+    ("latency_ms", "p50", False),
+    ("latency_ms", "p95", False),
+    ("latency_ms", "p99", False),
+    ("ttft_ms", "p50", False),
+    ("ttft_ms", "p95", False),
+    ("overhead_ms", "p50", False),
+    ("overhead_ms", "p99", False),
+]
+# Error rates are compared as an absolute difference: relative change is meaningless near zero
+ERROR_RATE_TOLERANCE = 0.01
+
+
+class Call:
+    """One recorded request to replay."""
+    __slots__ = ("path", "body", "headers", "stream")
+
+    def __init__(self, path: str, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        self.path = path
+        self.body = body
+        self.headers = headers or {}
+        self.stream = bool(body.get("stream"))
+
+    @classmethod
+    def parse(cls, record: Dict[str, Any]) -> "Call":
+        if "path" in record:
+            return cls(record["path"], record.get("body") or {}, record.get("headers"))
+        if "input" in record:
+            return cls("/api/v1/embeddings", record)
+        return cls("/api/v1/chat/completions", record)
+
+
+class Sample:
+    __slots__ = ("status", "latency", "ttft", "overhead")
+
+    def __init__(self, status: int, latency: float, ttft: Optional[float] = None, overhead: Optional[float] = None):
+        self.status = status
+        self.latency = latency
+        self.ttft = ttft
+        self.overhead = overhead
+
+
+def load_traffic(path: Optional[str]) -> List[Call]:
+    if path is None:
+        return [Call.parse(DEFAULT_CALL)]
+    with open(path, encoding="utf-8") as f:
+        calls = [Call.parse(json.loads(line)) for line in f if line.strip()]
+    if not calls:
+        raise SystemExit(f"No requests in {path}")
+    return calls
+
+
+def upstream_seconds(server_timing: Optional[str]) -> Optional[float]:
+    """The `upstream` duration from a Server-Timing header, if it has one."""
+    for entry in (server_timing or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        if name == "upstream" and params.startswith("dur="):
+            return float(params[4:]) / 1000
+    return None
+
+
+async def send(client: httpx.AsyncClient, call: Call) -> Sample:
+    started = time.perf_counter()
+    try:
+        if call.stream:
+            ttft = None
+            async with client.stream("POST", call.path, json=call.body, headers=call.headers) as resp:
+                async for line in resp.aiter_lines():
+                    if ttft is None and line.startswith("data:"):
+                        ttft = time.perf_counter() - started
+            return Sample(resp.status_code, time.perf_counter() - started, ttft=ttft)
+        resp = await client.post(call.path, json=call.body, headers=call.headers)
+        latency = time.perf_counter() - started
+        upstream = upstream_seconds(resp.headers.get("server-timing"))
+        return Sample(resp.status_code, latency, overhead=None if upstream is None else max(0.0, latency - upstream))
+    except httpx.HTTPError:
+        # Status 0: the request never got a response (connection refused, reset, timed out)
+        return Sample(0, time.perf_counter() - started)
+
+
+async def run_fixed_rate(
+    client: httpx.AsyncClient, calls: List[Call], qps: float, duration: float, max_in_flight: int
+) -> Dict[str, Any]:
+    """Send `qps` requests a second on schedule; sends due while `max_in_flight` are outstanding are dropped."""
+    samples: List[Sample] = []
+    tasks = set()
+    dropped = 0
+    started = time.perf_counter()
+    for i in itertools.count():
+        if i / qps >= duration:
+            break
+        delay = started + i / qps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= max_in_flight:
+            dropped += 1
+            continue
+        task = asyncio.ensure_future(send(client, calls[i % len(calls)]))
+        tasks.add(task)
+        task.add_done_callback(lambda t: (tasks.discard(t), samples.append(t.result())))
+    if tasks:
+        await asyncio.gather(*tasks)
+    return summarize(samples, time.perf_counter() - started, {"mode": "qps", "qps": qps, "dropped": dropped})
+
+
+async def run_fixed_concurrency(
+    client: httpx.AsyncClient, calls: List[Call], concurrency: int, duration: float
+) -> Dict[str, Any]:
+    """Keep `concurrency` requests in flight, each worker sending its next as soon as one completes."""
+    samples: List[Sample] = []
+    counter = itertools.count()
+    started = time.perf_counter()
+
+    async def worker():
+        while time.perf_counter() - started < duration:
+            samples.append(await send(client, calls[next(counter) % len(calls)]))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started, {"mode": "concurrency", "concurrency": concurrency})
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99 (nearest rank), mean and max, in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+    return {
+        "p50": round(rank(0.50) * 1000, 3),
+        "p95": round(rank(0.95) * 1000, 3),
+        "p99": round(rank(0.99) * 1000, 3),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def summarize(samples: List[Sample], elapsed: float, load: Dict[str, Any]) -> Dict[str, Any]:
+    ok = [s for s in samples if 200 <= s.status < 300]
+    errors = Counter(str(s.status) for s in samples if not 200 <= s.status < 300)
+    return {
+        "load": load,
+        "duration_seconds": round(elapsed, 3),
+        "requests": len(samples),
+        "succeeded": len(ok),
+        "errors": dict(sorted(errors.items())),
+        "error_rate": round(1 - len(ok) / len(samples), 5) if samples else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": percentiles([s.latency for s in ok]),
+        "ttft_ms": percentiles([s.ttft for s in ok if s.ttft is not None]),
+        "overhead_ms": percentiles([s.overhead for s in ok if s.overhead is not None]),
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `result` against `baseline` beyond a relative `tolerance`, as messages."""
+    regressions = []
+    for section, stat, higher_is_better in CHECKS:
+        current, previous = result.get(section), baseline.get(section)
+        if stat is not None:
+            current = current.get(stat) if current else None
+            previous = previous.get(stat) if previous else None
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            name = f"{section}.{stat}" if stat else section
+            regressions.append(f"{name}: {previous} -> {current} ({change:+.1%})")
+    if result["error_rate"] > baseline.get("error_rate", 0.0) + ERROR_RATE_TOLERANCE:
+        regressions.append(f"error_rate: {baseline.get('error_rate', 0.0)} -> {result['error_rate']}")
+    return regressions
+
+
+def report(result: Dict[str, Any]) -> None:
+    print(f"requests:   {result['requests']} in {result['duration_seconds']}s, "
+          f"{result['succeeded']} succeeded, errors {result['errors'] or 'none'}")
+    print(f"throughput: {result['throughput_rps']} req/s")
+    for section in ("latency_ms", "ttft_ms", "overhead_ms"):
+        stats = result[section]
+        if stats:
+            print(f"{section + ':':<11} " + "  ".join(f"{name} {value:.2f}" for name, value in stats.items()))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+
+@contextmanager
+def spawned(args: argparse.Namespace) -> Iterator[str]:
+    """Run the mock providers and a gateway pointed at them; yields the gateway URL."""
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    gateway_url = f"http://127.0.0.1:{args.gateway_port}"
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": f"{mock_url}/v1",
+        "GOOGLE_API_BASE": f"{mock_url}/v1beta",
+        "OPENAI_API_KEY": "mock",
+        "GEMINI_API_KEY": "mock",
+    }
+    processes = []
+    try:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.mock_providers", "--port", str(args.mock_port),
+            "--latency", args.mock_latency, "--error-rate", str(args.mock_error_rate),
+            "--tokens-per-second", str(args.mock_tokens_per_second),
+        ]))
+        _wait_until_up(f"{mock_url}/v1/models", processes[-1])
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.gateway_port), "--log-level", "warning",
+        ], env=env))
+        _wait_until_up(f"{gateway_url}/health", processes[-1])
+        yield gateway_url
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def run(args: argparse.Namespace, url: str) -> Dict[str, Any]:
+    calls = load_traffic(args.traffic)
+    in_flight = args.concurrency or args.max_in_flight
+    limits = httpx.Limits(max_connections=in_flight, max_keepalive_connections=in_flight)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+        if args.concurrency:
+            return await run_fixed_concurrency(client, calls, args.concurrency, args.duration)
+        return await run_fixed_rate(client, calls, args.qps, args.duration, args.max_in_flight)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("traffic", nargs="?", help="JSONL file of recorded requests")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="gateway to load (ignored with --spawn)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--qps", type=float, default=20.0, help="fixed request rate (default)")
+    mode.add_argument("--concurrency", type=int, help="fixed number of requests in flight instead of a rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="with --qps, drop sends beyond this")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout")
+    parser.add_argument("-o", "--output", help="write the JSON result here")
+    parser.add_argument("--baseline", help="JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (0.10 = 10%%)")
+    parser.add_argument("--spawn", action="store_true", help="start mock providers and a gateway to load")
+    parser.add_argument("--gateway-port", type=int, default=8765)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--mock-latency", default="lognormal:0.3,0.5")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=100.0)
+    args = parser.parse_args()
+
+    if args.spawn:
+        with spawned(args) as url:
+            result = asyncio.run(run(args, url))
+    else:
+        result = asyncio.run(run(args, args.url))
+    result.update(commit=_git_commit(), timestamp=int(time.time()), traffic=args.traffic)
+    report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Local stand-ins for the OpenAI and Gemini APIs, for load tests without real keys.
+
+Serves the parts of both wire protocols the gateway uses, streaming included:
+OpenAI under `/v1` (chat completions, embeddings, models) and Gemini under `/v1beta`
+(generateContent, streamGenerateContent, models). Each call waits for a first-byte
+latency drawn from `--latency`, fails with one of `--error-statuses` at
+`--error-rate`, and generates `max_tokens` (or `--completion-tokens`) tokens at
+`--tokens-per-second`, streamed one token per chunk.
+
+    python -m benchmarks.mock_providers --port 9100 --latency lognormal:0.3,0.5 --error-rate 0.01
+
+then point the gateway at it:
+
+    OPENAI_API_BASE=http://127.0.0.1:9100/v1 GOOGLE_API_BASE=http://127.0.0.1:9100/v1beta \\
+    OPENAI_API_KEY=mock GEMINI_API_KEY=mock uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+WORDS = ("the quick brown fox jumps over a lazy dog while gateway benchmarks measure every token").split()
+OPENAI_MODELS = ("gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-4o-mini", "text-embedding-3-small", "text-embedding-3-large")
+
+
+class Latency:
+    """
+    A distribution of delays in seconds, from a spec such as `fixed:0.2`,
+    `uniform:0.1,0.4`, `normal:0.3,0.05`, `lognormal:0.3,0.5` (median, sigma) or
+    `exponential:0.3` (mean).
+    """
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",")] if params else []
+        samplers = {
+            "fixed": lambda: values[0],
+            "uniform": lambda: random.uniform(values[0], values[1]),
+            "normal": lambda: random.gauss(values[0], values[1]),
+            "lognormal": lambda: values[0] * random.lognormvariate(0, values[1]),
+            "exponential": lambda: random.expovariate(1 / values[0]),
+        }
+        if kind not in samplers:
+            raise ValueError(f"Unknown latency distribution {kind!r}; use one of {', '.join(samplers)}")
+        self.spec = spec
+        self._sample = samplers[kind]
+        self.sample()
+
+    def sample(self) -> float:
+        return max(0.0, self._sample())
+
+
+class MockBehaviour:
+    """How the mock providers respond: latency, failures and generation speed."""
+
+    def __init__(
+        self,
+        latency: Latency,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (500,),
+        tokens_per_second: float = 100.0,
+        completion_tokens: int = 32,
+        embedding_dimensions: int = 1536,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.embedding_dimensions = embedding_dimensions
+
+    def failure(self) -> Optional[int]:
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_statuses)
+        return None
+
+    def tokens(self, max_tokens: Optional[int]) -> List[str]:
+        count = max_tokens or self.completion_tokens
+        return [WORDS[i % len(WORDS)] + " " for i in range(count)]
+
+    async def generate(self, tokens: List[str]) -> AsyncIterator[str]:
+        """Yield tokens at the configured rate, on a schedule so sleep overshoot doesn't accumulate."""
+        started = time.perf_counter()
+        for i, token in enumerate(tokens):
+            delay = started + i / self.tokens_per_second - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield token
+
+
+def _prompt_tokens(texts: Sequence[str]) -> int:
+    return sum(len(text.split()) for text in texts) or 1
+
+
+def _error(status: int) -> Response:
+    headers = {"retry-after": "1"} if status == 429 else None
+    body = {"error": {"message": f"Mock provider failure ({status})", "type": "mock_error", "code": status}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def create_app(behaviour: MockBehaviour) -> FastAPI:
+    app = FastAPI(title="Mock LLM providers")
+
+    @app.get("/v1/models")
+    async def openai_models():
+        return {"object": "list", "data": [{"id": model, "object": "model"} for model in OPENAI_MODELS]}
+
+    @app.get("/v1/models/{model_id}")
+    async def openai_model(model_id: str):
+        return {"id": model_id, "object": "model"}
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        await asyncio.sleep(behaviour.latency.sample())
+        status = behaviour.failure()
+        if status is not None:
+            return _error(status)
+        model, created = body["model"], int(time.time())
+        completion_id = f"chatcmpl-mock-{random.getrandbits(48):012x}"
+        tokens = behaviour.tokens(body.get("max_tokens"))
+        prompt_tokens = _prompt_tokens([m.get("content") or "" for m in body["messages"]])
+
+        if body.get("stream"):
+            async def events():
+                first = True
+                async for token in behaviour.generate(tokens):
+                    delta = {"role": "assistant", "content": token} if first else {"content": token}
+                    first = False
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                done = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "length"}]}
+                yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        text = "".join([token async for token in behaviour.generate(tokens)])
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                      "total_tokens": prompt_tokens + len(tokens)},
+        }
+
+    @app.post("/v1/embeddings")
+    async def openai_embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(behaviour.latency.sample())
+        status = behaviour.failure()
+        if status is not None:
+            return _error(status)
+        inputs = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        dimensions = body.get("dimensions") or behaviour.embedding_dimensions
+        tokens = _prompt_tokens(inputs)
+        return {
+            "object": "list", "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": [((i + 1) % 7) / 7.0] * dimensions}
+                     for i in range(len(inputs))],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/v1beta/models")
+    async def gemini_models():
+        return {"models": [{"name": "models/gemini-2.0-flash-lite", "inputTokenLimit": 32768}]}
+
+    @app.post("/v1beta/models/{target}")
+    async def gemini_generate(target: str, request: Request):
+        model, _, method = target.partition(":")
+        if method not in ("generateContent", "streamGenerateContent"):
+            return JSONResponse({"error": {"message": f"Unknown method {method!r}"}}, status_code=404)
+        body = await request.json()
+        await asyncio.sleep(behaviour.latency.sample())
+        status = behaviour.failure()
+        if status is not None:
+            return _error(status)
+        tokens = behaviour.tokens(body.get("generationConfig", {}).get("maxOutputTokens"))
+        prompt_tokens = _prompt_tokens([part.get("text", "") for content in body["contents"]
+                                        for part in content["parts"]])
+
+        def candidate(text: str, finish_reason: Optional[str]) -> Dict[str, Any]:
+            result: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}}
+            if finish_reason:
+                result["finishReason"] = finish_reason
+            return result
+
+        if method == "streamGenerateContent":
+            async def events():
+                sent = 0
+                async for token in behaviour.generate(tokens):
+                    sent += 1
+                    finish = "MAX_TOKENS" if sent == len(tokens) else None
+                    yield f"data: {json.dumps({'candidates': [candidate(token, finish)]})}\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        text = "".join([token async for token in behaviour.generate(tokens)])
+        return {
+            "candidates": [candidate(text, "MAX_TOKENS")],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(tokens),
+                              "totalTokenCount": prompt_tokens + len(tokens)},
+            "modelVersion": model,
+        }
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:0.3,0.5", help="time to first byte distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-statuses", default="500,503,429", help="comma-separated statuses failures use")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=32, help="tokens generated when max_tokens is unset")
+    args = parser.parse_args()
+
+    behaviour = MockBehaviour(
+        latency=Latency(args.latency),
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",")],
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+    )
+    uvicorn.run(create_app(behaviour), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
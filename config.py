@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings
 from typing import Dict, List, Optional, Union
 import os
 from dotenv import load_dotenv
-from core.models import Provider
+from core.models import ContextPolicy, Provider
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -28,6 +28,143 @@ class Settings(BaseSettings):
     
     # Default provider
     DEFAULT_PROVIDER: Provider = Provider.OPENAI
+
+    # Upstream HTTP connection pools (one long-lived client per provider)
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_HTTP2: bool = True
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 60.0
+    HTTP_WRITE_TIMEOUT: float = 10.0
+    HTTP_POOL_TIMEOUT: float = 5.0
+    HTTP_PREWARM: bool = False
+    HTTP_PREWARM_CONNECTIONS: int = 2
+
+    # Streaming: max chunks read ahead of a slow client before upstream reads pause
+    STREAM_BUFFER_SIZE: int = 16
+
+    # Exact-match response cache for deterministic chat completions
+    ENABLE_CACHE: bool = False
+    CACHE_TTL_SECONDS: int = 3600
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_SQLITE_PATH: Optional[str] = None
+
+    # Semantic (near-duplicate) prompt cache, consulted after an exact cache miss
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_CAPACITY: int = 100000  # entries across all scopes
+    SEMANTIC_CACHE_MAX_SCOPES: int = 64
+    SEMANTIC_CACHE_NLIST: int = 128
+    SEMANTIC_CACHE_NPROBE: int = 4
+    SEMANTIC_CACHE_EMBEDDING_PROVIDER: str = "openai"
+    SEMANTIC_CACHE_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    SEMANTIC_CACHE_EMBEDDING_DIMENSIONS: Optional[int] = 256
+
+    # Per-input embedding cache; EMBEDDING_CACHE_DIR enables the memory-mapped persistent tier
+    ENABLE_EMBEDDING_CACHE: bool = False
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100000
+    EMBEDDING_CACHE_DIR: Optional[str] = None
+
+    # Model catalogue: refreshed in the background every TTL, stale entries served meanwhile
+    MODEL_CATALOG_TTL_SECONDS: int = 600
+    VALIDATE_MODELS: bool = True
+
+    # Share one upstream call between identical concurrent deterministic chat requests
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Micro-batching of concurrent embedding requests for the same model
+    EMBEDDING_BATCHING_ENABLED: bool = False
+    EMBEDDING_BATCH_WINDOW_MS: float = 5.0
+    EMBEDDING_BATCH_MAX_SIZE: int = 256
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000
+
+    # Tokenizer: directory holding <encoding>.tiktoken vocabulary files
+    TOKENIZER_VOCAB_DIR: Optional[str] = None
+    TOKENIZER_CACHE_SIZE: int = 50000
+
+    # Pre-flight context fitting: "reject", "drop_oldest" or "keep_last"; validated when settings load
+    CONTEXT_POLICY: ContextPolicy = ContextPolicy.REJECT
+    CONTEXT_KEEP_LAST_TURNS: int = 8
+
+    # Usage accounting: records are buffered in memory and drained in batches to SQLite or JSONL files
+    USAGE_TRACKING_ENABLED: bool = True
+    USAGE_BUFFER_SIZE: int = 100000
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 1.0
+    USAGE_FLUSH_BATCH_SIZE: int = 5000
+    USAGE_ROLLUP_RETENTION_MINUTES: int = 1440
+    USAGE_SQLITE_PATH: Optional[str] = None
+    USAGE_JSONL_DIR: Optional[str] = None
+    USAGE_JSONL_MAX_BYTES: int = 64 * 1024 * 1024
+    USAGE_JSONL_BACKUPS: int = 5
+
+    # Rate limits per minute (GCRA); 0 disables a limit
+    RATE_LIMIT_ENABLED: bool = False
+    RATE_LIMIT_USER_RPM: int = 60
+    RATE_LIMIT_USER_TPM: int = 100000
+    RATE_LIMIT_API_KEY_RPM: int = 600
+    RATE_LIMIT_API_KEY_TPM: int = 1000000
+    RATE_LIMIT_PROVIDER_RPM: int = 3000
+    RATE_LIMIT_PROVIDER_TPM: int = 2000000
+
+    # Admission control: per-provider concurrency and bounded priority queues (see X-Priority)
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_MAX_CONCURRENCY: int = 64
+    SCHEDULER_PROVIDER_CONCURRENCY: Dict[str, int] = {}
+    SCHEDULER_INTERACTIVE_QUEUE_SIZE: int = 256
+    SCHEDULER_BATCH_QUEUE_SIZE: int = 1024
+    SCHEDULER_INTERACTIVE_QUEUE_TIMEOUT: float = 10.0
+    SCHEDULER_BATCH_QUEUE_TIMEOUT: float = 60.0
+
+    # Retries with jittered exponential backoff and cross-provider failover
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 0.25
+    RETRY_MAX_DELAY: float = 4.0
+    RETRY_BUDGET_SECONDS: float = 30.0
+    FAILOVER_ENABLED: bool = True
+
+    # Background health probes, per-provider circuit breakers and latency-aware routing
+    HEALTH_PROBE_INTERVAL_SECONDS: float = 30.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 5.0
+    HEALTH_EWMA_ALPHA: float = 0.2
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_ERROR_RATE_THRESHOLD: float = 0.5
+    CIRCUIT_MIN_SAMPLES: int = 20
+    CIRCUIT_COOLDOWN_SECONDS: float = 30.0
+    LATENCY_ROUTING_ENABLED: bool = False  # route to the healthiest, fastest provider with an equivalent model
+    LATENCY_ROUTING_HYSTERESIS: float = 0.2  # move a model's traffic only to a provider scoring this much lower
+
+    # Hedged chat requests: a second attempt when the first is slower than the hedge delay
+    HEDGING_ENABLED: bool = False
+    HEDGE_DELAY_SECONDS: Optional[float] = None  # fixed delay; None uses the model's observed percentile
+    HEDGE_PERCENTILE: float = 0.95
+    HEDGE_FALLBACK_DELAY_SECONDS: float = 1.0
+    HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    HEDGE_BUDGET_RATIO: float = 0.05
+    HEDGE_BUDGET_BURST: float = 10
+    HEDGE_CROSS_PROVIDER: bool = False  # hedge on equivalent models elsewhere; answers then vary by provider
+
+    # Request deadlines: X-Request-Timeout header, else per-model (longest prefix) or global default
+    REQUEST_TIMEOUT_SECONDS: Optional[float] = 300.0
+    REQUEST_TIMEOUT_MAX_SECONDS: Optional[float] = 600.0
+    MODEL_REQUEST_TIMEOUTS: Dict[str, float] = {}
+
+    # Batch chat completions (POST /api/v1/chat/batch and python -m services.batch)
+    BATCH_CONCURRENCY: int = 64
+    BATCH_PROVIDER_CONCURRENCY: int = 16
+    BATCH_MAX_LINE_BYTES: int = 1048576
+    BATCH_REQUEST_TIMEOUT_SECONDS: Optional[float] = None  # whole-batch deadline; records use their model's
+    BATCH_RETRY_MAX_ATTEMPTS: int = 5  # per record, for 429/503s that carry a Retry-After
+    BATCH_RETRY_MAX_WAIT_SECONDS: float = 300.0
+
+    # Per-request stage timing: Server-Timing header, an optional log line, and the slow-request profiler
+    SERVER_TIMING_ENABLED: bool = True
+    STAGE_TIMING_LOG_ENABLED: bool = False
+    PROFILING_ENABLED: bool = False
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SLOWEST_PER_MINUTE: int = 5
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.005
     
     # Model mappings between providers
     MODEL_MAPPINGS: Dict[str, Dict[str, str]] = {
@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import time
+from typing import Dict, Hashable, List, Optional, Set
+
+from config import settings
+from core.deadline import deadline_at
+from core.metrics import REGISTRY
+from core.models import TextEmbeddingRequest, TextEmbeddingResponse, Usage
+from core.scheduler import Priority, scheduler
+from core.telemetry import RequestTiming, current_timing
+from services.resilience import resilient
+
+BATCH_SIZE = REGISTRY.histogram(
+    "gateway_embedding_batch_size",
+    "Number of caller requests coalesced into one upstream embeddings call",
+    ["provider", "model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+BATCH_WAIT = REGISTRY.histogram(
+    "gateway_embedding_batch_wait_seconds",
+    "Time a caller request waited in the batching window before its batch was sent",
+    ["provider", "model"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+
+class _Waiter:
+    __slots__ = ("inputs", "tokens", "priority", "future", "enqueued_at", "deadline", "timing")
+
+    def __init__(self, inputs: List[str], tokens: int, priority: Priority, future: asyncio.Future):
+        self.inputs = inputs
+        self.tokens = tokens
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        # The caller's own request context, which the shared upstream call does not run in
+        self.deadline = deadline_at()
+        self.timing = current_timing.get()
+
+
+class _Batch:
+    def __init__(self, service, request: TextEmbeddingRequest):
+        self.service = service
+        self.request = request
+        self.waiters: List[_Waiter] = []
+        self.size = 0
+        self.tokens = 0
+        self.timer: Optional[asyncio.Task] = None
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests for the same provider/model into one
+    upstream call.
+
+    A batch is sent when its window expires or it reaches `max_batch_size` inputs or
+    `max_batch_tokens` estimated tokens, whichever comes first. Each caller gets its
+    own vectors back (re-indexed from 0) and its share of the upstream usage.
+
+    Batches run in a context of their own rather than the first caller's, so no single
+    caller's deadline or cancellation cuts the call short for the others; it is bounded
+    by the latest deadline among its callers instead.
+    """
+
+    def __init__(self, window_ms: float, max_batch_size: int, max_batch_tokens: int):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(
+        self, service, request: TextEmbeddingRequest, priority: Priority = Priority.INTERACTIVE
+    ) -> TextEmbeddingResponse:
+        inputs = [request.input] if isinstance(request.input, str) else list(request.input)
+        tokens = sum(max(1, int(service.count_tokens(text, request.model))) for text in inputs)
+        # Only fields that reach the upstream payload: anything else would just split batches
+        key = (service.provider.value, request.model, request.dimensions)
+
+        batch = self._pending.get(key)
+        if batch is not None and (
+            batch.size + len(inputs) > self.max_batch_size or batch.tokens + tokens > self.max_batch_tokens
+        ):
+            self._dispatch(key, batch)
+            batch = None
+        if batch is None:
+            batch = self._pending[key] = _Batch(service, request)
+            batch.timer = self._spawn(self._flush_after_window(key, batch))
+
+        waiter = _Waiter(inputs, tokens, priority, asyncio.get_running_loop().create_future())
+        batch.waiters.append(waiter)
+        batch.size += len(inputs)
+        batch.tokens += tokens
+        if batch.size >= self.max_batch_size or batch.tokens >= self.max_batch_tokens:
+            self._dispatch(key, batch)
+
+        return await waiter.future
+
+    async def _flush_after_window(self, key: Hashable, batch: _Batch) -> None:
+        await asyncio.sleep(self.window)
+        batch.timer = None
+        self._dispatch(key, batch)
+
+    def _dispatch(self, key: Hashable, batch: _Batch) -> None:
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self._spawn(self._send(batch))
+
+    async def _send(self, batch: _Batch) -> None:
+        # Callers that gave up (e.g. disconnected) while waiting are dropped from the batch
+        waiters = [w for w in batch.waiters if not w.future.done()]
+        if not waiters:
+            return
+
+        provider, model = batch.service.provider.value, batch.request.model
+        now = time.perf_counter()
+        BATCH_SIZE.labels(provider, model).observe(len(waiters))
+        wait_histogram = BATCH_WAIT.labels(provider, model)
+        for waiter in waiters:
+            wait_histogram.observe(now - waiter.enqueued_at)
+
+        inputs = [text for waiter in waiters for text in waiter.inputs]
+        timing = RequestTiming()
+        current_timing.set(timing)
+        try:
+            # The batch is scheduled with the most urgent priority among its callers
+            priority = min(w.priority for w in waiters)
+            upstream = await resilient.retry(
+                lambda: scheduler.run(provider, priority, lambda: batch.service.get_embeddings(
+                    batch.request.model_copy(update={"input": inputs, "user": None})
+                )),
+                provider, min(time.monotonic() + resilient.budget, max(w.deadline for w in waiters)), model
+            )
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+            return
+        finally:
+            for waiter in waiters:
+                if waiter.timing is not None:
+                    waiter.timing.upstream += timing.upstream
+
+        vectors = [item.embedding for item in sorted(upstream.data, key=lambda item: item.index)]
+        prompt_shares = split_tokens(upstream.usage.prompt_tokens, [w.tokens for w in waiters])
+        offset = 0
+        for waiter, prompt_tokens in zip(waiters, prompt_shares):
+            own = vectors[offset:offset + len(waiter.inputs)]
+            offset += len(waiter.inputs)
+            if waiter.future.done():
+                continue
+            waiter.future.set_result(TextEmbeddingResponse.from_vectors(
+                id=upstream.id,
+                model=upstream.model,
+                vectors=own,
+                usage=Usage(prompt_tokens=prompt_tokens, completion_tokens=0, total_tokens=prompt_tokens),
+                provider=upstream.provider
+            ))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # An empty context: the task must not inherit the deadline, timing or trace of whoever triggered it
+        task = contextvars.Context().run(asyncio.create_task, coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+def split_tokens(total: int, weights: List[int]) -> List[int]:
+    """Split `total` proportionally to `weights` so the integer shares add up exactly."""
+    weight_sum = sum(weights)
+    if not weight_sum:
+        return [0] * len(weights)
+    exact = [total * w / weight_sum for w in weights]
+    shares = [int(x) for x in exact]
+    # Largest remainder method: hand out the leftover tokens to the biggest fractions
+    leftovers = sorted(range(len(weights)), key=lambda i: exact[i] - shares[i], reverse=True)
+    for i in leftovers[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+embedding_batcher = EmbeddingBatcher(
+    window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+    max_batch_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+)
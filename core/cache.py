@@ -0,0 +1,164 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+from core.models import ChatCompletionRequest
+
+
+class ResponseCache:
+    """
+    Exact-match response cache keyed by `calculate_cache_key`.
+
+    The memory tier is an LRU bounded both by entry count and by payload bytes, with a
+    per-entry TTL. The optional SQLite tier keeps entries across restarts; it is read
+    on a memory miss and written off the response path via `persist`.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        max_bytes: int,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, payload = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self._remove(key)
+
+        if self.sqlite_path:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None:
+                expires_at, payload = row
+                self._insert(key, payload, expires_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return payload
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, payload: bytes) -> None:
+        """Store a payload in the memory tier."""
+        self._insert(key, payload, time.time() + self.ttl)
+
+    async def persist(self, key: str, payload: bytes) -> None:
+        """Write a payload to the persistent tier, if one is configured."""
+        if self.sqlite_path:
+            await asyncio.to_thread(self._db_set, key, payload, time.time() + self.ttl)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        if self.sqlite_path:
+            with self._db_lock:
+                self._connection().execute("DELETE FROM responses")
+                self._connection().commit()
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _insert(self, key: str, payload: bytes, expires_at: float) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, payload)
+        self._bytes += len(payload)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload BLOB NOT NULL)"
+            )
+        return self._db
+
+    def _db_get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute("SELECT expires_at, payload FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            return row[0], row[1]
+
+    def _db_set(self, key: str, payload: bytes, expires_at: float) -> None:
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, payload) VALUES (?, ?, ?)",
+                (key, expires_at, payload),
+            )
+            db.commit()
+
+
+def is_deterministic(request: ChatCompletionRequest) -> bool:
+    """Whether identical requests are expected to produce identical (non-streamed) responses."""
+    return not request.stream and request.temperature == 0
+
+
+def is_cacheable(request: ChatCompletionRequest) -> bool:
+    """Only deterministic requests are cached, unless the caller opts in or out explicitly."""
+    if request.stream:
+        return False
+    if request.cache is not None:
+        return request.cache
+    return is_deterministic(request)
+
+
+response_cache = ResponseCache(
+    ttl=settings.CACHE_TTL_SECONDS,
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    sqlite_path=settings.CACHE_SQLITE_PATH,
+)
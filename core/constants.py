@@ -26,12 +26,14 @@ CAPABILITY_EMBEDDINGS = "embeddings"
 CAPABILITY_FUNCTION_CALLING = "function_calling"
 CAPABILITY_STREAMING = "streaming"
 
-# Provider-specific model mappings for equivalent models
+# Provider-specific model mappings for equivalent models. Failover, routing and hedging substitute
+# these without telling the caller, so a group only holds models of the same size and capability tier.
 MODEL_MAPPINGS = {
     "gpt-3.5-turbo": {
         "openai": "gpt-3.5-turbo",
         "groq": "llama3-70b-8192",
-        "ollama": "llama3"
+        "ollama": "llama3",
+        "gemini": "gemini-2.0-flash-lite"
     },
     "gpt-4": {
         "openai": "gpt-4",
@@ -45,8 +47,25 @@ MODEL_MAPPINGS = {
         "groq": "llama3-8b-8192",
         "ollama": "llama3"
     },
+    "gemini-2.0-flash-lite": {
+        "gemini": "gemini-2.0-flash-lite",
+        "openai": "gpt-3.5-turbo"
+    },
     "embedding-small": {
         "openai": "text-embedding-3-small",
         "ollama": "nomic-embed-text"
     }
-}
\ No newline at end of file
+}
+
+# Context window sizes (in tokens) for models whose provider listing does not report one
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "text-embedding-ada-002": 8191,
+    "text-embedding-3-small": 8191,
+    "text-embedding-3-large": 8191,
+    "gemini-2.0-flash-lite": 32768,
+}
@@ -0,0 +1,60 @@
+from typing import Optional, Tuple
+
+from core.errors import ContextLengthExceededError
+# ContextPolicy lives with the other enums so config can validate CONTEXT_POLICY against it
+from core.models import ChatCompletionRequest, ContextPolicy, Role
+from core.tokenizer import TOKENS_PER_REPLY, token_counter
+
+
+def fit_context(
+    request: ChatCompletionRequest,
+    context_window: Optional[int],
+    policy: ContextPolicy = ContextPolicy.REJECT,
+    keep_last: int = 8
+) -> Tuple[ChatCompletionRequest, int]:
+    """
+    Make `request` fit `context_window`, reserving room for `max_tokens` of completion.
+
+    Returns the (possibly trimmed) request and the number of prompt tokens removed.
+    System messages and the final message are never dropped. Raises
+    ContextLengthExceededError when the policy is REJECT or trimming cannot help.
+    """
+    if not context_window or not request.messages:
+        return request, 0
+
+    budget = context_window - (request.max_tokens or 0) - TOKENS_PER_REPLY
+    counts = token_counter.message_counts(request.messages, request.model)
+    total = sum(counts)
+    if total <= budget:
+        return request, 0
+
+    def exceeded(prompt_tokens: int) -> ContextLengthExceededError:
+        return ContextLengthExceededError(
+            f"Prompt of {prompt_tokens + TOKENS_PER_REPLY} tokens does not fit the {context_window}-token "
+            f"context of '{request.model}' with {request.max_tokens or 0} tokens reserved for the completion",
+            {"model": request.model, "prompt_tokens": prompt_tokens + TOKENS_PER_REPLY,
+             "context_window": context_window, "max_tokens": request.max_tokens, "policy": policy.value}
+        )
+
+    if policy == ContextPolicy.REJECT:
+        raise exceeded(total)
+
+    last = len(request.messages) - 1
+    droppable = [i for i, m in enumerate(request.messages) if m.role != Role.SYSTEM and i != last]
+    dropped = set()
+    if policy == ContextPolicy.KEEP_LAST:
+        # The final message counts as one of the last N turns
+        dropped.update(droppable[:max(0, len(droppable) - max(0, keep_last - 1))])
+        total -= sum(counts[i] for i in dropped)
+    for i in droppable:
+        if total <= budget:
+            break
+        if i not in dropped:
+            dropped.add(i)
+            total -= counts[i]
+    if total > budget:
+        raise exceeded(total)
+
+    messages = [m for i, m in enumerate(request.messages) if i not in dropped]
+    trimmed = sum(counts[i] for i in dropped)
+    return request.model_copy(update={"messages": messages}), trimmed
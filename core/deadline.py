@@ -0,0 +1,78 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from config import settings
+from core.metrics import REGISTRY
+
+CANCELLATIONS = REGISTRY.counter(
+    "gateway_request_cancellations_total",
+    "Requests whose handling (and upstream call) was cancelled before it finished",
+    ["reason", "phase"],
+)
+
+
+class Deadline:
+    """
+    When the current request must be finished, on the monotonic clock. A deadline the
+    client set explicitly is kept; otherwise routers may replace the gateway-wide
+    default with the per-model one once they know the model. `arm` schedules a
+    callback for the moment it passes, rescheduled whenever the deadline moves.
+    """
+
+    def __init__(self, timeout: Optional[float], explicit: bool = False):
+        self.started = time.monotonic()
+        self.explicit = explicit
+        self.at = self.started + timeout if timeout else float("inf")
+        self._callback: Optional[Callable[[], None]] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def remaining(self) -> float:
+        return self.at - time.monotonic()
+
+    def apply_default(self, timeout: Optional[float]) -> None:
+        if self.explicit:
+            return
+        self.at = self.started + timeout if timeout else float("inf")
+        self._schedule()
+
+    def arm(self, callback: Callable[[], None]) -> None:
+        self._callback = callback
+        self._schedule()
+
+    def disarm(self) -> None:
+        self._callback = None
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._callback is not None and self.at != float("inf"):
+            self._timer = asyncio.get_running_loop().call_later(max(0.0, self.remaining()), self._callback)
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def deadline_at() -> float:
+    """The current request's deadline on the monotonic clock; infinity outside a request."""
+    deadline = current_deadline.get()
+    return deadline.at if deadline is not None else float("inf")
+
+
+def model_timeout(model: str, timeouts: Optional[Dict[str, float]] = None) -> Optional[float]:
+    """The default deadline for `model`: the longest matching prefix in `MODEL_REQUEST_TIMEOUTS`."""
+    timeouts = settings.MODEL_REQUEST_TIMEOUTS if timeouts is None else timeouts
+    matches = [prefix for prefix in timeouts if model.startswith(prefix)]
+    if matches:
+        return timeouts[max(matches, key=len)]
+    return settings.REQUEST_TIMEOUT_SECONDS
+
+
+def apply_model_deadline(model: str) -> None:
+    """Use the model's default deadline for the current request unless the client set one."""
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.apply_default(model_timeout(model))
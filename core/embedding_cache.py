@@ -0,0 +1,189 @@
+import glob
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+
+
+def text_key(text: str) -> int:
+    """64-bit content hash of an input string."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+class MmapVectorStore:
+    """
+    Append-only float32 vector file plus a parallel file of 64-bit text hashes.
+
+    Vectors are read through `numpy.memmap`, so millions of them can be served
+    without being loaded into the Python heap; only the hash -> row index lives in
+    memory, as a sorted uint64 array plus a dict of rows appended since it was built.
+    """
+
+    MERGE_THRESHOLD = 4096
+
+    def __init__(self, path_prefix: str, dim: int):
+        self.dim = dim
+        self.vectors_path = f"{path_prefix}-{dim}d.f32"
+        self.keys_path = f"{path_prefix}-{dim}d.keys"
+        # Serialises appends only; readers on the event loop never take it
+        self._lock = threading.Lock()
+        self._mmap: Optional[np.memmap] = None
+        # (sorted keys, their rows, rows appended since the sort, row count). Replaced as a
+        # whole and never mutated, so a lock-free reader always sees one consistent snapshot
+        self._index: Tuple[np.ndarray, np.ndarray, Dict[int, int], int] = (
+            np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64), {}, 0
+        )
+
+        if os.path.exists(self.keys_path) and os.path.exists(self.vectors_path):
+            keys = np.fromfile(self.keys_path, dtype=np.uint64)
+            # A crash between the two appends can leave one file longer than the other
+            rows = min(len(keys), os.path.getsize(self.vectors_path) // (4 * dim))
+            self._index = self._build_index(keys[:rows])
+
+    def __len__(self) -> int:
+        return self._index[3]
+
+    def get(self, key: int) -> Optional[np.ndarray]:
+        sorted_keys, sorted_rows, recent, rows = self._index
+        row = recent.get(key)
+        if row is None and len(sorted_keys):
+            pos = int(np.searchsorted(sorted_keys, key))
+            if pos < len(sorted_keys) and sorted_keys[pos] == key:
+                row = int(sorted_rows[pos])
+        if row is None:
+            return None
+        return self._view(row, rows)[row]
+
+    def append(self, keys: Sequence[int], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            sorted_keys, sorted_rows, recent, rows = self._index
+            # Vectors are written before their keys, so every indexed row is on disk
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self.keys_path, "ab") as f:
+                f.write(np.asarray(keys, dtype=np.uint64).tobytes())
+            recent = {**recent, **{int(key): rows + i for i, key in enumerate(keys)}}
+            rows += len(keys)
+            if len(recent) >= self.MERGE_THRESHOLD:
+                self._index = self._build_index(np.fromfile(self.keys_path, dtype=np.uint64)[:rows])
+            else:
+                self._index = (sorted_keys, sorted_rows, recent, rows)
+
+    @staticmethod
+    def _build_index(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, Dict[int, int], int]:
+        order = np.argsort(keys, kind="stable")
+        return keys[order], order.astype(np.int64), {}, len(keys)
+
+    def _view(self, row: int, rows: int) -> np.memmap:
+        mmap = self._mmap
+        if mmap is None or row >= len(mmap):
+            # The snapshot's rows are all on disk; racing remaps are harmless, the last one wins
+            mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            self._mmap = mmap
+        return mmap
+
+
+class EmbeddingCache:
+    """
+    Per-input embedding cache keyed by (scope, text hash), where the scope is the
+    provider, model and requested dimensions.
+
+    A bounded in-memory LRU sits in front of an optional memory-mapped store per
+    scope under `directory`.
+    """
+
+    def __init__(self, max_entries: int, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: "OrderedDict[Tuple[Hashable, int], List[float]]" = OrderedDict()
+        self._stores: Dict[Hashable, Optional[MmapVectorStore]] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, scope: Hashable, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = []
+        for text in texts:
+            key = (scope, text_key(text))
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                store = self._store(scope)
+                stored = store.get(key[1]) if store is not None else None
+                if stored is not None:
+                    vector = stored.tolist()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+            results.append(vector)
+        return results
+
+    def set_many(self, scope: Hashable, texts: Sequence[str], vectors: Sequence[List[float]]) -> None:
+        """Store vectors in the memory tier."""
+        for text, vector in zip(texts, vectors):
+            self._remember((scope, text_key(text)), vector)
+
+    def persist_many(self, scope: Hashable, texts: Sequence[str], vectors: Sequence[List[float]]) -> None:
+        """Append vectors to the scope's memory-mapped store, if persistence is configured."""
+        if not self.directory or not vectors:
+            return
+        store = self._store(scope, dim=len(vectors[0]))
+        keys = [text_key(text) for text in texts]
+        fresh = [i for i, key in enumerate(keys) if store.get(key) is None]
+        if fresh:
+            store.append([keys[i] for i in fresh], np.asarray([vectors[i] for i in fresh], dtype=np.float32))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "stored_vectors": sum(len(store) for store in self._stores.values() if store is not None),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: Tuple[Hashable, int], vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _store(self, scope: Hashable, dim: Optional[int] = None) -> Optional[MmapVectorStore]:
+        """Open the scope's store, discovering its dimension from disk when not given."""
+        if not self.directory:
+            return None
+        store = self._stores.get(scope)
+        if store is not None or (dim is None and scope in self._stores):
+            return store
+
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", "-".join(map(str, scope))))
+        if dim is None:
+            suffixes = (path[len(prefix):] for path in glob.glob(f"{glob.escape(prefix)}-*d.f32"))
+            dims = [int(m.group(1)) for m in map(re.compile(r"-(\d+)d\.f32").fullmatch, suffixes) if m]
+            dim = dims[0] if dims else None
+        store = MmapVectorStore(prefix, dim) if dim else None
+        self._stores[scope] = store
+        return store
+
+
+embedding_cache = EmbeddingCache(
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+    directory=settings.EMBEDDING_CACHE_DIR,
+)
@@ -5,9 +5,15 @@ class LLMGatewayError(Exception):
     code: str = "gateway_error"
     status_code: int = 500
     
-    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+    def __init__(
+        self,
+        message: str,
+        details: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ):
         self.message = message
         self.details = details or {}
+        self.headers = headers
         super().__init__(self.message)
     
     def to_dict(self) -> Dict[str, Any]:
@@ -74,4 +80,14 @@ class ProviderError(LLMGatewayError):
         self.provider = provider
         if details is None:
             self.details = {}
-        self.details["provider"] = provider
\ No newline at end of file
+        self.details["provider"] = provider
+
+class UpstreamTimeoutError(ProviderError):
+    """Exception raised when a provider does not answer in time."""
+    code = "upstream_timeout"
+    status_code = 504
+
+class DeadlineExceededError(LLMGatewayError):
+    """Exception raised when a request runs past its deadline."""
+    code = "deadline_exceeded"
+    status_code = 504
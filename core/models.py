@@ -17,6 +17,19 @@ class Role(str, Enum):
     ASSISTANT = "assistant"
     FUNCTION = "function"
 
+class ContextPolicy(str, Enum):
+    """What to do with a conversation that does not fit the model's context window."""
+    REJECT = "reject"            # fail with ContextLengthExceededError
+    DROP_OLDEST = "drop_oldest"  # drop the oldest non-system messages until it fits
+    KEEP_LAST = "keep_last"      # keep system messages and the last N others, then drop oldest if needed
+
+    @classmethod
+    def _missing_(cls, value):
+        # Settings may spell it in upper case, like the other environment values
+        if isinstance(value, str) and value.lower() != value:
+            return cls(value.lower())
+        return None
+
 class Message(BaseModel):
     """A message in a chat conversation."""
     role: Role
@@ -48,6 +61,11 @@ class ChatCompletionRequest(BaseModel):
     user: Optional[str] = None
     functions: Optional[List[Dict[str, Any]]] = None
     function_call: Optional[Union[str, Dict[str, Any]]] = None
+    # Gateway option: force (True) or skip (False) the response cache; by default only temperature 0 is cached
+    cache: Optional[bool] = None
+    # Gateway option: allow (True) or forbid (False) hedged attempts when hedging is enabled; by default
+    # only temperature 0 requests are hedged
+    hedge: Optional[bool] = None
 
 class ChatCompletionResponseChoice(BaseModel):
     """A choice in a chat completion response."""
@@ -71,12 +89,34 @@ class ChatCompletionResponse(BaseModel):
     usage: Optional[Usage] = None
     provider: Provider
 
+class DeltaMessage(BaseModel):
+    """An incremental message fragment in a streamed chat completion."""
+    role: Optional[Role] = None
+    content: Optional[str] = None
+    function_call: Optional[Dict[str, Any]] = None
+
+class ChatCompletionChunkChoice(BaseModel):
+    """A choice in a streamed chat completion chunk."""
+    index: int
+    delta: DeltaMessage
+    finish_reason: Optional[str] = None
+
+class ChatCompletionChunk(BaseModel):
+    """Standardized streamed chat completion chunk."""
+    id: str
+    object: str = "chat.completion.chunk"
+    created: int
+    model: str
+    choices: List[ChatCompletionChunkChoice]
+    provider: Provider
+
 class TextEmbeddingRequest(BaseModel):
     """Standardized text embedding request."""
     model: str
     input: Union[str, List[str]]
     provider: Optional[Provider] = None
     user: Optional[str] = None
+    dimensions: Optional[int] = None
 
 class Embedding(BaseModel):
     """A single text embedding."""
@@ -93,6 +133,14 @@ class TextEmbeddingResponse(BaseModel):
     usage: Usage
     provider: Provider
 
+    @classmethod
+    def from_vectors(
+        cls, id: str, model: str, vectors: List[List[float]], usage: Usage, provider: Provider
+    ) -> "TextEmbeddingResponse":
+        """Build a response around vectors without validating every float in them."""
+        data = [Embedding.model_construct(index=i, embedding=vector) for i, vector in enumerate(vectors)]
+        return cls.model_construct(id=id, data=data, model=model, usage=usage, provider=provider)
+
 class ErrorResponse(BaseModel):
     """Standardized error response."""
     error: bool = True
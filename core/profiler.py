@@ -0,0 +1,185 @@
+"""
+Opt-in sampling profiler for the slowest requests (`PROFILING_ENABLED`).
+
+A daemon thread samples the stack of every in-flight request every
+`PROFILE_SAMPLE_INTERVAL_SECONDS`. A request running on the event loop is sampled
+from the loop thread's frames, down to the code using the CPU; a suspended one by
+its chain of awaits, ending in what it waits on. When a request finishes, its
+samples are kept only if it is among the slowest `PROFILE_SLOWEST_PER_MINUTE` of the
+current minute. Kept profiles are written to `PROFILE_DIR` in the collapsed-stack
+format read by flamegraph.pl and speedscope, one `frame;frame;frame count` per line:
+
+    20261018T070100-1843ms-POST_api_v1_chat_completions-17.folded
+"""
+import asyncio
+import heapq
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional, Set, Tuple
+
+from config import settings
+
+logger = logging.getLogger("llm_gateway")
+
+
+class RequestProfile:
+    """The samples taken of one request's task."""
+    __slots__ = ("task", "label", "samples", "elapsed")
+
+    def __init__(self, task: asyncio.Task, label: str):
+        self.task = task
+        self.label = label
+        self.samples: Counter = Counter()
+        self.elapsed = 0.0
+
+
+class SlowRequestProfiler:
+    def __init__(self, enabled: bool, directory: str, slowest_per_minute: int, interval: float, max_depth: int = 128):
+        self.enabled = enabled
+        self.directory = directory
+        self.slowest_per_minute = slowest_per_minute
+        self.interval = interval
+        self.max_depth = max_depth
+        self._active: Set[RequestProfile] = set()
+        self._finished: queue.SimpleQueue = queue.SimpleQueue()
+        # (elapsed, path) of the profiles kept this minute, slowest last
+        self._kept: List[Tuple[float, str]] = []
+        self._minute: Optional[int] = None
+        self._written = 0
+        self._loop_thread: Optional[int] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start sampling; call from the event loop thread."""
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._loop_thread = threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def track(self, label: str) -> Optional[RequestProfile]:
+        """Start sampling the current task; pass the result to `finish`. None when not running."""
+        if self._thread is None:
+            return None
+        profile = RequestProfile(asyncio.current_task(), label)
+        self._active.add(profile)
+        return profile
+
+    def finish(self, profile: RequestProfile, elapsed: float) -> None:
+        """Stop sampling a request; the profiler thread decides whether to keep it."""
+        self._active.discard(profile)
+        profile.elapsed = elapsed
+        self._finished.put(profile)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self._sample()
+                self._drain()
+            except Exception:
+                logger.exception("Profiler sample failed")
+        self._drain()
+
+    def _sample(self) -> None:
+        # Snapshot first: the event loop adds and removes requests while this runs
+        profiles = tuple(self._active)
+        if not profiles:
+            return
+        running = sys._current_frames().get(self._loop_thread)
+        for profile in profiles:
+            stack = self._stack(profile.task, running)
+            if stack:
+                profile.samples[stack] += 1
+
+    def _stack(self, task: asyncio.Task, running) -> Tuple[str, ...]:
+        """The task's await chain, outermost first, plus the frames it is running, if any."""
+        frames = []
+        awaited = task.get_coro()
+        while awaited is not None and len(frames) < self.max_depth:
+            frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "ag_frame", None) \
+                or getattr(awaited, "gi_frame", None)
+            if frame is None:
+                break
+            frames.append(frame)
+            awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "ag_await", None) \
+                or getattr(awaited, "gi_yieldfrom", None)
+        if not frames:
+            return ()
+        names = [_frame_name(frame) for frame in frames]
+
+        # If the innermost coroutine is on the loop thread's stack, the task is running:
+        # add the plain function calls above it
+        innermost, calls = frames[-1], []
+        frame = running
+        while frame is not None and frame is not innermost and len(calls) < self.max_depth:
+            calls.append(frame)
+            frame = frame.f_back
+        if frame is innermost:
+            names.extend(_frame_name(call) for call in reversed(calls))
+        elif awaited is not None:
+            names.append(f"<{type(awaited).__name__}>")
+        return tuple(names)
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                profile = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            self._keep_if_slow(profile)
+
+    def _keep_if_slow(self, profile: RequestProfile) -> None:
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._minute, self._kept = minute, []
+        if len(self._kept) >= self.slowest_per_minute and profile.elapsed <= self._kept[0][0]:
+            return
+        path = self._write(profile)
+        if len(self._kept) < self.slowest_per_minute:
+            heapq.heappush(self._kept, (profile.elapsed, path))
+            return
+        _, evicted = heapq.heapreplace(self._kept, (profile.elapsed, path))
+        try:
+            os.remove(evicted)
+        except OSError:
+            pass
+
+    def _write(self, profile: RequestProfile) -> str:
+        self._written += 1
+        label = re.sub(r"[^A-Za-z0-9]+", "_", profile.label).strip("_")
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{profile.elapsed * 1000:.0f}ms-{label}-{self._written}.folded"
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        logger.info(f"Saved profile of a {profile.elapsed * 1000:.0f}ms request to {path}")
+        return path
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+profiler = SlowRequestProfiler(
+    enabled=settings.PROFILING_ENABLED,
+    directory=settings.PROFILE_DIR,
+    slowest_per_minute=settings.PROFILE_SLOWEST_PER_MINUTE,
+    interval=settings.PROFILE_SAMPLE_INTERVAL_SECONDS,
+)
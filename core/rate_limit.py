@@ -0,0 +1,228 @@
+import math
+import time
+from typing import Dict, MutableMapping, Optional
+
+from config import settings
+from core.errors import RateLimitError
+
+
+class GCRA:
+    """
+    Generic cell rate algorithm: a token bucket of `limit` units refilled over `period`
+    seconds, stored as one "theoretical arrival time" float per key.
+
+    `wait` and `charge` are O(1) dictionary operations; keys whose bucket has fully
+    refilled are swept out once the table has doubled in size since the last sweep.
+    """
+
+    __slots__ = ("limit", "period", "interval", "_tat", "_sweep_at")
+
+    def __init__(self, limit: int, period: float = 60.0):
+        self.limit = limit
+        self.period = period
+        self.interval = period / limit
+        self._tat: Dict[str, float] = {}
+        self._sweep_at = 1024
+
+    def wait(self, key: str, cost: float, now: float) -> float:
+        """Seconds until `cost` units could be taken for `key`; 0.0 if they can be now."""
+        # A cost above the bucket size is admitted once the bucket is full, and paid off after
+        if cost > self.limit:
+            cost = self.limit
+        tat = self._tat.get(key, now)
+        if tat < now:
+            tat = now
+        over = tat + cost * self.interval - now - self.period
+        return over if over > 0.0 else 0.0
+
+    def charge(self, key: str, cost: float, now: float) -> None:
+        """Take `cost` units (negative to refund) without checking the limit."""
+        tat = self._tat.get(key, now)
+        if tat < now:
+            tat = now
+        self._tat[key] = tat + cost * self.interval
+        if len(self._tat) > self._sweep_at:
+            self._sweep(now)
+
+    def remaining(self, key: str, now: float) -> int:
+        tat = self._tat.get(key, now)
+        return max(0, int((self.period - max(tat - now, 0.0)) / self.interval))
+
+    def reset_after(self, key: str, now: float) -> float:
+        """Seconds until the bucket for `key` is full again."""
+        return max(self._tat.get(key, now) - now, 0.0)
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def _sweep(self, now: float) -> None:
+        for key in [key for key, tat in self._tat.items() if tat <= now]:
+            del self._tat[key]
+        self._sweep_at = max(1024, 2 * len(self._tat))
+
+
+class LimitScope:
+    """Request and token limits sharing one key space (users, API keys or providers)."""
+
+    __slots__ = ("name", "requests", "tokens", "limited")
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int):
+        self.name = name
+        self.requests = GCRA(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = GCRA(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.limited = self.requests is not None or self.tokens is not None
+
+    def wait(self, key: str, tokens: int, now: float) -> float:
+        wait = self.requests.wait(key, 1, now) if self.requests is not None else 0.0
+        if self.tokens is not None:
+            token_wait = self.tokens.wait(key, tokens, now)
+            if token_wait > wait:
+                wait = token_wait
+        return wait
+
+    def charge(self, key: str, tokens: int, now: float) -> None:
+        if self.requests is not None:
+            self.requests.charge(key, 1, now)
+        if self.tokens is not None:
+            self.tokens.charge(key, tokens, now)
+
+    def refund(self, key: str, tokens: int, now: float) -> None:
+        if self.tokens is not None:
+            self.tokens.charge(key, -tokens, now)
+
+    def headers(self, key: str, now: float) -> Dict[str, str]:
+        """OpenAI-style `X-RateLimit-*` headers for `key`."""
+        headers: Dict[str, str] = {}
+        self.write_headers(key, now, headers)
+        return headers
+
+    def write_headers(self, key: str, now: float, target: MutableMapping[str, str]) -> None:
+        if self.requests is not None:
+            target["X-RateLimit-Limit-Requests"] = str(self.requests.limit)
+            target["X-RateLimit-Remaining-Requests"] = str(self.requests.remaining(key, now))
+            target["X-RateLimit-Reset-Requests"] = f"{self.requests.reset_after(key, now):.3f}s"
+        if self.tokens is not None:
+            target["X-RateLimit-Limit-Tokens"] = str(self.tokens.limit)
+            target["X-RateLimit-Remaining-Tokens"] = str(self.tokens.remaining(key, now))
+            target["X-RateLimit-Reset-Tokens"] = f"{self.tokens.reset_after(key, now):.3f}s"
+
+
+class Reservation:
+    """Tokens charged pre-flight, reconciled with the actual usage once it is known."""
+
+    __slots__ = ("limiter", "user", "api_key", "provider", "tokens", "settled")
+
+    def __init__(self, limiter: "RateLimiter", user: Optional[str], api_key: Optional[str], provider: str,
+                 tokens: int):
+        self.limiter = limiter
+        self.user = user
+        self.api_key = api_key
+        self.provider = provider
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual_tokens: int) -> None:
+        if not self.settled:
+            self.settled = True
+            self.limiter.reconcile(self, actual_tokens)
+
+    def write_headers(self, target: MutableMapping[str, str]) -> None:
+        """Write the caller's `X-RateLimit-*` headers into `target`, typically a response's headers."""
+        self.limiter.write_headers(target, self.user, self.api_key, self.provider)
+
+
+class RateLimiter:
+    """
+    In-process limits on requests and tokens per minute, for each user, each API key
+    and each provider. A request is admitted only if every applicable scope has room,
+    and is then charged to all of them; otherwise nothing is charged.
+
+    When limiting is disabled, or no applicable scope has a limit, `acquire` returns one
+    shared, already-settled reservation, so the common path allocates nothing.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        user_rpm: int,
+        user_tpm: int,
+        key_rpm: int,
+        key_tpm: int,
+        provider_rpm: int,
+        provider_tpm: int
+    ):
+        self.enabled = enabled
+        self.users = LimitScope("user", user_rpm, user_tpm)
+        self.api_keys = LimitScope("api_key", key_rpm, key_tpm)
+        self.providers = LimitScope("provider", provider_rpm, provider_tpm)
+        self.rejected = 0
+        self._unlimited = Reservation(self, None, None, "", 0)
+        self._unlimited.settled = True
+
+    def acquire(self, user: Optional[str], api_key: Optional[str], provider: str, tokens: int) -> Reservation:
+        """Charge one request and `tokens` estimated tokens, or raise RateLimitError."""
+        if not self.enabled or not (
+            self.providers.limited
+            or (user is not None and self.users.limited)
+            or (api_key is not None and self.api_keys.limited)
+        ):
+            return self._unlimited
+        now = time.monotonic()
+        wait, scope, key = self.providers.wait(provider, tokens, now), self.providers, provider
+        if user is not None:
+            user_wait = self.users.wait(user, tokens, now)
+            if user_wait > wait:
+                wait, scope, key = user_wait, self.users, user
+        if api_key is not None:
+            key_wait = self.api_keys.wait(api_key, tokens, now)
+            if key_wait > wait:
+                wait, scope, key = key_wait, self.api_keys, api_key
+        if wait > 0.0:
+            self.rejected += 1
+            raise RateLimitError(
+                f"Rate limit exceeded for {scope.name}; retry in {wait:.1f}s",
+                {"scope": scope.name, "retry_after": round(wait, 3)},
+                headers={"Retry-After": str(math.ceil(wait)), **scope.headers(key, now)}
+            )
+        self.providers.charge(provider, tokens, now)
+        if user is not None:
+            self.users.charge(user, tokens, now)
+        if api_key is not None:
+            self.api_keys.charge(api_key, tokens, now)
+        return Reservation(self, user, api_key, provider, tokens)
+
+    def reconcile(self, reservation: Reservation, actual_tokens: int) -> None:
+        """Replace the pre-flight token estimate with the actual usage."""
+        if not self.enabled or actual_tokens == reservation.tokens:
+            return
+        now = time.monotonic()
+        refund = reservation.tokens - actual_tokens
+        self.providers.refund(reservation.provider, refund, now)
+        if reservation.user is not None:
+            self.users.refund(reservation.user, refund, now)
+        if reservation.api_key is not None:
+            self.api_keys.refund(reservation.api_key, refund, now)
+
+    def write_headers(self, target: MutableMapping[str, str], user: Optional[str], api_key: Optional[str],
+                      provider: str) -> None:
+        """Limits of the caller's own scope: their user, else their API key, else the provider."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if user is not None:
+            self.users.write_headers(user, now, target)
+        elif api_key is not None:
+            self.api_keys.write_headers(api_key, now, target)
+        elif provider:
+            self.providers.write_headers(provider, now, target)
+
+
+rate_limiter = RateLimiter(
+    enabled=settings.RATE_LIMIT_ENABLED,
+    user_rpm=settings.RATE_LIMIT_USER_RPM,
+    user_tpm=settings.RATE_LIMIT_USER_TPM,
+    key_rpm=settings.RATE_LIMIT_API_KEY_RPM,
+    key_tpm=settings.RATE_LIMIT_API_KEY_TPM,
+    provider_rpm=settings.RATE_LIMIT_PROVIDER_RPM,
+    provider_tpm=settings.RATE_LIMIT_PROVIDER_TPM,
+)
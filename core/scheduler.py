@@ -0,0 +1,207 @@
+import asyncio
+import math
+import time
+from collections import deque
+from enum import IntEnum
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from config import settings
+from core.errors import ServiceUnavailableError
+from core.metrics import REGISTRY
+from core.telemetry import add_upstream
+from core.tracing import stage
+
+T = TypeVar("T")
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    "gateway_scheduler_queue_depth",
+    "Requests waiting for an upstream slot",
+    ["provider", "priority"],
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "gateway_scheduler_in_flight",
+    "Upstream calls holding a slot",
+    ["provider"],
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "gateway_scheduler_wait_seconds",
+    "Time a request waited in the queue before it got an upstream slot",
+    ["provider", "priority"],
+)
+SHED = REGISTRY.counter(
+    "gateway_scheduler_shed_total",
+    "Requests rejected with 503 instead of being queued or after waiting too long",
+    ["provider", "priority", "reason"],
+)
+
+
+class Priority(IntEnum):
+    """Queue classes, served strictly in this order."""
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class _Lane:
+    """Slots and per-priority wait queues of one provider."""
+
+    def __init__(self, provider: str, max_concurrency: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.queues: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        # EWMA of how long a slot is held, used to suggest a Retry-After
+        self.service_time = 1.0
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+
+class Scheduler:
+    """
+    Admission control between the routers and the provider adapters.
+
+    Each provider has `max_concurrency` slots. A request that finds no free slot waits
+    in a bounded FIFO queue for its priority; released slots go to the highest-priority
+    waiter. Requests are shed with ServiceUnavailableError (503 + Retry-After) when
+    their queue is full or they waited longer than the queue timeout for their priority.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_concurrency: int,
+        provider_concurrency: Dict[str, int],
+        queue_sizes: Dict[Priority, int],
+        queue_timeouts: Dict[Priority, float]
+    ):
+        self.enabled = enabled
+        self.max_concurrency = max_concurrency
+        self.provider_concurrency = provider_concurrency
+        self.queue_sizes = queue_sizes
+        self.queue_timeouts = queue_timeouts
+        self._lanes: Dict[str, _Lane] = {}
+
+    async def run(self, provider: str, priority: Priority, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await `fn()` while holding one of the provider's slots."""
+        if self.enabled:
+            with stage("queue"):
+                await self.acquire(provider, priority)
+        started = time.perf_counter()
+        try:
+            with stage("upstream"):
+                return await fn()
+        finally:
+            held_for = time.perf_counter() - started
+            add_upstream(provider, held_for)
+            self.release(provider, held_for)
+
+    async def stream(
+        self, provider: str, priority: Priority, fn: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """Iterate `fn()` while holding a slot, taken on first iteration and released when it ends."""
+        with stage("queue"):
+            await self.acquire(provider, priority)
+        try:
+            async for item in fn():
+                yield item
+        finally:
+            self.release(provider)
+
+    async def acquire(self, provider: str, priority: Priority) -> None:
+        """Take a slot, waiting in the priority queue if none is free. Pair with `release`."""
+        if not self.enabled:
+            return
+        lane = self._lane(provider)
+        if lane.active < lane.max_concurrency and not lane.queued():
+            lane.active += 1
+            IN_FLIGHT.labels(provider).set(lane.active)
+            return
+
+        queue = lane.queues[priority]
+        if len(queue) >= self.queue_sizes[priority]:
+            raise self._shed(lane, priority, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        QUEUE_DEPTH.labels(provider, priority.name.lower()).set(len(queue))
+        enqueued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeouts[priority])
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as this waiter gave up: pass it on
+                self.release(provider)
+            else:
+                waiter.cancel()
+                _discard(queue, waiter)
+                QUEUE_DEPTH.labels(provider, priority.name.lower()).set(len(queue))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed(lane, priority, "deadline") from None
+            raise
+        QUEUE_WAIT.labels(provider, priority.name.lower()).observe(time.perf_counter() - enqueued_at)
+
+    def release(self, provider: str, held_for: Optional[float] = None) -> None:
+        """Give a slot back, handing it straight to the next waiter if there is one."""
+        if not self.enabled:
+            return
+        lane = self._lane(provider)
+        if held_for is not None:
+            lane.service_time += 0.2 * (held_for - lane.service_time)
+        for priority, queue in lane.queues.items():
+            while queue:
+                waiter = queue.popleft()
+                QUEUE_DEPTH.labels(provider, priority.name.lower()).set(len(queue))
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        lane.active -= 1
+        IN_FLIGHT.labels(provider).set(lane.active)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            provider: {
+                "active": lane.active,
+                "max_concurrency": lane.max_concurrency,
+                **{f"queued_{p.name.lower()}": len(q) for p, q in lane.queues.items()},
+            }
+            for provider, lane in self._lanes.items()
+        }
+
+    def _lane(self, provider: str) -> _Lane:
+        lane = self._lanes.get(provider)
+        if lane is None:
+            concurrency = self.provider_concurrency.get(provider, self.max_concurrency)
+            lane = self._lanes[provider] = _Lane(provider, concurrency)
+        return lane
+
+    def _shed(self, lane: _Lane, priority: Priority, reason: str) -> ServiceUnavailableError:
+        SHED.labels(lane.provider, priority.name.lower(), reason).inc()
+        # Roughly how long until the current backlog has drained through the slots
+        retry_after = max(1, math.ceil(lane.service_time * (lane.queued() + 1) / lane.max_concurrency))
+        return ServiceUnavailableError(
+            f"Provider '{lane.provider}' is overloaded ({reason.replace('_', ' ')}); retry later",
+            {"provider": lane.provider, "priority": priority.name.lower(), "reason": reason},
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+def _discard(queue: Deque[asyncio.Future], waiter: asyncio.Future) -> None:
+    try:
+        queue.remove(waiter)
+    except ValueError:
+        pass
+
+
+scheduler = Scheduler(
+    enabled=settings.SCHEDULER_ENABLED,
+    max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY,
+    provider_concurrency=settings.SCHEDULER_PROVIDER_CONCURRENCY,
+    queue_sizes={
+        Priority.INTERACTIVE: settings.SCHEDULER_INTERACTIVE_QUEUE_SIZE,
+        Priority.BATCH: settings.SCHEDULER_BATCH_QUEUE_SIZE,
+    },
+    queue_timeouts={
+        Priority.INTERACTIVE: settings.SCHEDULER_INTERACTIVE_QUEUE_TIMEOUT,
+        Priority.BATCH: settings.SCHEDULER_BATCH_QUEUE_TIMEOUT,
+    },
+)
@@ -0,0 +1,279 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger("llm_gateway")
+
+
+def normalize_prompt(text: str) -> str:
+    """Collapse casing and whitespace so trivially different prompts embed identically."""
+    return " ".join(text.lower().split())
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _Cluster:
+    """A contiguous, growable block of unit vectors plus the entry id of each row."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((16, dim), dtype=np.float32)
+        self.ids: List[int] = []
+
+    def append(self, entry_id: int, vector: np.ndarray) -> int:
+        row = len(self.ids)
+        if row == len(self.vectors):
+            grown = np.empty((row * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:row] = self.vectors
+            self.vectors = grown
+        self.vectors[row] = vector
+        self.ids.append(entry_id)
+        return row
+
+    def remove(self, row: int) -> Optional[int]:
+        """Swap-remove a row; returns the id of the entry moved into it, if any."""
+        last = len(self.ids) - 1
+        moved = None
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            moved = self.ids[last]
+            self.ids[row] = moved
+        self.ids.pop()
+        return moved
+
+
+def _kmeans(data: np.ndarray, nlist: int, iterations: int = 8) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors; pure, so it can run in a worker thread."""
+    rng = np.random.default_rng(0)
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.add.reduceat(data[order], starts[nonempty], axis=0)
+        centroids[nonempty] = _unit_rows(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    Capacity-bounded cosine-similarity index over float32 unit vectors.
+
+    Small indexes are scanned exhaustively with one matrix-vector product. Once
+    `train_size` entries are stored, a spherical k-means coarse quantizer splits them
+    into `nlist` contiguous clusters and lookups only scan the `nprobe` nearest ones
+    (an IVF index), which keeps top-1 search under a millisecond at 100k 256-dim
+    entries (see benchmarks/bench_semantic_cache.py). Inside an event loop the k-means
+    runs on a snapshot in a worker thread; lookups scan exhaustively until it is done.
+    The oldest entries are evicted first when `capacity` is exceeded.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        capacity: int,
+        nlist: int = 128,
+        nprobe: int = 4,
+        train_size: Optional[int] = None,
+        ids: Optional[Iterator[int]] = None
+    ):
+        self.dim = dim
+        self.capacity = capacity
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or max(nlist * 32, 1024)
+        self.centroids: Optional[np.ndarray] = None
+        self._clusters: List[_Cluster] = [_Cluster(dim)]
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        self._payloads: Dict[int, Any] = {}
+        self._order: Deque[int] = deque()
+        # Increasing entry ids; shared between indexes, they order entries across all of them
+        self._ids = ids if ids is not None else itertools.count()
+        self._training: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def oldest(self) -> Optional[int]:
+        """Id of the oldest entry, if any."""
+        return self._order[0] if self._order else None
+
+    def evict_oldest(self) -> None:
+        self._evict(self._order.popleft())
+
+    def add(self, vector: Sequence[float], payload: Any) -> None:
+        self.add_many([vector], [payload])
+
+    def add_many(self, vectors: Sequence[Sequence[float]], payloads: Sequence[Any]) -> None:
+        """Insert a batch of vectors, assigning all of them to clusters in one product."""
+        vectors = _unit_rows(vectors)
+        if self.centroids is None:
+            assignments = np.zeros(len(vectors), dtype=np.intp)
+        else:
+            assignments = np.argmax(vectors @ self.centroids.T, axis=1)
+
+        for vector, cluster_idx, payload in zip(vectors, assignments, payloads):
+            entry_id = next(self._ids)
+            row = self._clusters[cluster_idx].append(entry_id, vector)
+            self._locations[entry_id] = (int(cluster_idx), row)
+            self._payloads[entry_id] = payload
+            self._order.append(entry_id)
+
+        while len(self._order) > self.capacity:
+            self._evict(self._order.popleft())
+
+        if self.centroids is None and self._training is None and len(self._order) >= self.train_size:
+            self._train()
+
+    def search(self, vector: Sequence[float]) -> Optional[Tuple[float, Any]]:
+        """Return the (cosine similarity, payload) of the nearest stored vector."""
+        if not self._order:
+            return None
+        query = _unit_rows(vector)[0]
+        if self.centroids is None:
+            probes = [0]
+        else:
+            centroid_scores = self.centroids @ query
+            nprobe = min(self.nprobe, self.nlist)
+            probes = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+
+        best_score, best_id = -2.0, None
+        for cluster_idx in probes:
+            cluster = self._clusters[cluster_idx]
+            size = len(cluster.ids)
+            if not size:
+                continue
+            scores = cluster.vectors[:size] @ query
+            row = int(np.argmax(scores))
+            if scores[row] > best_score:
+                best_score, best_id = float(scores[row]), cluster.ids[row]
+        if best_id is None:
+            return None
+        return best_score, self._payloads[best_id]
+
+    def _evict(self, entry_id: int) -> None:
+        cluster_idx, row = self._locations.pop(entry_id)
+        del self._payloads[entry_id]
+        moved = self._clusters[cluster_idx].remove(row)
+        if moved is not None:
+            self._locations[moved] = (cluster_idx, row)
+
+    def _train(self) -> None:
+        """Fit the coarse quantizer: off the event loop when there is one, inline otherwise."""
+        flat = self._clusters[0]
+        snapshot = flat.vectors[:len(flat.ids)].copy()
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._install(_kmeans(snapshot, self.nlist))
+            return
+        self._training = asyncio.ensure_future(self._train_in_thread(snapshot))
+
+    async def _train_in_thread(self, snapshot: np.ndarray) -> None:
+        try:
+            centroids = await asyncio.to_thread(_kmeans, snapshot, self.nlist)
+        except Exception as e:
+            logger.warning(f"Semantic cache index training failed: {e}")
+            return
+        finally:
+            self._training = None
+        self._install(centroids)
+
+    def _install(self, centroids: np.ndarray) -> None:
+        """Re-cluster the entries stored now, which may differ from the training snapshot."""
+        flat = self._clusters[0]
+        data = flat.vectors[:len(flat.ids)]
+        ids = list(flat.ids)
+        self.centroids = centroids
+        self._clusters = [_Cluster(self.dim) for _ in range(self.nlist)]
+        for entry_id, vector, cluster_idx in zip(ids, data, np.argmax(data @ centroids.T, axis=1)):
+            row = self._clusters[cluster_idx].append(entry_id, vector)
+            self._locations[entry_id] = (int(cluster_idx), row)
+
+
+class SemanticCache:
+    """
+    Near-duplicate prompt cache: one vector index per scope (provider, model and the
+    rest of the request), answering when the nearest cached prompt is at least
+    `threshold` cosine-similar. `capacity` bounds the entries of all scopes together,
+    evicting the oldest entry of any scope first; the least recently used scopes are
+    dropped beyond `max_scopes`.
+    """
+
+    def __init__(self, threshold: float, capacity: int, max_scopes: int, nlist: int = 128, nprobe: int = 4):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.max_scopes = max_scopes
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._indexes: "OrderedDict[Hashable, VectorIndex]" = OrderedDict()
+        self._ids = itertools.count()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, scope: Hashable, vector: Sequence[float]) -> Optional[Tuple[float, Any]]:
+        index = self._indexes.get(scope)
+        match = index.search(vector) if index is not None else None
+        if match is not None and match[0] >= self.threshold:
+            self._indexes.move_to_end(scope)
+            self.hits += 1
+            return match
+        self.misses += 1
+        return None
+
+    def add(self, scope: Hashable, vector: Sequence[float], payload: Any) -> None:
+        self.add_many(scope, [vector], [payload])
+
+    def add_many(self, scope: Hashable, vectors: Sequence[Sequence[float]], payloads: Sequence[Any]) -> None:
+        index = self._indexes.get(scope)
+        if index is None:
+            index = VectorIndex(len(vectors[0]), self.capacity, nlist=self.nlist, nprobe=self.nprobe, ids=self._ids)
+            self._indexes[scope] = index
+            while len(self._indexes) > self.max_scopes:
+                _, dropped = self._indexes.popitem(last=False)
+                self._size -= len(dropped)
+        self._indexes.move_to_end(scope)
+        before = len(index)
+        index.add_many(vectors, payloads)
+        self._size += len(index) - before
+        while self._size > self.capacity:
+            # Entry ids increase across scopes, so the smallest head is the oldest entry overall
+            oldest = min((i for i in self._indexes.values() if len(i)), key=lambda i: i.oldest())
+            oldest.evict_oldest()
+            self._size -= 1
+
+    def clear(self) -> None:
+        self._indexes.clear()
+        self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "scopes": len(self._indexes),
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    capacity=settings.SEMANTIC_CACHE_CAPACITY,
+    max_scopes=settings.SEMANTIC_CACHE_MAX_SCOPES,
+    nlist=settings.SEMANTIC_CACHE_NLIST,
+    nprobe=settings.SEMANTIC_CACHE_NPROBE,
+)
@@ -0,0 +1,64 @@
+"""
+JSON on the response path.
+
+Upstream bodies are decoded, and responses encoded, with orjson when it is installed,
+otherwise with pydantic's Rust encoder and the stdlib decoder. Models are encoded
+straight from their fields, so output the services already built and validated is
+never validated again on the way out.
+"""
+import json
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from core.tracing import stage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _fields(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON bytes; models give the same fields as `model_dump_json()`."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_fields)
+    return to_json(obj)
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # Already-encoded bodies (e.g. a payload just stored in the cache) pass through
+        if isinstance(content, bytes):
+            return content
+        with stage("serialize"):
+            return dumps(content)
+
+
+def model_response(content: Any, http_response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    Return trusted service output as-is. FastAPI would validate a returned model again
+    against the route's `response_model` before encoding it; returning a response skips
+    that, so headers and status set on the endpoint's injected `Response` are carried
+    over here, as FastAPI does for the responses it builds.
+    """
+    response = FastJSONResponse(content)
+    if http_response is not None:
+        if http_response.status_code:
+            response.status_code = http_response.status_code
+        response.raw_headers.extend(http_response.raw_headers)
+    return response
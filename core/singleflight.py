@@ -0,0 +1,61 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from core.metrics import REGISTRY
+
+T = TypeVar("T")
+
+COALESCED = REGISTRY.counter(
+    "gateway_singleflight_coalesced_total",
+    "Requests that awaited an identical in-flight upstream call instead of making their own",
+    ["provider"],
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight calls: the first caller for a key starts the call
+    and concurrent callers with the same key await the same result.
+
+    The call runs in its own task, so one caller going away (e.g. the leader's client
+    disconnecting) does not cancel it for the others; it is only cancelled once every
+    caller waiting on it has gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]], label: str = "") -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            COALESCED.labels(label).inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+chat_flights = SingleFlight()
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, TypeVar
+
+from pydantic import BaseModel
+from starlette.responses import StreamingResponse
+
+from core.errors import InvalidRequestError, LLMGatewayError
+from core.telemetry import ERRORS, count_error
+
+logger = logging.getLogger("llm_gateway")
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def buffered(source: AsyncIterator[T], maxsize: int) -> AsyncIterator[T]:
+    """
+    Read `source` ahead of the consumer into a bounded queue.
+
+    Once `maxsize` items are waiting the producer stops reading, so a slow client
+    applies backpressure all the way to the upstream connection. Closing or cancelling
+    the returned iterator cancels the producer, which closes the upstream stream.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+
+async def prime(stream: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Wait for the first item of `stream` and return an iterator that replays it.
+
+    Errors raised before anything was produced (bad credentials, unknown model, ...)
+    therefore surface as a regular error response instead of a broken event stream.
+    """
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = _DONE
+    except BaseException:
+        await stream.aclose()
+        raise
+
+    async def resumed() -> AsyncIterator[T]:
+        try:
+            if first is _DONE:
+                return
+            yield first
+            async for item in stream:
+                yield item
+        finally:
+            await stream.aclose()
+
+    return resumed()
+
+
+async def sse_events(chunks: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    """Encode chunks as server-sent events, terminated by OpenAI's `[DONE]` sentinel."""
+    try:
+        async for chunk in chunks:
+            yield f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+    except LLMGatewayError as e:
+        count_error(e)
+        yield f"data: {json.dumps(e.to_dict())}\n\n"
+        return
+    except Exception as e:
+        # Headers are already sent, so the error can only be reported in-band
+        logger.exception("Stream failed after it started")
+        ERRORS.labels("provider_error", 502).inc()
+        yield f"data: {json.dumps({'error': True, 'code': 'provider_error', 'message': str(e)})}\n\n"
+        return
+    yield "data: [DONE]\n\n"
+
+
+async def split_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without holding more than one partial line."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+        if len(pending) > max_line_bytes:
+            raise InvalidRequestError(f"Input line longer than {max_line_bytes} bytes")
+    if pending:
+        yield pending
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    A streaming response whose body is produced while the request body is still being
+    read. Starlette's disconnect listener would compete with the handler for request
+    body messages, so it is skipped; `api.middleware.DeadlineMiddleware` watches for
+    disconnects instead.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
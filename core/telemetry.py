@@ -0,0 +1,143 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from core.errors import LLMGatewayError
+from core.metrics import REGISTRY
+
+# Finer buckets for the gateway's own overhead, which should be well under upstream latency
+OVERHEAD_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "gateway_http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "gateway_http_requests_in_flight",
+    "Requests currently being handled",
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    "gateway_request_duration_seconds",
+    "End-to-end latency of model requests",
+    ["endpoint", "provider", "model"],
+)
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "gateway_upstream_duration_seconds",
+    "Time upstream calls held a provider slot, excluding queueing",
+    ["provider"],
+)
+GATEWAY_OVERHEAD = REGISTRY.histogram(
+    "gateway_overhead_seconds",
+    "Non-streaming request time not spent in upstream calls",
+    ["endpoint"],
+    buckets=OVERHEAD_BUCKETS,
+)
+STREAM_TTFT = REGISTRY.histogram(
+    "gateway_stream_ttft_seconds",
+    "Time from receiving a streaming request to relaying its first chunk",
+    ["provider", "model"],
+)
+STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "gateway_stream_tokens_per_second",
+    "Completion tokens per second after the first chunk of a stream",
+    ["provider", "model"],
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+ERRORS = REGISTRY.counter(
+    "gateway_errors_total",
+    "Error responses by core.errors code",
+    ["code", "status"],
+)
+TOKENS = REGISTRY.counter(
+    "gateway_tokens_total",
+    "Tokens reported in provider usage",
+    ["provider", "model", "kind"],
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "gateway_cache_entries",
+    "Entries held in memory by each cache",
+    ["cache"],
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "gateway_cache_lookups_total",
+    "Cache lookups by result",
+    ["cache", "result"],
+)
+
+
+class RequestTiming:
+    """Where one request's time went; filled in as it passes through the gateway."""
+    __slots__ = ("started", "endpoint", "provider", "model", "upstream", "streaming")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint: Optional[str] = None
+        self.provider: Optional[str] = None
+        self.model: Optional[str] = None
+        self.upstream = 0.0
+        self.streaming = False
+
+    def finish(self) -> float:
+        """Record the request's latency (and overhead, if not streamed) once its labels are known."""
+        elapsed = time.perf_counter() - self.started
+        if self.endpoint is not None:
+            REQUEST_DURATION.labels(self.endpoint, self.provider, self.model).observe(elapsed)
+            if not self.streaming:
+                GATEWAY_OVERHEAD.labels(self.endpoint).observe(max(0.0, elapsed - self.upstream))
+        return elapsed
+
+
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("current_timing", default=None)
+
+# Label for values not (yet) known to be bounded, such as a model the catalogue does not list
+UNKNOWN_LABEL = "unknown"
+
+
+def label_request(endpoint: str, provider: str, model: str) -> None:
+    timing = current_timing.get()
+    if timing is not None:
+        timing.endpoint, timing.provider, timing.model = endpoint, provider, model
+
+
+def add_upstream(provider: str, seconds: float) -> None:
+    UPSTREAM_DURATION.labels(provider).observe(seconds)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.upstream += seconds
+
+
+def mark_streaming() -> None:
+    timing = current_timing.get()
+    if timing is not None:
+        timing.streaming = True
+
+
+def since_request_start() -> Optional[float]:
+    timing = current_timing.get()
+    return time.perf_counter() - timing.started if timing is not None else None
+
+
+def count_error(error: LLMGatewayError) -> None:
+    ERRORS.labels(error.code, error.status_code).inc()
+
+
+def count_tokens(provider: str, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    if prompt_tokens:
+        TOKENS.labels(provider, model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        TOKENS.labels(provider, model, "completion").inc(completion_tokens)
+
+
+@REGISTRY.collector
+def _collect_caches() -> None:
+    from core.cache import response_cache
+    from core.embedding_cache import embedding_cache
+    from core.semantic_cache import semantic_cache
+
+    for name, cache in (("response", response_cache), ("semantic", semantic_cache), ("embedding", embedding_cache)):
+        stats = cache.stats()
+        CACHE_ENTRIES.labels(name).set(stats["entries"])
+        CACHE_LOOKUPS.labels(name, "hit").set(stats["hits"])
+        CACHE_LOOKUPS.labels(name, "miss").set(stats["misses"])
@@ -0,0 +1,260 @@
+import base64
+import heapq
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence
+
+from config import settings
+
+logger = logging.getLogger("llm_gateway")
+
+try:  # Optional: the Rust implementation is much faster when installed
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:  # Optional: needed for the exact \p{L}/\p{N} pre-tokenization patterns
+    import regex
+except ImportError:
+    regex = None
+
+# Pre-tokenization patterns used by OpenAI's encodings
+CL100K_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+O200K_PATTERN = "|".join([
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+    r"""\p{N}{1,3}""",
+    r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+    r"""\s*[\r\n]+""",
+    r"""\s+(?!\S)""",
+    r"""\s+""",
+])
+# Standard-library approximation of CL100K_PATTERN: letters are [^\W\d_], digits \d
+STDLIB_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|(?:[^\r\n\w]|_)?[^\W\d_]+|\d{1,3}| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+
+ENCODING_PATTERNS = {
+    "cl100k_base": CL100K_PATTERN,
+    "o200k_base": O200K_PATTERN,
+}
+
+# Model name prefixes mapped to encodings, most specific first. Gemini's tokenizer is
+# not public, so it is approximated with cl100k_base.
+MODEL_ENCODINGS = [
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding-", "cl100k_base"),
+    ("gemini", "cl100k_base"),
+]
+DEFAULT_ENCODING = "cl100k_base"
+
+# Chat framing overhead per OpenAI's token counting guide
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def load_tiktoken_bpe(path: str) -> Dict[bytes, int]:
+    """Read a `.tiktoken` vocabulary file: one base64 token and its merge rank per line."""
+    ranks: Dict[bytes, int] = {}
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                token, rank = line.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+class BPEEncoding:
+    """Pure-Python byte pair encoder over a tiktoken-format vocabulary."""
+
+    def __init__(self, name: str, ranks: Dict[bytes, int], pattern: str):
+        self.name = name
+        self.ranks = ranks
+        if regex is not None:
+            self._pattern = regex.compile(pattern)
+        else:
+            self._pattern = re.compile(STDLIB_PATTERN)
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in self._pattern.findall(text):
+            data = piece.encode("utf-8")
+            total += 1 if data in self.ranks else len(self._merge(data))
+        return total
+
+    def encode(self, text: str) -> List[int]:
+        tokens: List[int] = []
+        for piece in self._pattern.findall(text):
+            data = piece.encode("utf-8")
+            rank = self.ranks.get(data)
+            if rank is not None:
+                tokens.append(rank)
+            else:
+                tokens.extend(self.ranks[part] for part in self._merge(data))
+        return tokens
+
+    def _merge(self, data: bytes) -> List[bytes]:
+        """
+        Repeatedly merge the adjacent pair with the lowest rank (leftmost on ties) until none
+        is in the vocabulary. Parts form a linked list indexed by their start offset and
+        candidate pairs sit in a heap, so a long unbroken piece costs O(n log n), not O(n^2).
+        """
+        n = len(data)
+        ranks = self.ranks
+        parts: List[Optional[bytes]] = [data[i:i + 1] for i in range(n)]
+        following = list(range(1, n + 1))
+        preceding = list(range(-1, n - 1))
+        # (rank, start, length): a pair starting at `start` that spans `length` bytes
+        heap = []
+        for i in range(n - 1):
+            rank = ranks.get(data[i:i + 2])
+            if rank is not None:
+                heap.append((rank, i, 2))
+        heapq.heapify(heap)
+
+        def push(start: int) -> None:
+            right = following[start]
+            if right < n:
+                rank = ranks.get(parts[start] + parts[right])
+                if rank is not None:
+                    heapq.heappush(heap, (rank, start, len(parts[start]) + len(parts[right])))
+
+        while heap:
+            rank, start, length = heapq.heappop(heap)
+            right = following[start]
+            # Parts only grow, so an entry whose span no longer matches two adjacent parts is stale
+            if parts[start] is None or right >= n or len(parts[start]) + len(parts[right]) != length:
+                continue
+            parts[start] += parts[right]
+            parts[right] = None
+            following[start] = following[right]
+            if following[start] < n:
+                preceding[following[start]] = start
+            if preceding[start] >= 0:
+                push(preceding[start])
+            push(start)
+        return [part for part in parts if part is not None]
+
+
+class TokenCounter:
+    """
+    Token counting for prompts, conversations and embedding inputs.
+
+    Encodings are loaded once, on first use, from `<vocab_dir>/<encoding>.tiktoken`
+    (through `tiktoken` when it is installed, otherwise with the pure-Python encoder).
+    Per-text counts are memoised in an LRU cache keyed by a hash of the text, so
+    cached prompts are not kept alive. Without a vocabulary file the counter falls
+    back to a words * 1.3 estimate.
+    """
+
+    def __init__(self, vocab_dir: Optional[str], cache_size: int):
+        self.vocab_dir = vocab_dir
+        self.cache_size = cache_size
+        self._encodings: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        # Two generations of at most cache_size / 2 counts each: hits in the older one are
+        # promoted, and the older one is dropped whole when the recent one fills up
+        self._recent: Dict[int, int] = {}
+        self._older: Dict[int, int] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def encoding_for_model(self, model: Optional[str]) -> str:
+        if model:
+            for prefix, encoding in MODEL_ENCODINGS:
+                if model.startswith(prefix):
+                    return encoding
+        return DEFAULT_ENCODING
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        return self._count_cached(self.encoding_for_model(model), text)
+
+    def count_many(self, texts: Sequence[str], model: Optional[str] = None) -> List[int]:
+        """Count a batch of texts (e.g. an embedding input list) in one call."""
+        encoding = self.encoding_for_model(model)
+        return [self._count_cached(encoding, text) for text in texts]
+
+    def message_counts(self, messages: Sequence, model: Optional[str] = None) -> List[int]:
+        """Tokens each chat message contributes to the prompt, including its framing."""
+        encoding = self.encoding_for_model(model)
+        counts = []
+        for message in messages:
+            tokens = TOKENS_PER_MESSAGE + self._count_cached(encoding, _value(message.role))
+            tokens += self._count_cached(encoding, message.content)
+            if message.name:
+                tokens += TOKENS_PER_NAME + self._count_cached(encoding, message.name)
+            counts.append(tokens)
+        return counts
+
+    def count_messages(self, messages: Sequence, model: Optional[str] = None) -> int:
+        """Prompt tokens for a whole conversation, including the assistant reply priming."""
+        return sum(self.message_counts(messages, model)) + TOKENS_PER_REPLY
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self.cache_size, len(self._recent) + len(self._older))
+
+    def _count_cached(self, encoding_name: str, text: str) -> int:
+        # Keyed by the 64-bit hashes of the text (computed once per string, as a dict key
+        # would) and the encoding, never the text itself; a collision only skews an estimate
+        key = hash(text) ^ hash(encoding_name)
+        count = self._recent.get(key)
+        if count is not None:
+            self._hits += 1
+            return count
+        count = self._older.get(key)
+        if count is not None:
+            self._hits += 1
+        else:
+            self._misses += 1
+            count = self._count_uncached(encoding_name, text)
+        if self.cache_size > 0:
+            recent = self._recent
+            recent[key] = count
+            if len(recent) >= max(1, self.cache_size // 2):
+                self._older, self._recent = recent, {}
+        return count
+
+    def _count_uncached(self, encoding_name: str, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._encoding(encoding_name)
+        if encoding is None:
+            return int(len(text.split()) * 1.3)
+        if isinstance(encoding, BPEEncoding):
+            return encoding.count(text)
+        return len(encoding.encode_ordinary(text))
+
+    def _encoding(self, name: str):
+        if name in self._encodings:
+            return self._encodings[name]
+        with self._lock:
+            if name not in self._encodings:
+                self._encodings[name] = self._load(name)
+        return self._encodings[name]
+
+    def _load(self, name: str):
+        path = os.path.join(self.vocab_dir, f"{name}.tiktoken") if self.vocab_dir else None
+        if not path or not os.path.exists(path):
+            logger.warning(f"No vocabulary for '{name}' (looked in {self.vocab_dir!r}); using estimated token counts")
+            return None
+        ranks = load_tiktoken_bpe(path)
+        if tiktoken is not None:
+            return tiktoken.Encoding(name, pat_str=ENCODING_PATTERNS[name], mergeable_ranks=ranks, special_tokens={})
+        return BPEEncoding(name, ranks, ENCODING_PATTERNS[name])
+
+
+def _value(role) -> str:
+    return getattr(role, "value", role)
+
+
+token_counter = TokenCounter(settings.TOKENIZER_VOCAB_DIR, settings.TOKENIZER_CACHE_SIZE)
@@ -0,0 +1,117 @@
+"""
+Per-request stage timing.
+
+A `StageTrace` is set for each HTTP request (by `api.middleware.TracingMiddleware`)
+and code on the request path times its part with `with stage("name"):`. Stages nest:
+each records only its own time, not that of the stages inside it, so a request's
+stages add up to its total. The breakdown is sent back in the `Server-Timing` header:
+
+    Server-Timing: parse;dur=0.41, handler;dur=0.92, queue;dur=0.01, convert_request;dur=0.05,
+                   upstream;dur=812.30, convert_response;dur=0.21, serialize;dur=0.33, total;dur=814.23
+"""
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+
+
+class StageTrace:
+    """Where one request's time went, by stage, in the order the stages first ran."""
+    __slots__ = ("started", "stages", "returned")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        # When the endpoint returned, so the time until the response starts is serialization
+        self.returned: Optional[float] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def responded(self) -> float:
+        """Close the trace when the response starts; returns the total so far."""
+        now = time.perf_counter()
+        if self.returned is not None:
+            self.add("serialize", now - self.returned)
+            self.returned = None
+        return now - self.started
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+    def fields(self) -> Dict[str, float]:
+        """The stages in milliseconds, for structured logs."""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+
+current_trace: ContextVar[Optional[StageTrace]] = ContextVar("current_trace", default=None)
+_active_stage: ContextVar[Optional["_Stage"]] = ContextVar("active_stage", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "trace", "started", "children", "parent", "token")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        self.trace = current_trace.get()
+        if self.trace is not None:
+            self.trace.stages.setdefault(self.name, 0.0)
+            self.children = 0.0
+            self.parent = _active_stage.get()
+            self.token = _active_stage.set(self)
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        if self.trace is not None:
+            elapsed = time.perf_counter() - self.started
+            _active_stage.reset(self.token)
+            # Concurrent children (e.g. hedged attempts) can add up to more than the parent
+            self.trace.add(self.name, max(0.0, elapsed - self.children))
+            if self.parent is not None:
+                self.parent.children += elapsed
+        return False
+
+
+def stage(name: str) -> _Stage:
+    """
+    Time a block as stage `name` of the current request; a no-op outside one.
+
+    Don't hold a stage open across a `yield` in a generator: it may be resumed in
+    another context.
+    """
+    return _Stage(name)
+
+
+class TracedRoute(APIRoute):
+    """
+    Route that splits a request's time into `parse` (reading the body, validation and
+    dependencies), `handler` (the endpoint, less the stages inside it) and, via
+    `StageTrace.responded`, `serialize` (response model validation and encoding).
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            endpoint = _traced(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _traced(endpoint):
+    @functools.wraps(endpoint)
+    async def traced(*args, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return await endpoint(*args, **kwargs)
+        trace.add("parse", time.perf_counter() - trace.started)
+        with stage("handler"):
+            result = await endpoint(*args, **kwargs)
+        trace.returned = time.perf_counter()
+        return result
+    return traced
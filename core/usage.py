@@ -0,0 +1,317 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import settings
+from core.models import Usage
+from core.telemetry import UNKNOWN_LABEL, RequestTiming, count_tokens, label_request
+
+logger = logging.getLogger("llm_gateway")
+
+# (minute, endpoint, provider, model, user, cache)
+RollupKey = Tuple[int, str, str, str, str, str]
+ROLLUP_FIELDS = ["requests", "prompt_tokens", "completion_tokens", "total_tokens", "latency_ms_sum", "errors"]
+
+# Records made while handling the current HTTP request; set by UsageMiddleware
+current_records: ContextVar[Optional[List["UsageRecord"]]] = ContextVar("usage_records", default=None)
+
+
+@dataclass
+class UsageRecord:
+    """Token usage of one chat or embedding response."""
+    timestamp: float
+    endpoint: str
+    provider: str
+    model: str
+    user: Optional[str]
+    cache: str
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    latency_ms: float = 0.0
+    status_code: int = 200
+
+
+def record_usage(
+    endpoint: str,
+    provider: str,
+    model: str,
+    usage: Optional[Usage],
+    user: Optional[str] = None,
+    cache: str = "bypass"
+) -> None:
+    """
+    Attach a usage record to the current request.
+
+    The middleware adds latency and status once the response has been sent and hands
+    the record to the tracker. Outside a request the record is queued immediately.
+    """
+    label_request(endpoint, provider, model)
+    if usage:
+        count_tokens(provider, model, usage.prompt_tokens, usage.completion_tokens)
+    if not usage_tracker.enabled:
+        return
+    record = UsageRecord(
+        timestamp=time.time(), endpoint=endpoint, provider=provider, model=model, user=user, cache=cache,
+        prompt_tokens=usage.prompt_tokens if usage else 0,
+        completion_tokens=usage.completion_tokens if usage else 0,
+        total_tokens=usage.total_tokens if usage else 0,
+    )
+    records = current_records.get()
+    if records is None:
+        usage_tracker.push(record)
+    else:
+        records.append(record)
+
+
+def error_record(endpoint: str, timing: Optional[RequestTiming]) -> UsageRecord:
+    """
+    A zero-token record for a request that failed before any usage was recorded, with
+    the endpoint, provider and model the router labelled it with, if it got that far.
+    """
+    labelled = timing is not None and timing.endpoint is not None
+    return UsageRecord(
+        timestamp=time.time(),
+        endpoint=timing.endpoint if labelled else endpoint,
+        provider=timing.provider if labelled else UNKNOWN_LABEL,
+        model=timing.model if labelled else UNKNOWN_LABEL,
+        user=None, cache="bypass", prompt_tokens=0, completion_tokens=0, total_tokens=0,
+    )
+
+
+def rollup(records: List[UsageRecord]) -> Dict[RollupKey, List[float]]:
+    """Aggregate records into per-minute totals."""
+    rollups: Dict[RollupKey, List[float]] = {}
+    for r in records:
+        key = (int(r.timestamp // 60) * 60, r.endpoint, r.provider, r.model, r.user or "", r.cache)
+        row = rollups.get(key)
+        if row is None:
+            row = rollups[key] = [0, 0, 0, 0, 0.0, 0]
+        row[0] += 1
+        row[1] += r.prompt_tokens
+        row[2] += r.completion_tokens
+        row[3] += r.total_tokens
+        row[4] += r.latency_ms
+        row[5] += r.status_code >= 400
+    return rollups
+
+
+class SQLiteUsageSink:
+    """Raw records plus per-minute rollups (upserted) in one SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def write(self, records: List[UsageRecord], rollups: Dict[RollupKey, List[float]]) -> None:
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.executemany(
+                    "INSERT INTO usage_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [tuple(asdict(r).values()) for r in records],
+                )
+                db.executemany(
+                    "INSERT INTO usage_rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (minute, endpoint, provider, model, user, cache) DO UPDATE SET "
+                    + ", ".join(f"{f} = {f} + excluded.{f}" for f in ROLLUP_FIELDS),
+                    [(*key, *values) for key, values in rollups.items()],
+                )
+
+    def query(self, start: float, end: float, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        where = " AND ".join(["minute >= ?", "minute < ?", *[f"{column} = ?" for column in filters]])
+        with self._lock:
+            cursor = self._connection().execute(
+                f"SELECT * FROM usage_rollups WHERE {where} ORDER BY minute", (start, end, *filters.values())
+            )
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS usage_records (timestamp REAL, endpoint TEXT, provider TEXT, "
+                "model TEXT, user TEXT, cache TEXT, prompt_tokens INTEGER, completion_tokens INTEGER, "
+                "total_tokens INTEGER, latency_ms REAL, status_code INTEGER)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS usage_rollups (minute INTEGER, endpoint TEXT, provider TEXT, "
+                "model TEXT, user TEXT, cache TEXT, requests INTEGER, prompt_tokens INTEGER, "
+                "completion_tokens INTEGER, total_tokens INTEGER, latency_ms_sum REAL, errors INTEGER, "
+                "PRIMARY KEY (minute, endpoint, provider, model, user, cache))"
+            )
+        return self._db
+
+
+class JSONLUsageSink:
+    """
+    Append-only JSON Lines files, rotated by size: `usage.jsonl` holds raw records and
+    `usage-rollups.jsonl` the per-minute rollup deltas of each flushed batch.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, backups: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, records: List[UsageRecord], rollups: Dict[RollupKey, List[float]]) -> None:
+        self._append("usage.jsonl", [asdict(r) for r in records])
+        self._append("usage-rollups.jsonl", [_rollup_row(key, values) for key, values in rollups.items()])
+
+    def close(self) -> None:
+        pass
+
+    def _append(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+            self._rotate(path)
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def _rotate(self, path: str) -> None:
+        # usage.jsonl -> usage.jsonl.1 -> ... -> usage.jsonl.<backups>, dropping the oldest
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+
+
+class UsageTracker:
+    """
+    Off-the-response-path usage accounting.
+
+    Records go onto a bounded in-memory ring buffer (the oldest are dropped when it is
+    full). A background task drains it in batches every `flush_interval` seconds,
+    folds each batch into per-minute rollups and hands both to the sink in a worker
+    thread. Rollups are also kept in memory for `retention_minutes` to answer queries
+    when the sink cannot.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        buffer_size: int,
+        flush_interval: float,
+        batch_size: int,
+        retention_minutes: int,
+        sink=None
+    ):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention = retention_minutes * 60
+        self.sink = sink
+        self._buffer: Deque[UsageRecord] = deque(maxlen=buffer_size)
+        self._rollups: Dict[RollupKey, List[float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    def push(self, record: UsageRecord) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+        self.recorded += 1
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._drain_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.sink is not None:
+            self.sink.close()
+
+    async def flush(self) -> None:
+        """Drain everything currently buffered, one batch at a time."""
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            rollups = rollup(batch)
+            self._merge(rollups)
+            if self.sink is not None:
+                try:
+                    await asyncio.to_thread(self.sink.write, batch, rollups)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.write_errors += 1
+                    logger.warning(f"Writing {len(batch)} usage records failed: {e}")
+
+    async def query(self, start: float, end: float, **filters: Optional[str]) -> List[Dict[str, Any]]:
+        """Per-minute rollups with `start <= minute < end`, optionally filtered by column."""
+        filters = {column: value for column, value in filters.items() if value is not None}
+        if hasattr(self.sink, "query"):
+            return await asyncio.to_thread(self.sink.query, start, end, filters)
+        rows = [_rollup_row(key, values) for key, values in sorted(self._rollups.items()) if start <= key[0] < end]
+        return [row for row in rows if all(row[column] == value for column, value in filters.items())]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "write_errors": self.write_errors,
+        }
+
+    def _merge(self, rollups: Dict[RollupKey, List[float]]) -> None:
+        for key, values in rollups.items():
+            row = self._rollups.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                row[i] += value
+        cutoff = time.time() - self.retention
+        for key in [key for key in self._rollups if key[0] < cutoff]:
+            del self._rollups[key]
+
+    async def _drain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+def _rollup_row(key: RollupKey, values: List[float]) -> Dict[str, Any]:
+    return dict(zip(["minute", "endpoint", "provider", "model", "user", "cache", *ROLLUP_FIELDS], (*key, *values)))
+
+
+def _build_sink():
+    if settings.USAGE_SQLITE_PATH:
+        return SQLiteUsageSink(settings.USAGE_SQLITE_PATH)
+    if settings.USAGE_JSONL_DIR:
+        return JSONLUsageSink(settings.USAGE_JSONL_DIR, settings.USAGE_JSONL_MAX_BYTES, settings.USAGE_JSONL_BACKUPS)
+    return None
+
+
+usage_tracker = UsageTracker(
+    enabled=settings.USAGE_TRACKING_ENABLED,
+    buffer_size=settings.USAGE_BUFFER_SIZE,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+    batch_size=settings.USAGE_FLUSH_BATCH_SIZE,
+    retention_minutes=settings.USAGE_ROLLUP_RETENTION_MINUTES,
+    sink=_build_sink(),
+)
@@ -1,3 +1,4 @@
+import os
 import time
 import json
 import hashlib
@@ -5,6 +6,7 @@ from typing import Any, Dict, List, Optional, Union
 import logging
 
 # Configure logging
+os.makedirs("logs", exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -53,18 +55,28 @@ def format_log_messages(messages: List[Dict[str, Any]]) -> str:
     
     return " | ".join(formatted)
 
+def equivalent_models(model: str) -> Dict[str, str]:
+    """
+    Provider -> model mapping of the equivalence group `model` belongs to, looked up by
+    group name first and then by membership. Empty if the model is not mapped.
+    """
+    from core.constants import MODEL_MAPPINGS
+
+    if model in MODEL_MAPPINGS:
+        return MODEL_MAPPINGS[model]
+    for provider_mappings in MODEL_MAPPINGS.values():
+        if model in provider_mappings.values():
+            return provider_mappings
+    return {}
+
 def get_model_mapping(requested_model: str, provider: str, fallback_model: Optional[str] = None) -> str:
     """
     Get the equivalent model for a provider based on the requested model.
     If no mapping exists, returns the fallback model or the requested model.
     """
-    from core.constants import MODEL_MAPPINGS
-    
-    # Check if we have a mapping for this model
-    if requested_model in MODEL_MAPPINGS:
-        provider_mappings = MODEL_MAPPINGS[requested_model]
-        if provider in provider_mappings:
-            return provider_mappings[provider]
+    provider_mappings = equivalent_models(requested_model)
+    if provider in provider_mappings:
+        return provider_mappings[provider]
     
     # If no mapping exists, return the fallback or the original
-    return fallback_model or requested_model
\ No newline at end of file
+    return fallback_model or requested_model
@@ -1,12 +1,68 @@
-from fastapi import FastAPI
-from api.routers import chat, embeddings, models
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from api.middleware import DeadlineMiddleware, MetricsMiddleware, TracingMiddleware, UsageMiddleware
+from api.routers import cache, chat, embeddings, models, usage
+from core.cache import response_cache
+from core.errors import LLMGatewayError
+from core.metrics import REGISTRY
+from core.profiler import profiler
+from core.scheduler import scheduler
+from core.telemetry import count_error
+from core.usage import usage_tracker
+from services.health import health_monitor
+from services.http_client import http_clients
+from services.model_catalog import model_catalog
+from services.service_factory import service_registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled upstream client per provider for the lifetime of the app
+    await http_clients.start()
+    # Build provider adapters up front so misconfigured ones are flagged before traffic arrives
+    service_registry.warm_up()
+    await model_catalog.start(service_registry.available_providers())
+    usage_tracker.start()
+    # Probe providers in the background so /health and routing never wait on upstream I/O
+    health_monitor.start(service_registry.available_providers())
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        await health_monitor.stop()
+        await usage_tracker.stop()
+        await model_catalog.stop()
+        await http_clients.close()
+        response_cache.close()
+
 
 app = FastAPI(
     title="LLM Gateway API",
     description="A unified API gateway for multiple LLM providers",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Per-stage timing (Server-Timing header, optional log line and slow-request profiles); innermost,
+# so it runs in the handler's task
+app.add_middleware(TracingMiddleware)
+
+# Request deadlines and client-disconnect detection; cancels abandoned upstream calls
+app.add_middleware(DeadlineMiddleware)
+
+# Token usage accounting for chat and embedding responses
+app.add_middleware(UsageMiddleware)
+
+# Latency, in-flight and error metrics for every request (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(LLMGatewayError)
+async def gateway_error_handler(request: Request, exc: LLMGatewayError):
+    count_error(exc)
+    return JSONResponse(status_code=exc.status_code, content=exc.to_dict(), headers=exc.headers)
+
 # Include the Chat Completions router
 app.include_router(chat.router, prefix="/api/v1/chat", tags=["Chat Completions"])
 
@@ -16,6 +72,25 @@ app.include_router(embeddings.router, prefix="/api/v1/embeddings", tags=["Text E
 # Include the Model Information router
 app.include_router(models.router, prefix="/api/v1/models", tags=["Model Information"])
 
+# Include the Cache router
+app.include_router(cache.router, prefix="/api/v1/cache", tags=["Cache"])
+
+# Include the Usage router
+app.include_router(usage.router, prefix="/api/v1/usage", tags=["Usage"])
+
 @app.get("/health", tags=["Health Check"])
 async def health_check():
-    return {"status": "ok"}
+    # Served from the health monitor's cached state: no upstream calls on this path
+    health = health_monitor.status()
+    open_circuits = [p for p, h in health.items() if h["circuit"] != "closed"]
+    return {
+        "status": "degraded" if open_circuits else "ok",
+        "providers": service_registry.status(),
+        "provider_health": health,
+        "connection_pools": http_clients.stats(),
+        "scheduler": scheduler.stats()
+    }
+
+@app.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
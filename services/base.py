@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional, Union, List
-from core.models import ChatCompletionRequest, ChatCompletionResponse, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo
+from typing import Any, AsyncIterator, Dict, Optional, Union, List
+from core.models import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChunk, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo
 from core.models import Provider  # assume Provider is an Enum
 
 class BaseLLMService(ABC):
@@ -10,6 +10,11 @@ class BaseLLMService(ABC):
     async def get_chat_completion(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
         pass
 
+    @abstractmethod
+    def stream_chat_completion(self, request: ChatCompletionRequest) -> AsyncIterator[ChatCompletionChunk]:
+        """Yield normalized chunks as the provider produces them (implemented as an async generator)."""
+        pass
+
     @abstractmethod
     async def get_embeddings(self, request: TextEmbeddingRequest) -> TextEmbeddingResponse:
         pass
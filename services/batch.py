@@ -0,0 +1,345 @@
+"""
+Batch chat completions: the runner behind `POST /api/v1/chat/batch` and an offline
+JSONL runner.
+
+    python -m services.batch prompts.jsonl -o results.jsonl
+
+Each input line is a `ChatCompletionRequest` with an extra `id` (or `custom_id`).
+Each output line is `{"id", "status", "response"}` or `{"id", "status", "error"}`, in
+completion order.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set
+
+from pydantic import ValidationError
+
+from config import settings
+from core.context import fit_context
+from core.deadline import model_timeout
+from core.errors import (
+    DeadlineExceededError, InvalidRequestError, LLMGatewayError, RateLimitError, ServiceUnavailableError
+)
+from core.metrics import REGISTRY
+from core.models import ChatCompletionRequest, ChatCompletionResponse
+from core.rate_limit import rate_limiter
+from core.scheduler import Priority, scheduler
+from core.telemetry import UNKNOWN_LABEL, RequestTiming, count_error, current_timing, label_request
+from core.tokenizer import token_counter
+from core.usage import current_records, error_record, record_usage, usage_tracker
+from services import service_factory
+from services.health import health_monitor
+from services.model_catalog import model_catalog
+from services.resilience import resilient
+
+logger = logging.getLogger("llm_gateway")
+
+BATCH_ITEMS = REGISTRY.counter(
+    "gateway_batch_items_total",
+    "Batch records handled, by outcome (ok, error or skipped because already done)",
+    ["outcome"],
+)
+
+
+class BatchRunner:
+    """
+    Fans JSONL chat requests out to the providers and yields results as they finish.
+
+    At most `concurrency` records are in the runner at once, counting finished results
+    the consumer has not taken yet, so input is only read as fast as output is
+    consumed and memory stays flat however long the input is. Each provider gets at
+    most `provider_concurrency` of them, on the scheduler's batch priority. Records
+    that hit a rate limit or an overloaded provider wait for its Retry-After and try
+    again, a bounded number of times, within the model's deadline.
+    """
+
+    def __init__(self, concurrency: int, provider_concurrency: int):
+        self.concurrency = concurrency
+        self.provider_concurrency = provider_concurrency
+
+    async def run(
+        self,
+        lines: AsyncIterator[bytes],
+        api_key: Optional[str] = None,
+        skip: Optional[Callable[[str], bool]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result per input line, skipping ids for which `skip(id)` is true."""
+        slots = asyncio.Semaphore(self.concurrency)
+        provider_slots: Dict[str, asyncio.Semaphore] = {}
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: Set[asyncio.Task] = set()
+
+        def finished(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            if not task.cancelled():
+                results.put_nowait(task.result())
+
+        async def feed() -> None:
+            try:
+                number = 0
+                async for line in lines:
+                    number += 1
+                    if not line.strip():
+                        continue
+                    record = _parse(line)
+                    if isinstance(record, dict) and skip is not None and skip(str(record["id"])):
+                        BATCH_ITEMS.labels("skipped").inc()
+                        continue
+                    await slots.acquire()
+                    if not isinstance(record, dict):
+                        results.put_nowait(_error(f"line-{number}", record))
+                        continue
+                    task = asyncio.ensure_future(self._item(record, api_key, provider_slots))
+                    tasks.add(task)
+                    task.add_done_callback(finished)
+                while tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                results.put_nowait(None)
+            except Exception as e:
+                results.put_nowait(e)
+
+        feeder = asyncio.ensure_future(feed())
+        try:
+            while True:
+                result = await results.get()
+                if result is None:
+                    return
+                if isinstance(result, Exception):
+                    raise result
+                BATCH_ITEMS.labels("ok" if result["status"] == 200 else "error").inc()
+                yield result
+                slots.release()
+        finally:
+            feeder.cancel()
+            for task in list(tasks):
+                task.cancel()
+            await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+    async def _item(
+        self, record: Dict[str, Any], api_key: Optional[str], provider_slots: Dict[str, asyncio.Semaphore]
+    ) -> Dict[str, Any]:
+        """Complete one record; every failure becomes an error result rather than an exception."""
+        item_id = record.pop("id")
+        records = []
+        token = current_records.set(records)
+        # Each record is timed on its own rather than as part of the batch request
+        timing_token = current_timing.set(RequestTiming())
+        started = time.perf_counter()
+        try:
+            request = ChatCompletionRequest.model_validate(record)
+            if request.stream:
+                raise InvalidRequestError("Streaming is not supported in batches")
+            timeout = model_timeout(request.model)
+            try:
+                response = await asyncio.wait_for(self._complete(request, api_key, provider_slots), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("The record did not complete before its deadline", {"timeout": timeout})
+            result = {"id": item_id, "status": 200, "response": response.model_dump(mode="json", exclude_none=True)}
+        except ValidationError as e:
+            errors = [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+            result = _error(item_id, InvalidRequestError("Invalid chat completion request", {"errors": errors}))
+        except LLMGatewayError as e:
+            result = _error(item_id, e)
+        except Exception as e:
+            logger.exception(f"Batch record {item_id} failed")
+            result = _error(item_id, LLMGatewayError(str(e) or type(e).__name__))
+        finally:
+            timing = current_timing.get()
+            timing.finish()
+            current_timing.reset(timing_token)
+            current_records.reset(token)
+        if result["status"] >= 400 and not records and usage_tracker.enabled:
+            records.append(error_record("chat_batch", timing))
+        latency_ms = (time.perf_counter() - started) * 1000
+        for usage_record in records:
+            usage_record.latency_ms = latency_ms
+            usage_record.status_code = result["status"]
+            usage_tracker.push(usage_record)
+        return result
+
+    async def _complete(
+        self, request: ChatCompletionRequest, api_key: Optional[str], provider_slots: Dict[str, asyncio.Semaphore]
+    ) -> ChatCompletionResponse:
+        """The chat completion path of the router, minus caching, for one batch record."""
+        provider_name = request.provider or settings.DEFAULT_PROVIDER.lower()
+        if request.provider is None and settings.LATENCY_ROUTING_ENABLED:
+            provider_name, model = health_monitor.route(request.model, provider_name)
+            if model != request.model:
+                request = request.model_copy(update={"model": model})
+        service = service_factory.get_service(provider_name)
+        provider = service.provider.value
+        label_request("chat_batch", provider, UNKNOWN_LABEL)
+        if settings.VALIDATE_MODELS:
+            model_catalog.validate(provider, request.model)
+        if model_catalog.lookup(provider, request.model) is not None:
+            label_request("chat_batch", provider, request.model)
+        request, _ = fit_context(
+            request,
+            model_catalog.max_tokens(provider, request.model),
+            settings.CONTEXT_POLICY,
+            settings.CONTEXT_KEEP_LAST_TURNS
+        )
+        tokens = token_counter.count_messages(request.messages, request.model) + (request.max_tokens or 0)
+        reservation = await _wait_on_limits(lambda: rate_limiter.acquire(request.user, api_key, provider, tokens))
+
+        slot = provider_slots.setdefault(provider, asyncio.Semaphore(self.provider_concurrency))
+        try:
+            async with slot:
+                response, served_by = await _wait_on_limits(lambda: resilient.call(
+                    service, request, lambda svc, req: scheduler.run(
+                        svc.provider.value, Priority.BATCH, lambda: svc.get_chat_completion(req)
+                    )
+                ))
+        except BaseException:
+            # Failed or cancelled: give the token estimate back
+            reservation.settle(0)
+            raise
+        reservation.settle(response.usage.total_tokens if response.usage else 0)
+        record_usage("chat_batch", served_by.provider.value, request.model, response.usage, request.user)
+        return response
+
+
+async def _wait_on_limits(fn):
+    """
+    Call `fn` (sync or async), sleeping out 429/503s that carry a Retry-After, for at most
+    `BATCH_RETRY_MAX_ATTEMPTS` calls and `BATCH_RETRY_MAX_WAIT_SECONDS` of waiting. Errors
+    without a Retry-After (e.g. every provider failed) are final; so is the last one.
+    """
+    waited = 0.0
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = fn()
+            return await result if asyncio.iscoroutine(result) else result
+        except (RateLimitError, ServiceUnavailableError) as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            if retry_after is None or attempt >= settings.BATCH_RETRY_MAX_ATTEMPTS:
+                raise
+            delay = float(retry_after)
+            if waited + delay > settings.BATCH_RETRY_MAX_WAIT_SECONDS:
+                raise
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+def _parse(line: bytes):
+    """A record with its `id`, or the InvalidRequestError to report for the line."""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return InvalidRequestError(f"Invalid JSON: {e}")
+    if not isinstance(record, dict):
+        return InvalidRequestError("Each line must be a JSON object")
+    item_id = record.pop("id", None)
+    if item_id is None:
+        item_id = record.pop("custom_id", None)
+    if item_id is None:
+        return InvalidRequestError("Each line needs an 'id'")
+    record["id"] = item_id
+    return record
+
+
+def _error(item_id: Any, error: LLMGatewayError) -> Dict[str, Any]:
+    count_error(error)
+    return {"id": item_id, "status": error.status_code, "error": error.to_dict()}
+
+
+def is_final(result: Dict[str, Any]) -> bool:
+    """Whether a result should not be retried on a resumed run: successes and client errors."""
+    return result["status"] < 500 and result["status"] != 429
+
+
+class BatchCheckpoint:
+    """
+    Ids a run has finished, kept in SQLite so a restarted run can skip them without
+    loading them all into memory.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS finished (id TEXT PRIMARY KEY)")
+        self.conn.commit()
+
+    def __contains__(self, item_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM finished WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def add(self, item_id: str) -> None:
+        self.conn.execute("INSERT OR IGNORE INTO finished (id) VALUES (?)", (item_id,))
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+async def read_lines(path: str) -> AsyncIterator[bytes]:
+    """Read a file a block of lines at a time, off the event loop."""
+    with open(path, "rb") as f:
+        while True:
+            lines = await asyncio.to_thread(f.readlines, 1 << 16)
+            if not lines:
+                return
+            for line in lines:
+                yield line
+
+
+batch_runner = BatchRunner(
+    concurrency=settings.BATCH_CONCURRENCY,
+    provider_concurrency=settings.BATCH_PROVIDER_CONCURRENCY,
+)
+
+
+async def run_file(input_path: str, output_path: str, checkpoint_path: str, runner: BatchRunner = batch_runner) -> int:
+    """
+    Run a JSONL file through the runner, appending results to `output_path`.
+
+    A result is written and flushed before its id is checkpointed, so after a crash a
+    record may appear twice in the output but is never lost; failed records that may
+    succeed later (429 and 5xx) are not checkpointed and run again on resume.
+    """
+    checkpoint = BatchCheckpoint(checkpoint_path)
+    written = 0
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            async for result in runner.run(read_lines(input_path), skip=checkpoint.__contains__):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                if is_final(result):
+                    checkpoint.add(str(result["id"]))
+                written += 1
+    finally:
+        checkpoint.close()
+    return written
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from services.http_client import http_clients
+
+    await http_clients.start()
+    service_factory.service_registry.warm_up()
+    await model_catalog.start(service_factory.service_registry.available_providers())
+    usage_tracker.start()
+    try:
+        runner = BatchRunner(args.concurrency, args.provider_concurrency)
+        written = await run_file(args.input, args.output, args.checkpoint or f"{args.output}.checkpoint", runner)
+        logger.info(f"Wrote {written} results to {args.output}")
+    finally:
+        await usage_tracker.stop()
+        await model_catalog.stop()
+        await http_clients.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat completion requests through the gateway")
+    parser.add_argument("input", help="JSONL file, one ChatCompletionRequest with an 'id' per line")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="SQLite file of finished ids (default: <output>.checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    parser.add_argument("--provider-concurrency", type=int, default=settings.BATCH_PROVIDER_CONCURRENCY)
+    asyncio.run(_main(parser.parse_args()))
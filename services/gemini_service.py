@@ -1,52 +1,70 @@
 from services.base import BaseLLMService
-from core.models import ChatCompletionRequest, ChatCompletionResponse, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo, Provider, Message, Role
+from core.models import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChunk, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo, Provider, Message, Role
+from core.serialization import loads
+from core.tokenizer import token_counter
+from core.tracing import stage
+from services.http_client import http_clients
+from config import settings
 import os
 import httpx
-import json
-from typing import List, Optional, Dict, Any
-import google.generativeai as genai
+from typing import AsyncIterator, List, Optional, Dict, Any
 from datetime import datetime
 
+# Gemini finish reasons mapped to their OpenAI equivalents
+FINISH_REASONS = {
+    "STOP": "stop",
+    "MAX_TOKENS": "length",
+    "SAFETY": "content_filter",
+    "RECITATION": "content_filter",
+    "BLOCKLIST": "content_filter",
+    "PROHIBITED_CONTENT": "content_filter",
+    "SPII": "content_filter",
+}
+
 class GeminiService(BaseLLMService):
     provider = Provider.GEMINI
+    BASE_URL = settings.GOOGLE_API_BASE
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # An explicit client is used as-is (e.g. in tests); otherwise the shared pooled one
+        self._client = client
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        # Initialize the Gemini client
-        genai.configure(api_key=self.api_key)
-        # Initialize models
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.headers = {
+            "x-goog-api-key": self.api_key,
+            "Content-Type": "application/json"
+        }
 
-    async def get_chat_completion(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
-        # Convert messages to Gemini format
-        messages = []
-        for msg in request.messages:
-            if msg.role == Role.SYSTEM:
-                # Gemini doesn't have system messages, so we'll prepend it to the first user message
-                if messages and messages[-1]["role"] == Role.USER:
-                    messages[-1]["parts"][0]["text"] = f"{msg.content}\n\n{messages[-1]['parts'][0]['text']}"
-                continue
-            messages.append({
-                "role": msg.role,
-                "parts": [{"text": msg.content}]
-            })
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or http_clients.get(self.provider)
 
-        # Create chat session
-        chat = self.model.start_chat(history=messages[:-1] if len(messages) > 1 else [])
-        
-        # Get response
-        response = chat.send_message(
-            messages[-1]["parts"][0]["text"] if messages else "",
-            generation_config={
-                "temperature": request.temperature,
-                "top_p": request.top_p,
-                "max_output_tokens": request.max_tokens,
-                "candidate_count": 1,
-            }
+    async def get_chat_completion(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
+        with stage("convert_request"):
+            payload = self.build_generate_payload(request)
+        # Call the REST API on the pooled async client so generation never blocks the event loop
+        resp = await self.client.post(
+            f"{self.BASE_URL}/models/{request.model}:generateContent",
+            json=payload,
+            headers=self.headers,
         )
+        resp.raise_for_status()
+        with stage("convert_response"):
+            return self._chat_response(loads(resp.content), request)
+
+    def _chat_response(self, data: Dict[str, Any], request: ChatCompletionRequest) -> ChatCompletionResponse:
+        candidate = (data.get("candidates") or [{}])[0]
+        text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+        finish_reason = candidate.get("finishReason")
+
+        usage_metadata = data.get("usageMetadata")
+        if usage_metadata:
+            prompt_tokens = usage_metadata.get("promptTokenCount", 0)
+            completion_tokens = usage_metadata.get("candidatesTokenCount", 0)
+        else:
+            prompt_tokens = token_counter.count_messages(request.messages, request.model)
+            completion_tokens = self.count_tokens(text, request.model)
 
         # Convert response to our format
         return ChatCompletionResponse(
@@ -57,32 +75,110 @@ class GeminiService(BaseLLMService):
                 "index": 0,
                 "message": {
                     "role": Role.ASSISTANT,
-                    "content": response.text
+                    "content": text
                 },
-                "finish_reason": "stop"
+                "finish_reason": FINISH_REASONS.get(finish_reason, "stop") if finish_reason else "stop"
             }],
             usage={
-                "prompt_tokens": int(self.count_tokens(request.messages[-1].content)),
-                "completion_tokens": int(self.count_tokens(response.text)),
-                "total_tokens": int(self.count_tokens(request.messages[-1].content) + self.count_tokens(response.text))
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
             },
             provider=self.provider
         )
 
+    async def stream_chat_completion(self, request: ChatCompletionRequest) -> AsyncIterator[ChatCompletionChunk]:
+        chunk_id = f"gemini-{datetime.now().timestamp()}"
+        created = int(datetime.now().timestamp())
+        with stage("convert_request"):
+            payload = self.build_generate_payload(request)
+
+        async with self.client.stream(
+            "POST",
+            f"{self.BASE_URL}/models/{request.model}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=payload,
+            headers=self.headers,
+        ) as resp:
+            if resp.is_error:
+                await resp.aread()
+            resp.raise_for_status()
+            first = True
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                with stage("convert_response"):
+                    data = loads(line[len("data:"):])
+                    candidate = (data.get("candidates") or [{}])[0]
+                    text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+                    finish_reason = candidate.get("finishReason")
+                    chunk = ChatCompletionChunk(
+                        id=chunk_id,
+                        created=created,
+                        model=request.model,
+                        choices=[{
+                            "index": 0,
+                            "delta": {"role": Role.ASSISTANT, "content": text} if first else {"content": text},
+                            "finish_reason": FINISH_REASONS.get(finish_reason, "stop") if finish_reason else None
+                        }],
+                        provider=self.provider
+                    )
+                yield chunk
+                first = False
+
+    def build_generate_payload(self, request: ChatCompletionRequest) -> Dict[str, Any]:
+        """Build a REST generateContent body; system messages become the system instruction."""
+        contents = []
+        system_parts = []
+        for msg in request.messages:
+            if msg.role == Role.SYSTEM:
+                system_parts.append({"text": msg.content})
+                continue
+            contents.append({
+                "role": "model" if msg.role == Role.ASSISTANT else "user",
+                "parts": [{"text": msg.content}]
+            })
+
+        payload = {"contents": contents, "generationConfig": self._generation_config(request)}
+        if system_parts:
+            payload["systemInstruction"] = {"parts": system_parts}
+        return payload
+
+    def _generation_config(self, request: ChatCompletionRequest) -> Dict[str, Any]:
+        generation_config = {
+            "temperature": request.temperature,
+            "topP": request.top_p,
+            "maxOutputTokens": request.max_tokens,
+            "candidateCount": 1,
+            "stopSequences": [request.stop] if isinstance(request.stop, str) else request.stop,
+        }
+        return {k: v for k, v in generation_config.items() if v is not None}
+
     async def get_embeddings(self, request: TextEmbeddingRequest) -> TextEmbeddingResponse:
         raise NotImplementedError("Embeddings are not supported by gemini-2.0-flash-lite model")
 
     async def list_models(self) -> List[ModelInfo]:
-        return [
-            ModelInfo(
-                id="gemini-2.0-flash-lite",
-                name="Gemini Flash Lite",
-                provider=self.provider,
-                capabilities=["chat_completion"],
-                max_tokens=32768,
-                description="Gemini Flash Lite is a lightweight language model optimized for fast text generation and chat."
-            )
-        ]
+        # Every page of `GET /models`; only models that can generate content are servable here
+        models, params = [], {"pageSize": 1000}
+        while True:
+            resp = await self.client.get(f"{self.BASE_URL}/models", params=params, headers=self.headers)
+            resp.raise_for_status()
+            data = loads(resp.content)
+            for model in data.get("models", []):
+                if "generateContent" not in model.get("supportedGenerationMethods", ["generateContent"]):
+                    continue
+                model_id = model["name"].removeprefix("models/")
+                models.append(ModelInfo(
+                    id=model_id,
+                    name=model.get("displayName", model_id),
+                    provider=self.provider,
+                    capabilities=["chat_completion"],
+                    max_tokens=model.get("inputTokenLimit"),
+                    description=model.get("description", "")
+                ))
+            if not data.get("nextPageToken"):
+                return models
+            params = {**params, "pageToken": data["nextPageToken"]}
 
     async def get_model_info(self, model_id: str) -> Optional[ModelInfo]:
         models = await self.list_models()
@@ -93,20 +189,25 @@ class GeminiService(BaseLLMService):
 
     async def health_check(self) -> bool:
         try:
-            # Try to list models as a health check
-            await self.list_models()
+            # A one-item model listing: cheap, but it exercises the network path and the API key
+            resp = await self.client.get(
+                f"{self.BASE_URL}/models",
+                params={"pageSize": 1},
+                headers=self.headers,
+            )
+            resp.raise_for_status()
             return True
         except Exception:
             return False
 
     def convert_request(self, request: Any) -> Dict[str, Any]:
         if isinstance(request, ChatCompletionRequest):
+            # The cache and single-flight keys are built from this, so it carries the generation
+            # config exactly as generateContent receives it; penalties are not sent, so not keyed
             return {
                 "model": request.model,
                 "messages": [msg.model_dump() for msg in request.messages],
-                "temperature": request.temperature,
-                "top_p": request.top_p,
-                "max_tokens": request.max_tokens,
+                "generationConfig": self._generation_config(request),
             }
         elif isinstance(request, TextEmbeddingRequest):
             return {
@@ -136,6 +237,5 @@ class GeminiService(BaseLLMService):
         raise ValueError(f"Unsupported request type: {request_type}")
 
     def count_tokens(self, text: str, model: Optional[str] = None) -> int:
-        # This is a rough estimate. For accurate token counting, you should use
-        # a proper tokenizer
-        return int(len(text.split()) * 1.3)  # Rough estimate: 1.3 tokens per word, rounded to integer 
\ No newline at end of file
+        # Gemini's tokenizer is not public; this approximates it with a BPE encoding
+        return token_counter.count(text, model)
\ No newline at end of file
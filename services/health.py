@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import settings
+from core.metrics import REGISTRY
+from core.utils import equivalent_models
+from services import service_factory
+
+logger = logging.getLogger("llm_gateway")
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "gateway_circuit_state",
+    "Circuit breaker state per provider (0 closed, 1 half-open, 2 open)",
+    ["provider"],
+)
+LATENCY_EWMA = REGISTRY.gauge(
+    "gateway_provider_latency_ewma_seconds",
+    "Exponentially weighted moving average of upstream call latency",
+    ["provider"],
+)
+ERROR_RATE_EWMA = REGISTRY.gauge(
+    "gateway_provider_error_rate_ewma",
+    "Exponentially weighted moving average of upstream call failures",
+    ["provider"],
+)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+# Recent successful call latencies kept per provider and model for percentile estimates
+LATENCY_WINDOW = 256
+
+
+class ProviderHealth:
+    """Live-traffic statistics, last probe result and circuit breaker of one provider."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.trial_at = 0.0
+        self.probe: Dict[str, Any] = {}
+        self.recent: Dict[str, Deque[float]] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.state.value,
+            "latency_ewma_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate_ewma": round(self.error_rate, 4),
+            "samples": self.samples,
+            "consecutive_failures": self.consecutive_failures,
+            "last_probe": self.probe or None,
+        }
+
+
+class HealthMonitor:
+    """
+    Per-provider health from two sources: EWMA latency and error rate of live upstream
+    calls (recorded by the resilience layer) and a background prober calling each
+    adapter's `health_check` every `probe_interval` seconds.
+
+    The circuit opens after `failure_threshold` consecutive failures, or when the error
+    rate exceeds `error_rate_threshold` over at least `min_samples` calls. After
+    `cooldown` seconds it half-opens and lets one trial call through at a time (a
+    successful probe half-opens it early); a trial success closes it, a failure
+    re-opens it. Reads never do I/O.
+    """
+
+    def __init__(
+        self,
+        probe_interval: float,
+        probe_timeout: float,
+        alpha: float,
+        failure_threshold: int,
+        error_rate_threshold: float,
+        min_samples: int,
+        cooldown: float,
+        routing_hysteresis: float
+    ):
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.routing_hysteresis = routing_hysteresis
+        self._providers: Dict[str, ProviderHealth] = {}
+        # The provider each model is currently routed to, kept until another is clearly better
+        self._routes: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, providers: List[str]) -> None:
+        for provider in providers:
+            self._health(provider)
+        if self.probe_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def record(self, provider: str, latency: float, ok: bool, model: Optional[str] = None) -> None:
+        """Fold one live upstream call into the provider's statistics and circuit."""
+        health = self._health(provider)
+        health.samples += 1
+        if ok:
+            health.latency = latency if health.latency is None else health.latency + self.alpha * (latency - health.latency)
+            LATENCY_EWMA.labels(provider).set(health.latency)
+            if model is not None:
+                recent = health.recent.get(model)
+                if recent is None:
+                    recent = health.recent[model] = deque(maxlen=LATENCY_WINDOW)
+                recent.append(latency)
+        health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+        ERROR_RATE_EWMA.labels(provider).set(health.error_rate)
+
+        if ok:
+            health.consecutive_failures = 0
+            if health.state != CircuitState.CLOSED:
+                self._transition(health, CircuitState.CLOSED)
+            return
+        health.consecutive_failures += 1
+        if health.state == CircuitState.HALF_OPEN or (
+            health.state == CircuitState.CLOSED and (
+                health.consecutive_failures >= self.failure_threshold
+                or (health.samples >= self.min_samples and health.error_rate > self.error_rate_threshold)
+            )
+        ):
+            self._transition(health, CircuitState.OPEN)
+
+    def allow(self, provider: str) -> bool:
+        """Whether a call to `provider` may go ahead; grants the half-open trial call."""
+        health = self._providers.get(provider)
+        if health is None or health.state == CircuitState.CLOSED:
+            return True
+        now = time.monotonic()
+        if health.state == CircuitState.OPEN:
+            if now - health.opened_at < self.cooldown:
+                return False
+            self._transition(health, CircuitState.HALF_OPEN)
+        # One trial at a time; a trial that never reported back expires after the cooldown
+        if now - health.trial_at < self.cooldown:
+            return False
+        health.trial_at = now
+        return True
+
+    def is_closed(self, provider: str) -> bool:
+        health = self._providers.get(provider)
+        return health is None or health.state == CircuitState.CLOSED
+
+    def percentile(self, provider: str, model: str, q: float, min_samples: int = 20) -> Optional[float]:
+        """
+        The `q` quantile of recent successful latencies of `model` on `provider`, if there
+        are enough of them. Models are kept apart: a provider's small and large models
+        differ in latency by far more than any one of them varies.
+        """
+        health = self._providers.get(provider)
+        recent = health.recent.get(model) if health is not None else None
+        if recent is None or len(recent) < min_samples:
+            return None
+        ordered = sorted(recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def rank(self, candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Order (provider, model) candidates healthiest and fastest first: closed circuits,
+        then half-open, then open; within a state by latency inflated by the error rate.
+        Providers without statistics keep their relative order after those with some.
+        """
+        return sorted(candidates, key=lambda candidate: (self._state_value(candidate[0]), self._score(candidate[0])))
+
+    def route(self, model: str, default_provider: str) -> Tuple[str, str]:
+        """
+        Pick the provider (and its equivalent model) for a request that does not pin one,
+        among the candidates in the best circuit state. A model keeps the provider it is
+        routed to (at first the default one) while that stays in the best state, and only
+        moves to another whose score is at least `routing_hysteresis` lower. Without that
+        margin, traffic would herd onto whichever provider is fastest right now, slow it
+        down, and flap back.
+        """
+        available = service_factory.service_registry.available_providers()
+        candidates = {default_provider: model}
+        for provider, equivalent in equivalent_models(model).items():
+            if provider != default_provider and provider in available:
+                candidates[provider] = equivalent
+        if len(candidates) == 1:
+            # Nothing to choose from; also keeps `_routes` to the models of the equivalence table
+            return default_provider, model
+        best_state = min(self._state_value(provider) for provider in candidates)
+        eligible = [provider for provider in candidates if self._state_value(provider) == best_state]
+
+        current = self._routes.get(model)
+        if current not in eligible:
+            current = default_provider if default_provider in eligible else eligible[0]
+        # A provider without statistics yet keeps its traffic: that is how it gets some
+        fastest, current_score = min(eligible, key=self._score), self._score(current)
+        if current_score < float("inf") and self._score(fastest) < current_score * (1 - self.routing_hysteresis):
+            logger.info(f"Routing {model} from {current} to {fastest}")
+            current = fastest
+        self._routes[model] = current
+        return current, candidates[current]
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {provider: health.to_dict() for provider, health in self._providers.items()}
+
+    async def probe(self, provider: str) -> bool:
+        """Run the adapter's cheap `health_check` once and record the result."""
+        health = self._health(provider)
+        started = time.perf_counter()
+        try:
+            service = service_factory.get_service(provider)
+            ok = await asyncio.wait_for(service.health_check(), self.probe_timeout)
+            error = None if ok else "health check failed"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        health.probe = {
+            "ok": ok,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked_at": time.time(),
+            "error": error,
+        }
+        if ok and health.state == CircuitState.OPEN:
+            # The provider answers again: let live traffic try it without waiting out the cooldown
+            self._transition(health, CircuitState.HALF_OPEN)
+        elif not ok and health.state != CircuitState.OPEN:
+            self.record(provider, 0.0, False)
+        return ok
+
+    def _score(self, provider: str) -> float:
+        """Latency EWMA inflated by the error rate; infinite without statistics."""
+        health = self._providers.get(provider)
+        if health is None or health.latency is None:
+            return float("inf")
+        return health.latency * (1 + 10 * health.error_rate)
+
+    def _state_value(self, provider: str) -> int:
+        health = self._providers.get(provider)
+        return 0 if health is None else _STATE_VALUES[health.state]
+
+    def _health(self, provider: str) -> ProviderHealth:
+        health = self._providers.get(provider)
+        if health is None:
+            health = self._providers[provider] = ProviderHealth(provider)
+            CIRCUIT_STATE.labels(provider).set(0)
+        return health
+
+    def _transition(self, health: ProviderHealth, state: CircuitState) -> None:
+        logger.info(f"Circuit for {health.provider}: {health.state.value} -> {state.value}")
+        health.state = state
+        CIRCUIT_STATE.labels(health.provider).set(_STATE_VALUES[state])
+        if state == CircuitState.OPEN:
+            health.opened_at = time.monotonic()
+        elif state == CircuitState.CLOSED:
+            health.error_rate = 0.0
+            health.samples = 0
+        health.trial_at = 0.0
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.gather(*[self.probe(p) for p in list(self._providers)])
+            await asyncio.sleep(self.probe_interval)
+
+
+health_monitor = HealthMonitor(
+    probe_interval=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+    probe_timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+    alpha=settings.HEALTH_EWMA_ALPHA,
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    error_rate_threshold=settings.CIRCUIT_ERROR_RATE_THRESHOLD,
+    min_samples=settings.CIRCUIT_MIN_SAMPLES,
+    cooldown=settings.CIRCUIT_COOLDOWN_SECONDS,
+    routing_hysteresis=settings.LATENCY_ROUTING_HYSTERESIS,
+)
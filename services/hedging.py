@@ -0,0 +1,174 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from config import settings
+from core.cache import is_deterministic
+from core.errors import RateLimitError
+from core.metrics import REGISTRY
+from core.models import ChatCompletionRequest
+from services.base import BaseLLMService
+from services.health import health_monitor
+from services.resilience import resilient
+
+logger = logging.getLogger("llm_gateway")
+
+T = TypeVar("T")
+
+HEDGE_ELIGIBLE = REGISTRY.counter(
+    "gateway_hedge_eligible_total",
+    "Chat requests that could have been hedged",
+    ["provider"],
+)
+HEDGES = REGISTRY.counter(
+    "gateway_hedges_total",
+    "Second attempts sent because the first one was slower than the hedge delay",
+    ["provider"],
+)
+HEDGE_WINS = REGISTRY.counter(
+    "gateway_hedge_wins_total",
+    "Hedged requests answered by the second attempt",
+    ["provider"],
+)
+HEDGE_BUDGET_EXHAUSTED = REGISTRY.counter(
+    "gateway_hedge_budget_exhausted_total",
+    "Hedges skipped because the hedge budget was spent",
+    ["provider"],
+)
+
+
+class HedgeBudget:
+    """
+    Caps hedges at `ratio` of eligible requests: each request deposits `ratio`, a hedge
+    withdraws 1, and the balance never exceeds `burst`. It starts empty, so a surge of
+    slow responses can add at most `ratio` extra load on top of the earned burst.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = max(1.0, burst)
+        self.balance = 0.0
+
+    def deposit(self) -> None:
+        self.balance = min(self.burst, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class Hedger:
+    """
+    Hedged chat completions: when the first attempt has not answered after the hedge
+    delay (the observed latency percentile of the model on its provider, or a fixed
+    delay), a second one goes to the same provider and model, or with `cross_provider`
+    to the healthiest, fastest provider serving an equivalent model. The first success
+    wins and the other attempt is cancelled, which closes its upstream connection and
+    frees its scheduler slot. A hedge is charged to its provider's rate limits and is
+    not sent when they are spent.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        delay: Optional[float],
+        percentile: float,
+        fallback_delay: float,
+        min_delay: float,
+        budget: HedgeBudget,
+        cross_provider: bool
+    ):
+        self.enabled = enabled
+        self.delay = delay
+        self.percentile = percentile
+        self.fallback_delay = fallback_delay
+        self.min_delay = min_delay
+        self.budget = budget
+        self.cross_provider = cross_provider
+
+    def eligible(self, request: ChatCompletionRequest) -> bool:
+        """Only requests that are safe to send twice: deterministic ones, unless the caller says otherwise."""
+        if not self.enabled or request.stream:
+            return False
+        return request.hedge if request.hedge is not None else is_deterministic(request)
+
+    def hedge_delay(self, provider: str, model: str) -> float:
+        if self.delay is not None:
+            return self.delay
+        observed = health_monitor.percentile(provider, model, self.percentile)
+        return max(self.min_delay, observed if observed is not None else self.fallback_delay)
+
+    def target(self, service: BaseLLMService, request: ChatCompletionRequest) -> Tuple[BaseLLMService, ChatCompletionRequest]:
+        """Where the second attempt goes: the best-ranked candidate with a closed circuit."""
+        candidates = resilient.candidates(service, request) if self.cross_provider else [(service, request)]
+        usable = {
+            svc.provider.value: (svc, req) for svc, req in candidates if health_monitor.is_closed(svc.provider.value)
+        }
+        if not usable:
+            return service, request
+        best, _ = health_monitor.rank([(provider, req.model) for provider, (_, req) in usable.items()])[0]
+        return usable[best]
+
+    async def call(
+        self,
+        service: BaseLLMService,
+        request: ChatCompletionRequest,
+        attempt: Callable[[BaseLLMService, ChatCompletionRequest], Awaitable[T]]
+    ) -> Tuple[T, BaseLLMService]:
+        """Like `resilient.call`, plus one hedged attempt if the first is slow and the budget allows."""
+        provider = service.provider.value
+        HEDGE_ELIGIBLE.labels(provider).inc()
+        self.budget.deposit()
+        primary = asyncio.ensure_future(resilient.call(service, request, attempt))
+        tasks: List[asyncio.Future] = [primary]
+        reservation = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(provider, request.model))
+            if done:
+                return primary.result()
+            if not self.budget.withdraw():
+                HEDGE_BUDGET_EXHAUSTED.labels(provider).inc()
+                return await primary
+
+            target, target_request = self.target(service, request)
+            try:
+                reservation = resilient.reserve(target, target_request)
+            except RateLimitError:
+                return await primary
+            HEDGES.labels(provider).inc()
+            logger.info(f"Hedging slow {provider} request on {target.provider.value} ({target_request.model})")
+            hedge = asyncio.ensure_future(
+                resilient.call(target, target_request, attempt, failover=False, reservation=reservation)
+            )
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGE_WINS.labels(provider).inc()
+                        return task.result()
+            # Both failed: report the primary attempt's error
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if reservation is not None:
+                # A no-op once the hedge settled it; covers a hedge cancelled before it started
+                reservation.settle(0)
+
+
+hedger = Hedger(
+    enabled=settings.HEDGING_ENABLED,
+    delay=settings.HEDGE_DELAY_SECONDS,
+    percentile=settings.HEDGE_PERCENTILE,
+    fallback_delay=settings.HEDGE_FALLBACK_DELAY_SECONDS,
+    min_delay=settings.HEDGE_MIN_DELAY_SECONDS,
+    budget=HedgeBudget(settings.HEDGE_BUDGET_RATIO, settings.HEDGE_BUDGET_BURST),
+    cross_provider=settings.HEDGE_CROSS_PROVIDER,
+)
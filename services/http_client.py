@@ -0,0 +1,119 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import settings
+from core.metrics import REGISTRY
+from core.models import Provider
+
+logger = logging.getLogger("llm_gateway")
+
+POOL_CONNECTIONS = REGISTRY.gauge(
+    "gateway_upstream_pool_connections",
+    "Upstream connections per provider pool by state, and requests waiting for one",
+    ["provider", "state"],
+)
+
+# Base URL used for each provider's pooled client (and for pre-warming it)
+PROVIDER_BASE_URLS: Dict[Provider, str] = {
+    Provider.OPENAI: settings.OPENAI_API_BASE,
+    Provider.GEMINI: settings.GOOGLE_API_BASE,
+}
+
+
+class HTTPClientManager:
+    """Owns one long-lived, pooled httpx.AsyncClient per provider."""
+
+    def __init__(self):
+        self._clients: Dict[Provider, httpx.AsyncClient] = {}
+
+    def build_client(self, provider: Provider) -> httpx.AsyncClient:
+        http2 = settings.HTTP_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                read=settings.HTTP_READ_TIMEOUT,
+                write=settings.HTTP_WRITE_TIMEOUT,
+                pool=settings.HTTP_POOL_TIMEOUT,
+            ),
+        )
+
+    def get(self, provider: Provider) -> httpx.AsyncClient:
+        """Return the shared client for a provider, creating it on first use."""
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self.build_client(provider)
+            self._clients[provider] = client
+        return client
+
+    async def start(self, prewarm: Optional[bool] = None) -> None:
+        """Create the clients for every known provider, optionally pre-warming them."""
+        for provider in PROVIDER_BASE_URLS:
+            self.get(provider)
+        if settings.HTTP_PREWARM if prewarm is None else prewarm:
+            await self.prewarm()
+
+    async def prewarm(self, connections: Optional[int] = None) -> None:
+        """Open connections ahead of traffic so the first requests skip the TCP+TLS handshake."""
+        connections = connections or settings.HTTP_PREWARM_CONNECTIONS
+
+        async def _warm(provider: Provider, url: str) -> None:
+            try:
+                # Any response (even 401/404) leaves a keep-alive connection in the pool
+                await self.get(provider).head(url)
+            except httpx.HTTPError as e:
+                logger.warning(f"Pre-warming {provider.value} connection failed: {e}")
+
+        await asyncio.gather(*[
+            _warm(provider, url)
+            for provider, url in PROVIDER_BASE_URLS.items()
+            for _ in range(connections)
+        ])
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Connection pool usage per provider: in-use, idle and waiting requests."""
+        return {provider.value: pool_stats(client) for provider, client in self._clients.items()}
+
+
+@REGISTRY.collector
+def _collect_pools() -> None:
+    for provider, stats in http_clients.stats().items():
+        for state in ("in_use", "idle", "waiters"):
+            POOL_CONNECTIONS.labels(provider, state).set(stats[state])
+
+
+def pool_stats(client: httpx.AsyncClient) -> Dict[str, Any]:
+    # httpx does not expose pool state publicly, so read it from the underlying httpcore pool
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    waiters = [r for r in getattr(pool, "_requests", []) if r.is_queued()]
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {
+        "connections": len(connections),
+        "in_use": len(connections) - idle,
+        "idle": idle,
+        "waiters": len(waiters),
+        "closed": client.is_closed,
+    }
+
+
+# Process-wide client manager, started and closed by the app lifespan in main.py
+http_clients = HTTPClientManager()
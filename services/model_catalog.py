@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from config import settings
+from core.constants import MODEL_CONTEXT_WINDOWS
+from core.errors import ModelNotFoundError
+from core.models import ModelInfo
+from services import service_factory
+
+logger = logging.getLogger("llm_gateway")
+
+
+class ModelCatalog:
+    """
+    In-memory per-provider model index keyed by model id.
+
+    Populated at startup and refreshed in the background every `ttl` seconds. Reads
+    never wait on a refresh once a provider has been loaded: a stale catalogue keeps
+    being served while it is revalidated (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._models: Dict[str, Dict[str, ModelInfo]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self, providers: List[str]) -> None:
+        """Load the given providers and start the background refresh loop."""
+        await asyncio.gather(*[self._load_quietly(p) for p in providers])
+        self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._loop_task, *self._refreshing.values()] if t is not None and not t.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._refreshing.clear()
+
+    async def list_models(self, provider: str) -> List[ModelInfo]:
+        return list((await self._index(provider)).values())
+
+    async def get_model(self, provider: str, model_id: str) -> Optional[ModelInfo]:
+        return (await self._index(provider)).get(model_id)
+
+    def lookup(self, provider: str, model_id: str) -> Optional[ModelInfo]:
+        """O(1) lookup without any I/O; None if unknown or the provider is not loaded."""
+        return self._models.get(provider, {}).get(model_id)
+
+    def is_loaded(self, provider: str) -> bool:
+        return provider in self._models
+
+    def max_tokens(self, provider: str, model_id: str) -> Optional[int]:
+        """Context window of a model, falling back to the known defaults for its id."""
+        info = self.lookup(provider, model_id)
+        if info is not None and info.max_tokens:
+            return info.max_tokens
+        return MODEL_CONTEXT_WINDOWS.get(model_id)
+
+    def validate(self, provider: str, model_id: str) -> None:
+        """Reject models a loaded provider does not list; unloaded providers are not checked."""
+        if self.is_loaded(provider) and model_id not in self._models[provider]:
+            raise ModelNotFoundError(
+                f"Model '{model_id}' is not available from provider '{provider}'",
+                {"provider": provider, "model": model_id}
+            )
+
+    async def refresh(self, provider: str) -> None:
+        service = service_factory.get_service(provider)
+        models = await service.list_models()
+        self._models[provider] = {model.id: model for model in models}
+        self._loaded_at[provider] = time.monotonic()
+
+    async def _index(self, provider: str) -> Dict[str, ModelInfo]:
+        if provider not in self._models:
+            # Nothing to serve yet, so the first load is awaited; concurrent cold callers share one
+            task = self._refreshing.get(provider)
+            if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+                task = asyncio.create_task(self.refresh(provider))
+                self._refreshing[provider] = task
+            await asyncio.shield(task)
+        elif time.monotonic() - self._loaded_at[provider] > self.ttl:
+            self._revalidate(provider)
+        return self._models[provider]
+
+    def _revalidate(self, provider: str) -> None:
+        task = self._refreshing.get(provider)
+        if task is None or task.done():
+            task = asyncio.create_task(self._load_quietly(provider))
+            self._refreshing[provider] = task
+
+    async def _load_quietly(self, provider: str) -> None:
+        try:
+            await self.refresh(provider)
+        except Exception as e:
+            logger.warning(f"Refreshing the model catalogue for '{provider}' failed: {e}")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            await asyncio.gather(*[self._load_quietly(p) for p in list(self._models)])
+
+
+model_catalog = ModelCatalog(ttl=settings.MODEL_CATALOG_TTL_SECONDS)
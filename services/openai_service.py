@@ -1,15 +1,21 @@
 from services.base import BaseLLMService
-from core.models import ChatCompletionRequest, ChatCompletionResponse, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo, Provider
+from core.models import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChunk, TextEmbeddingRequest, TextEmbeddingResponse, ModelInfo, Provider, Usage
+from core.serialization import loads
+from core.tokenizer import token_counter
+from core.tracing import stage
+from services.http_client import http_clients
+from config import settings
 import os
 import httpx
-import json
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 
 class OpenAIService(BaseLLMService):
     provider = Provider.OPENAI
-    BASE_URL = "https://api.openai.com/v1"
+    BASE_URL = settings.OPENAI_API_BASE
     
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # An explicit client is used as-is (e.g. in tests); otherwise the shared pooled one
+        self._client = client
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable is not set")
@@ -18,46 +24,72 @@ class OpenAIService(BaseLLMService):
             "Content-Type": "application/json"
         }
 
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or http_clients.get(self.provider)
+
     async def get_chat_completion(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
-        payload = self.convert_request(request)
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.BASE_URL}/chat/completions",
-                json=payload,
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        with stage("convert_request"):
+            payload = self.convert_request(request)
 
-        return self.convert_response(data, request_type="chat")
+        resp = await self.client.post(
+            f"{self.BASE_URL}/chat/completions",
+            json=payload,
+            headers=self.headers,
+        )
+        resp.raise_for_status()
+        with stage("convert_response"):
+            return self.convert_response(loads(resp.content), request_type="chat")
+
+    async def stream_chat_completion(self, request: ChatCompletionRequest) -> AsyncIterator[ChatCompletionChunk]:
+        with stage("convert_request"):
+            payload = self.convert_request(request)
+        payload["stream"] = True
+
+        async with self.client.stream(
+            "POST",
+            f"{self.BASE_URL}/chat/completions",
+            json=payload,
+            headers=self.headers,
+        ) as resp:
+            if resp.is_error:
+                await resp.aread()
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                with stage("convert_response"):
+                    chunk = self.convert_response(loads(data), request_type="chunk")
+                yield chunk
 
     async def get_embeddings(self, request: TextEmbeddingRequest) -> TextEmbeddingResponse:
         payload = {
             "model": request.model,
             "input": request.input
         }
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{self.BASE_URL}/embeddings",
-                json=payload,
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        if request.dimensions:
+            payload["dimensions"] = request.dimensions
 
-        return self.convert_response(data, request_type="embedding")
+        resp = await self.client.post(
+            f"{self.BASE_URL}/embeddings",
+            json=payload,
+            headers=self.headers,
+        )
+        resp.raise_for_status()
+        with stage("convert_response"):
+            return self.convert_response(loads(resp.content), request_type="embedding")
 
     async def list_models(self) -> List[ModelInfo]:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{self.BASE_URL}/models",
-                headers=self.headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            
+        resp = await self.client.get(
+            f"{self.BASE_URL}/models",
+            headers=self.headers,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+
         models = []
         for model in data["data"]:
             models.append(ModelInfo(
@@ -71,37 +103,35 @@ class OpenAIService(BaseLLMService):
         return models
 
     async def get_model_info(self, model_id: str) -> Optional[ModelInfo]:
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(
-                    f"{self.BASE_URL}/models/{model_id}",
-                    headers=self.headers,
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                
-                return ModelInfo(
-                    id=data["id"],
-                    name=data["id"],
-                    provider=self.provider,
-                    capabilities=["chat_completion", "embeddings"] if "gpt" in data["id"].lower() else ["embeddings"],
-                    max_tokens=data.get("context_length", None),
-                    description=data.get("description", "")
-                )
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 404:
-                    return None
-                raise
+        try:
+            resp = await self.client.get(
+                f"{self.BASE_URL}/models/{model_id}",
+                headers=self.headers,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+
+            return ModelInfo(
+                id=data["id"],
+                name=data["id"],
+                provider=self.provider,
+                capabilities=["chat_completion", "embeddings"] if "gpt" in data["id"].lower() else ["embeddings"],
+                max_tokens=data.get("context_length", None),
+                description=data.get("description", "")
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
 
     async def health_check(self) -> bool:
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{self.BASE_URL}/models",
-                    headers=self.headers,
-                )
-                resp.raise_for_status()
-                return True
+            resp = await self.client.get(
+                f"{self.BASE_URL}/models",
+                headers=self.headers,
+            )
+            resp.raise_for_status()
+            return True
         except Exception:
             return False
 
@@ -138,21 +168,30 @@ class OpenAIService(BaseLLMService):
                 usage=response.get("usage"),
                 provider=self.provider
             )
+        elif request_type == "chunk":
+            return ChatCompletionChunk(
+                id=response["id"],
+                created=response["created"],
+                model=response["model"],
+                choices=response["choices"],
+                provider=self.provider
+            )
         elif request_type == "embedding":
+            # Vectors are taken as the provider sent them: validating each float doubles the cost of a batch
             usage = response["usage"]
-            if "completion_tokens" not in usage:
-                usage = usage.copy()
-                usage["completion_tokens"] = 0
-            return TextEmbeddingResponse(
+            vectors = [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+            return TextEmbeddingResponse.from_vectors(
                 id=response.get("id", "embedding-response"),
                 model=response["model"],
-                data=response["data"],
-                usage=usage,
+                vectors=vectors,
+                usage=Usage(
+                    prompt_tokens=usage["prompt_tokens"],
+                    completion_tokens=usage.get("completion_tokens", 0),
+                    total_tokens=usage["total_tokens"]
+                ),
                 provider=self.provider
             )
         raise ValueError(f"Unsupported request type: {request_type}")
 
     def count_tokens(self, text: str, model: Optional[str] = None) -> int:
-        # This is a rough estimate. For accurate token counting, you should use tiktoken
-        # or the OpenAI tokenizer
-        return len(text.split()) * 1.3  # Rough estimate: 1.3 tokens per word
+        return token_counter.count(text, model)
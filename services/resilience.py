@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+import httpx
+
+from config import settings
+from core.context import fit_context
+from core.errors import (
+    AuthenticationError, ContentFilterError, ContextLengthExceededError, InvalidRequestError, LLMGatewayError,
+    ModelNotFoundError, PermissionError, ProviderError, RateLimitError, ServiceUnavailableError, UpstreamTimeoutError
+)
+from core.deadline import deadline_at
+from core.metrics import REGISTRY
+from core.rate_limit import Reservation, rate_limiter
+from core.tokenizer import token_counter
+from core.tracing import stage
+from core.utils import equivalent_models
+from services import service_factory
+from services.base import BaseLLMService
+from services.health import health_monitor
+from services.model_catalog import model_catalog
+
+logger = logging.getLogger("llm_gateway")
+
+T = TypeVar("T")
+
+RETRIES = REGISTRY.counter(
+    "gateway_upstream_retries_total",
+    "Upstream calls retried after a retryable failure",
+    ["provider", "code"],
+)
+FAILOVERS = REGISTRY.counter(
+    "gateway_failovers_total",
+    "Requests served by another provider after the primary one failed",
+    ["from_provider", "to_provider"],
+)
+
+# Errors that say nothing about the request itself, so another provider may succeed. Upstream 5xx
+# responses, 503 included, classify as ProviderError; a ServiceUnavailableError is the gateway's own
+# (a scheduler shed or an open circuit) and moving the request elsewhere would only move the overload.
+FAILOVER_ERRORS = (ProviderError, RateLimitError, AuthenticationError, PermissionError)
+
+
+def classify_error(error: Exception, provider: str) -> Tuple[Exception, bool]:
+    """Map an upstream exception onto the gateway error hierarchy; returns (error, retryable)."""
+    if isinstance(error, LLMGatewayError):
+        return error, False
+    if isinstance(error, httpx.TimeoutException):
+        return UpstreamTimeoutError(f"{provider} did not respond in time: {type(error).__name__}", provider), True
+    if isinstance(error, httpx.HTTPStatusError):
+        return _classify_status(error.response, provider)
+    if isinstance(error, httpx.TransportError):
+        return ProviderError(f"Could not reach {provider}: {error}", provider), True
+    return error, False
+
+
+def _classify_status(response: httpx.Response, provider: str) -> Tuple[LLMGatewayError, bool]:
+    status = response.status_code
+    message = _upstream_message(response)
+    details = {"provider": provider, "upstream_status": status}
+    if status == 429:
+        retry_after = _retry_after(response)
+        headers = {"Retry-After": str(int(retry_after))} if retry_after is not None else None
+        return RateLimitError(f"{provider} rate limit: {message}", {**details, "retry_after": retry_after},
+                              headers=headers), True
+    if status == 401:
+        return AuthenticationError(f"{provider} rejected the credentials: {message}", details), False
+    if status == 403:
+        return PermissionError(f"{provider} denied access: {message}", details), False
+    if status == 404:
+        return ModelNotFoundError(f"{provider}: {message}", details), False
+    if status in (400, 413, 422):
+        lowered = message.lower()
+        if "context" in lowered and ("length" in lowered or "window" in lowered) or "too many tokens" in lowered:
+            return ContextLengthExceededError(f"{provider}: {message}", details), False
+        if "content" in lowered and ("filter" in lowered or "policy" in lowered or "safety" in lowered):
+            return ContentFilterError(f"{provider}: {message}", details), False
+        return InvalidRequestError(f"{provider}: {message}", details), False
+    retryable = status in (408, 409) or status >= 500
+    return ProviderError(f"{provider} returned {status}: {message}", provider, details), retryable
+
+
+def _upstream_message(response: httpx.Response) -> str:
+    try:
+        error = response.json().get("error")
+        if isinstance(error, dict):
+            return str(error.get("message") or error)
+        if error:
+            return str(error)
+    except Exception:
+        pass
+    return response.reason_phrase or "error"
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(response.headers["retry-after"]))
+    except (KeyError, ValueError):
+        return None
+
+
+class ResilientCaller:
+    """
+    Retries retryable upstream failures with full-jitter exponential backoff, then
+    fails over to the equivalent model (see `core.constants.MODEL_MAPPINGS`) on the
+    other registered providers, all within one time budget per request. Providers whose
+    circuit is open (see `services.health`) are skipped, and every attempt's outcome and
+    latency feed the health monitor.
+
+    Errors are always translated to `core.errors` types, so clients get a meaningful
+    status code instead of a 500. The caller's own limits are charged once, by the
+    router; every extra upstream request (a failover or a hedge) is charged to the
+    limits of the provider it goes to.
+    """
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float, budget: float, failover: bool):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.failover = failover
+
+    async def call(
+        self,
+        service: BaseLLMService,
+        request,
+        attempt: Callable[[BaseLLMService, object], Awaitable[T]],
+        failover: Optional[bool] = None,
+        reservation: Optional[Reservation] = None
+    ) -> Tuple[T, BaseLLMService]:
+        """
+        Run `attempt(service, request)` with retries and failover; returns the result and
+        the service used. `reservation` is an extra charge for `service` (see `reserve`),
+        settled with the outcome of its attempt.
+        """
+        # The retry budget never outlives the request's own deadline
+        deadline = min(time.monotonic() + self.budget, deadline_at())
+        use_failover = self.failover if failover is None else failover
+        candidates = self.candidates(service, request) if use_failover else [(service, request)]
+        error: Optional[Exception] = None
+        for i, (candidate, candidate_request) in enumerate(candidates):
+            if i and time.monotonic() >= deadline:
+                break
+            charge = None if i else reservation
+            if not health_monitor.allow(candidate.provider.value):
+                if charge is not None:
+                    charge.settle(0)
+                error = error or ServiceUnavailableError(
+                    f"Provider '{candidate.provider.value}' is unavailable (circuit open); retry later",
+                    {"provider": candidate.provider.value, "reason": "circuit_open"},
+                    headers={"Retry-After": str(max(1, int(health_monitor.cooldown)))}
+                )
+                continue
+            if i:
+                try:
+                    charge = self.reserve(candidate, candidate_request)
+                except RateLimitError:
+                    # The target provider's own limits are spent: leave it alone
+                    continue
+                FAILOVERS.labels(service.provider.value, candidate.provider.value).inc()
+                logger.warning(
+                    f"Failing over from {service.provider.value} to {candidate.provider.value} "
+                    f"({candidate_request.model}) after: {error}"
+                )
+            try:
+                result = await self.retry(
+                    lambda: attempt(candidate, candidate_request), candidate.provider.value, deadline,
+                    candidate_request.model
+                )
+            except BaseException as e:
+                if charge is not None:
+                    charge.settle(0)
+                if not isinstance(e, FAILOVER_ERRORS):
+                    raise
+                error = e
+                continue
+            if charge is not None:
+                # Streams have no usage yet and keep their estimate
+                usage = getattr(result, "usage", None)
+                charge.settle(usage.total_tokens if usage is not None else charge.tokens)
+            return result, candidate
+        raise error
+
+    def reserve(self, service: BaseLLMService, request) -> Reservation:
+        """Charge an extra chat request to its provider's limits only; raises RateLimitError when they are spent."""
+        tokens = token_counter.count_messages(request.messages, request.model) + (request.max_tokens or 0)
+        return rate_limiter.acquire(None, None, service.provider.value, tokens)
+
+    async def retry(
+        self, fn: Callable[[], Awaitable[T]], provider: str, deadline: float, model: Optional[str] = None
+    ) -> T:
+        """Await `fn()`, retrying retryable failures until attempts or the deadline run out."""
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                result = await fn()
+                health_monitor.record(provider, time.perf_counter() - started, True, model)
+                return result
+            except Exception as e:
+                error, retryable = classify_error(e, provider)
+                # Being rate limited says nothing about the provider's health, so 429s never trip its circuit
+                if error is not e and isinstance(error, FAILOVER_ERRORS) and not isinstance(error, RateLimitError):
+                    health_monitor.record(provider, time.perf_counter() - started, False, model)
+                if error is e:
+                    raise
+                if not retryable or attempt >= self.max_attempts:
+                    raise error from e
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                retry_after = error.details.get("retry_after")
+                if retry_after:
+                    delay = max(delay, retry_after)
+                if time.monotonic() + delay >= deadline:
+                    raise error from e
+                RETRIES.labels(provider, error.code).inc()
+                with stage("backoff"):
+                    await asyncio.sleep(delay)
+
+    def candidates(self, service: BaseLLMService, request) -> List[Tuple[BaseLLMService, object]]:
+        """
+        The primary provider, then every other available provider with an equivalent model,
+        with the conversation fitted to that model's context window. Providers whose model
+        cannot hold it are left out.
+        """
+        candidates = [(service, request)]
+        primary = service.provider.value
+        mappings = equivalent_models(request.model)
+        for provider in service_factory.service_registry.available_providers():
+            model = mappings.get(provider)
+            if provider == primary or model is None:
+                continue
+            try:
+                other = service_factory.get_service(provider)
+            except LLMGatewayError:
+                continue
+            try:
+                other_request, _ = fit_context(
+                    request.model_copy(update={"model": model, "provider": other.provider}),
+                    model_catalog.max_tokens(provider, model),
+                    settings.CONTEXT_POLICY,
+                    settings.CONTEXT_KEEP_LAST_TURNS
+                )
+            except ContextLengthExceededError:
+                continue
+            candidates.append((other, other_request))
+        return candidates
+
+
+resilient = ResilientCaller(
+    max_attempts=settings.RETRY_MAX_ATTEMPTS,
+    base_delay=settings.RETRY_BASE_DELAY,
+    max_delay=settings.RETRY_MAX_DELAY,
+    budget=settings.RETRY_BUDGET_SECONDS,
+    failover=settings.FAILOVER_ENABLED,
+)
@@ -26,34 +26,114 @@ class LLMServiceFactory:
 
 service_factory = LLMServiceFactory()
 '''
-from typing import Dict, Type
+import logging
+import threading
+from typing import Dict, List, Optional, Type
 from config import settings
+from core.errors import InvalidRequestError, ServiceUnavailableError
+from services.base import BaseLLMService
 
 # Import service classes
 from services.openai_service import OpenAIService
 from services.gemini_service import GeminiService
 
+logger = logging.getLogger("llm_gateway")
+
 # Service registry maps provider names to their service classes
-SERVICE_REGISTRY: Dict[str, Type] = {
+SERVICE_REGISTRY: Dict[str, Type[BaseLLMService]] = {
     "openai": OpenAIService,
     "gemini": GeminiService,
 }
 
-def get_service(provider_name: str):
+
+class ServiceRegistry:
+    """
+    Builds each provider adapter once, lazily, and caches it.
+
+    A provider whose adapter fails to build (e.g. a missing API key) is recorded as
+    unavailable, so later lookups are answered from a dict instead of retrying the
+    construction on every request.
+    """
+
+    def __init__(self, service_classes: Dict[str, Type[BaseLLMService]]):
+        self._classes = dict(service_classes)
+        self._services: Dict[str, BaseLLMService] = {}
+        self._unavailable: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider_name: str) -> BaseLLMService:
+        provider_name = _normalize(provider_name)
+        service = self._services.get(provider_name)
+        if service is not None:
+            return service
+        if provider_name in self._unavailable:
+            raise ServiceUnavailableError(
+                f"Provider '{provider_name}' is not available: {self._unavailable[provider_name]}",
+                {"provider": provider_name}
+            )
+        if provider_name not in self._classes:
+            raise InvalidRequestError(f"Unsupported provider: {provider_name}", {"provider": provider_name})
+
+        with self._lock:
+            # Another thread may have built it while we waited for the lock
+            if provider_name not in self._services and provider_name not in self._unavailable:
+                try:
+                    self._services[provider_name] = self._classes[provider_name]()
+                except Exception as e:
+                    logger.warning(f"Provider '{provider_name}' marked unavailable: {e}")
+                    self._unavailable[provider_name] = str(e)
+        return self.get(provider_name)
+
+    def is_available(self, provider_name: str) -> bool:
+        provider_name = _normalize(provider_name)
+        if provider_name in self._services:
+            return True
+        if provider_name in self._unavailable or provider_name not in self._classes:
+            return False
+        try:
+            self.get(provider_name)
+            return True
+        except (InvalidRequestError, ServiceUnavailableError):
+            return False
+
+    def available_providers(self) -> List[str]:
+        return [name for name in self._classes if self.is_available(name)]
+
+    def warm_up(self) -> None:
+        """Build every registered adapter up front instead of on the first request."""
+        for provider_name in self._classes:
+            self.is_available(provider_name)
+
+    def status(self) -> Dict[str, Dict[str, Optional[str]]]:
+        return {
+            name: {
+                "available": name in self._services,
+                "error": self._unavailable.get(name),
+            }
+            for name in self._classes
+        }
+
+
+def _normalize(provider_name) -> str:
+    # Accept both Provider enum members and plain strings
+    return str(getattr(provider_name, "value", provider_name)).lower()
+
+
+service_registry = ServiceRegistry(SERVICE_REGISTRY)
+
+
+def get_service(provider_name: str) -> BaseLLMService:
     """
-    Factory function to get the appropriate service instance for a provider.
+    Get the cached service instance for a provider.
     
     Args:
         provider_name: Name of the provider (e.g., "openai", "gemini")
         
     Returns:
-        An instance of the appropriate service class
+        The shared instance of the appropriate service class
     
     Raises:
-        ValueError: If the provider is not supported
+        InvalidRequestError: If the provider is not supported
+        ServiceUnavailableError: If the provider is not configured correctly
     """
-    if provider_name not in SERVICE_REGISTRY:
-        raise ValueError(f"Unsupported provider: {provider_name}")
-    
-    service_class = SERVICE_REGISTRY[provider_name]
-    return service_class()
+    return service_registry.get(provider_name)
@@ -0,0 +1,104 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional
+import pytest
+from fastapi.testclient import TestClient
+from core.models import (
+    ChatCompletionChunk, ChatCompletionRequest, ChatCompletionResponse, ModelInfo, Provider, Role,
+    TextEmbeddingRequest, TextEmbeddingResponse
+)
+from services import service_factory
+from services.base import BaseLLMService
+
+
+class FakeLLMService(BaseLLMService):
+    """Offline stand-in for a provider adapter that records the calls it receives."""
+    provider = Provider.OPENAI
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.chat_calls: List[ChatCompletionRequest] = []
+        self.embedding_calls: List[TextEmbeddingRequest] = []
+        self.list_calls = 0
+
+    async def get_chat_completion(self, request: ChatCompletionRequest) -> ChatCompletionResponse:
+        self.chat_calls.append(request)
+        await asyncio.sleep(self.delay)
+        return ChatCompletionResponse(
+            id=f"fake-{len(self.chat_calls)}",
+            created=1,
+            model=request.model,
+            choices=[{"index": 0, "message": {"role": Role.ASSISTANT, "content": "Hello!"}, "finish_reason": "stop"}],
+            usage={"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+            provider=self.provider
+        )
+
+    async def stream_chat_completion(self, request: ChatCompletionRequest) -> AsyncIterator[ChatCompletionChunk]:
+        self.chat_calls.append(request)
+        for i, text in enumerate(["Hel", "lo!"]):
+            await asyncio.sleep(self.delay)
+            yield ChatCompletionChunk(
+                id="fake-stream",
+                created=1,
+                model=request.model,
+                choices=[{"index": 0, "delta": {"content": text}, "finish_reason": "stop" if i else None}],
+                provider=self.provider
+            )
+
+    async def get_embeddings(self, request: TextEmbeddingRequest) -> TextEmbeddingResponse:
+        self.embedding_calls.append(request)
+        await asyncio.sleep(self.delay)
+        inputs = [request.input] if isinstance(request.input, str) else request.input
+        return TextEmbeddingResponse(
+            id="fake-embedding",
+            model=request.model,
+            data=[{"index": i, "embedding": [float(len(text)), 1.0, 0.0]} for i, text in enumerate(inputs)],
+            usage={"prompt_tokens": sum(len(text.split()) for text in inputs), "completion_tokens": 0,
+                   "total_tokens": sum(len(text.split()) for text in inputs)},
+            provider=self.provider
+        )
+
+    async def list_models(self) -> List[ModelInfo]:
+        self.list_calls += 1
+        return [
+            ModelInfo(id="gpt-3.5-turbo", name="gpt-3.5-turbo", provider=self.provider,
+                      capabilities=["chat_completion"], max_tokens=16385),
+            ModelInfo(id="text-embedding-3-small", name="text-embedding-3-small", provider=self.provider,
+                      capabilities=["embeddings"]),
+        ]
+
+    async def get_model_info(self, model_id: str) -> Optional[ModelInfo]:
+        return next((m for m in await self.list_models() if m.id == model_id), None)
+
+    async def health_check(self) -> bool:
+        return True
+
+    def convert_request(self, request: Any) -> Dict[str, Any]:
+        return request.model_dump(exclude={"provider", "cache"})
+
+    def convert_response(self, response: Any, request_type: str) -> Any:
+        return response
+
+    def count_tokens(self, text: str, model: Optional[str] = None) -> int:
+        return len(text.split())
+
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    service = FakeLLMService()
+    monkeypatch.setattr(service_factory, "get_service", lambda provider_name: service)
+    return service
+
+
+@pytest.fixture
+def client():
+    from main import app
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    # Circuit breakers are process-wide: failures injected by one test must not trip the next
+    from services.health import health_monitor
+    monkeypatch.setattr(health_monitor, "_providers", {})
+    monkeypatch.setattr(health_monitor, "_routes", {})
+    return health_monitor
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import pytest
+from config import settings
+from core.errors import ServiceUnavailableError
+from services import service_factory
+from services.batch import BatchCheckpoint, BatchRunner, run_file
+from tests.conftest import FakeLLMService
+from tests.test_resilience import caller, status_error
+
+
+def line(item_id, content="hi", **fields):
+    return json.dumps({"id": item_id, "model": "gpt-3.5-turbo",
+                       "messages": [{"role": "user", "content": content}], **fields})
+
+
+def test_batch_endpoint_streams_results_with_their_ids(client, fake_service):
+    body = "\n".join([
+        line("a"),
+        "not json",
+        line("b", stream=True),
+        json.dumps({"id": "c", "messages": []}),
+        "",
+        line("d"),
+    ]) + "\n"
+    response = client.post("/api/v1/chat/batch", content=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {r["id"]: r for r in map(json.loads, response.text.splitlines())}
+    assert set(results) == {"a", "line-2", "b", "c", "d"}
+    assert results["a"]["status"] == 200
+    assert results["a"]["response"]["choices"][0]["message"]["content"] == "Hello!"
+    assert results["line-2"]["status"] == 400
+    assert results["b"]["error"]["message"] == "Streaming is not supported in batches"
+    assert results["c"]["error"]["code"] == "invalid_request"
+    assert len(fake_service.chat_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_runner_bounds_concurrency_and_read_ahead(monkeypatch):
+    service = FakeLLMService(delay=0.01)
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    active = peak = read = 0
+
+    async def counted(get_chat_completion, request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            return await get_chat_completion(request)
+        finally:
+            active -= 1
+    original = service.get_chat_completion
+    monkeypatch.setattr(service, "get_chat_completion", lambda request: counted(original, request))
+
+    async def source():
+        nonlocal read
+        for i in range(20):
+            read += 1
+            yield line(str(i)).encode()
+
+    runner = BatchRunner(concurrency=4, provider_concurrency=2)
+    results = runner.run(source())
+    first = await results.__anext__()
+    # Nothing is read far beyond what the consumer has taken
+    await asyncio.sleep(0.05)
+    assert read <= 1 + 4 + 1
+    rest = [r async for r in results]
+    assert len(rest) + 1 == 20 and first["status"] == 200
+    assert peak <= 2
+
+
+@pytest.mark.asyncio
+async def test_run_file_resumes_from_its_checkpoint(tmp_path, monkeypatch):
+    # "b" fails for good (401); "c" hits an outage (503) and succeeds on the next run
+    failures = {"b": status_error(401), "c": status_error(503)}
+    service = FakeLLMService()
+    original = service.get_chat_completion
+
+    async def flaky(request):
+        content = request.messages[-1].content
+        if content in failures:
+            raise failures.pop(content)
+        return await original(request)
+    monkeypatch.setattr(service, "get_chat_completion", flaky)
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    monkeypatch.setattr("services.batch.resilient", caller(max_attempts=1, failover=False))
+
+    source = tmp_path / "in.jsonl"
+    source.write_text("\n".join(line(i, content=i) for i in ["a", "b", "c"]) + "\n")
+    output, checkpoint = tmp_path / "out.jsonl", tmp_path / "run.checkpoint"
+    runner = BatchRunner(concurrency=2, provider_concurrency=2)
+
+    assert await run_file(str(source), str(output), str(checkpoint), runner) == 3
+    done = BatchCheckpoint(str(checkpoint))
+    assert "a" in done and "b" in done and "c" not in done
+    done.close()
+
+    assert await run_file(str(source), str(output), str(checkpoint), runner) == 1
+    results = [json.loads(l) for l in output.read_text().splitlines()]
+    assert [(r["id"], r["status"]) for r in results][-1] == ("c", 200)
+    assert sorted(r["status"] for r in results) == [200, 200, 401, 502]
+
+
+@pytest.mark.asyncio
+async def test_waits_are_bounded_and_only_follow_retry_after(monkeypatch):
+    service = FakeLLMService()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    monkeypatch.setattr(settings, "BATCH_RETRY_MAX_ATTEMPTS", 3)
+    calls = []
+
+    async def shed(request):
+        calls.append(request.messages[0].content)
+        headers = {"Retry-After": "0"} if request.messages[0].content == "shed" else None
+        raise ServiceUnavailableError("overloaded", headers=headers)
+    monkeypatch.setattr(service, "get_chat_completion", shed)
+
+    async def source():
+        yield line("a", content="shed").encode()
+        yield line("b", content="down").encode()
+
+    results = {r["id"]: r async for r in BatchRunner(concurrency=2, provider_concurrency=2).run(source())}
+    assert results["a"]["status"] == results["b"]["status"] == 503
+    assert results["a"]["error"]["message"] == "overloaded"
+    assert calls.count("shed") == 3 and calls.count("down") == 1
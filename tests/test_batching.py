@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from core.batching import EmbeddingBatcher, split_tokens
+from core.deadline import Deadline, current_deadline
+from core.metrics import REGISTRY
+from core.models import TextEmbeddingRequest
+from tests.conftest import FakeLLMService
+
+
+def embed(text, model="text-embedding-3-small") -> TextEmbeddingRequest:
+    return TextEmbeddingRequest(model=model, input=text)
+
+
+def test_split_tokens_adds_up():
+    assert split_tokens(10, [1, 1, 1]) == [4, 3, 3]
+    assert split_tokens(7, [2, 0, 5]) == [2, 0, 5]
+    assert sum(split_tokens(1001, [3, 7, 11, 13])) == 1001
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_upstream_call():
+    service = FakeLLMService()
+    batcher = EmbeddingBatcher(window_ms=10, max_batch_size=100, max_batch_tokens=1000)
+
+    results = await asyncio.gather(
+        batcher.submit(service, embed("a")),
+        batcher.submit(service, embed(["bb", "ccc dd"])),
+        batcher.submit(service, embed("eeee", model="other-model")),
+    )
+
+    assert sorted(len(call.input) for call in service.embedding_calls) == [1, 3]
+    single, pair, other = results
+    assert [d.embedding[0] for d in single.data] == [1.0]
+    assert [(d.index, d.embedding[0]) for d in pair.data] == [(0, 2.0), (1, 6.0)]
+    assert other.model == "other-model"
+    # The fake provider reports one token per word: 1 + 3 shared by caller weight
+    assert single.usage.prompt_tokens + pair.usage.prompt_tokens == 4
+    assert pair.usage.prompt_tokens == 3
+    assert "gateway_embedding_batch_size_count" in REGISTRY.render()
+
+
+@pytest.mark.asyncio
+async def test_batches_span_users_and_run_outside_any_callers_context():
+    class RecordingService(FakeLLMService):
+        async def get_embeddings(self, request):
+            seen.append((current_deadline.get(), request.user))
+            return await super().get_embeddings(request)
+
+    seen = []
+    service = RecordingService()
+    batcher = EmbeddingBatcher(window_ms=10, max_batch_size=100, max_batch_tokens=1000)
+
+    async def submit(text, user, timeout):
+        current_deadline.set(Deadline(timeout))
+        request = TextEmbeddingRequest(model="text-embedding-3-small", input=text, user=user)
+        return await batcher.submit(service, request)
+
+    await asyncio.gather(submit("a", "alice", 30), submit("b", "bob", None))
+    assert seen == [(None, None)]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting_for_window():
+    service = FakeLLMService()
+    batcher = EmbeddingBatcher(window_ms=10_000, max_batch_size=2, max_batch_tokens=1000)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.submit(service, embed("a")), batcher.submit(service, embed("b"))),
+        timeout=1
+    )
+    assert len(results) == 2
+    assert len(service.embedding_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_reach_every_waiter():
+    class FailingService(FakeLLMService):
+        async def get_embeddings(self, request):
+            raise RuntimeError("upstream down")
+
+    batcher = EmbeddingBatcher(window_ms=1, max_batch_size=10, max_batch_tokens=1000)
+    results = await asyncio.gather(
+        batcher.submit(FailingService(), embed("a")),
+        batcher.submit(FailingService(), embed("b")),
+        return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,19 @@
+from benchmarks.bench_hot_path import baseline_run, compare, run_cases
+
+
+def test_cases_run_and_report_nanoseconds_per_call():
+    results = run_cases("small|response_serialize/chat", min_time=0.001, repeat=1)
+    assert set(results) == {"request_validate/small", "openai_convert_request/small", "cache_key/small",
+                            "count_tokens/small", "response_serialize/chat"}
+    assert all(ns > 0 for ns in results.values())
+
+
+def test_slower_cases_are_regressions_against_the_baseline_commit():
+    history = [{"commit": "aaa111", "results": {"a": 100.0, "b": 1000.0}},
+               {"commit": "bbb222", "results": {"a": 100.0, "b": 900.0}},
+               {"commit": "ccc333", "results": {"a": 50.0, "b": 50.0}}]
+    # The current commit's own saved runs are skipped; a prefix selects a commit
+    assert baseline_run(history, None, "ccc333")["commit"] == "bbb222"
+    assert baseline_run(history, "aaa", "ccc333")["commit"] == "aaa111"
+    regressions = compare({"a": 110.0, "b": 1100.0, "new": 5.0}, {"a": 100.0, "b": 900.0}, threshold=0.15)
+    assert [r.split(":")[0] for r in regressions] == ["b"]
@@ -0,0 +1,67 @@
+import pytest
+from config import settings
+from core.cache import ResponseCache, is_cacheable, response_cache
+from core.models import ChatCompletionRequest, Message, Role
+
+
+def make_request(**kwargs) -> ChatCompletionRequest:
+    return ChatCompletionRequest(model="gpt-3.5-turbo", messages=[Message(role=Role.USER, content="hi")], **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_by_bytes_and_entries():
+    cache = ResponseCache(ttl=60, max_entries=3, max_bytes=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    assert await cache.get("a") == b"1234"  # "a" becomes most recently used
+    cache.set("c", b"1234")  # 12 bytes > 10: evicts least recently used "b"
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"1234"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_entries_expire(monkeypatch):
+    cache = ResponseCache(ttl=0, max_entries=10, max_bytes=100)
+    cache.set("a", b"x")
+    assert await cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(ttl=60, max_entries=10, max_bytes=100, sqlite_path=path)
+    cache.set("a", b"payload")
+    await cache.persist("a", b"payload")
+    cache.close()
+
+    restarted = ResponseCache(ttl=60, max_entries=10, max_bytes=100, sqlite_path=path)
+    assert await restarted.get("a") == b"payload"
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.close()
+
+
+def test_only_deterministic_requests_are_cacheable():
+    assert is_cacheable(make_request(temperature=0))
+    assert not is_cacheable(make_request(temperature=0.7))
+    assert is_cacheable(make_request(temperature=0.7, cache=True))
+    assert not is_cacheable(make_request(temperature=0, cache=False))
+    assert not is_cacheable(make_request(temperature=0, stream=True))
+
+
+def test_chat_endpoint_serves_repeats_from_cache(client, fake_service, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_CACHE", True)
+    response_cache.clear()
+    body = {"model": "gpt-3.5-turbo", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+
+    first = client.post("/api/v1/chat/completions", json=body)
+    second = client.post("/api/v1/chat/completions", json=body)
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert len(fake_service.chat_calls) == 1
+    assert client.get("/api/v1/cache/stats").json()["response_cache"]["hit_ratio"] == 0.5
+    response_cache.clear()
@@ -0,0 +1,76 @@
+import pytest
+from pydantic import ValidationError
+from config import Settings, settings
+from core import context
+from core.context import ContextPolicy, fit_context
+from core.errors import ContextLengthExceededError
+from core.models import ChatCompletionRequest
+
+
+@pytest.fixture(autouse=True)
+def ten_tokens_per_word(monkeypatch):
+    monkeypatch.setattr(context.token_counter, "message_counts",
+                        lambda messages, model=None: [10 * len(m.content.split()) for m in messages])
+
+
+def chat(*contents, max_tokens=None):
+    roles = ["system"] + ["user", "assistant"] * len(contents)
+    messages = [{"role": role, "content": content} for role, content in zip(roles, contents)]
+    return ChatCompletionRequest(model="gpt-3.5-turbo", messages=messages, max_tokens=max_tokens)
+
+
+def test_request_that_fits_is_untouched():
+    request = chat("sys", "one two", "three")
+    assert fit_context(request, 100) == (request, 0)
+    assert fit_context(request, None) == (request, 0)
+
+
+def test_reject_policy_raises_before_going_upstream():
+    with pytest.raises(ContextLengthExceededError) as exc:
+        fit_context(chat("sys", "one two", "three"), 40, ContextPolicy.REJECT)
+    assert exc.value.status_code == 400
+    assert exc.value.details["prompt_tokens"] == 43
+
+
+def test_drop_oldest_keeps_system_and_final_message():
+    # 50 tokens budget: sys(10) + a(20) + b(10) + c(10) + d(10) does not fit
+    request, trimmed = fit_context(chat("sys", "a a", "b", "c", "d"), 53, ContextPolicy.DROP_OLDEST)
+    assert [m.content for m in request.messages] == ["sys", "b", "c", "d"]
+    assert trimmed == 20
+
+
+def test_keep_last_keeps_system_and_last_n_turns():
+    request = chat("sys", "a", "b", "c", "d")
+    assert fit_context(request, 1000, ContextPolicy.KEEP_LAST, keep_last=2) == (request, 0)
+
+    request, trimmed = fit_context(chat("sys", "a", "b", "c", "d"), 40, ContextPolicy.KEEP_LAST, keep_last=2)
+    assert [m.content for m in request.messages] == ["sys", "c", "d"]
+    assert trimmed == 20
+
+
+def test_trimming_that_cannot_fit_is_rejected():
+    with pytest.raises(ContextLengthExceededError):
+        fit_context(chat("sys", "a", "b b b b"), 50, ContextPolicy.DROP_OLDEST, keep_last=2)
+    with pytest.raises(ContextLengthExceededError):
+        fit_context(chat("sys", "a"), 15, ContextPolicy.DROP_OLDEST, keep_last=2)
+
+
+def test_chat_endpoint_reports_trimmed_tokens(client, fake_service, monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_POLICY", ContextPolicy.DROP_OLDEST)
+    body = chat("sys", "a a", "b", "c", max_tokens=16385 - 50).model_dump(exclude_none=True)
+
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 200
+    assert response.headers["X-Context-Trimmed-Tokens"] == "20"
+    assert [m.content for m in fake_service.chat_calls[0].messages] == ["sys", "b", "c"]
+
+    monkeypatch.setattr(settings, "CONTEXT_POLICY", ContextPolicy.REJECT)
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 400
+    assert response.json()["code"] == "context_length_exceeded"
+
+
+def test_context_policy_is_validated_when_settings_load():
+    assert Settings(CONTEXT_POLICY="KEEP_LAST").CONTEXT_POLICY is ContextPolicy.KEEP_LAST
+    with pytest.raises(ValidationError):
+        Settings(CONTEXT_POLICY="drop-oldest")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pytest
+from core.deadline import CANCELLATIONS, model_timeout
+from services import service_factory
+from tests.conftest import FakeLLMService
+
+BODY = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]}
+
+
+class HangingService(FakeLLMService):
+    """Never answers; records when its upstream call gets cancelled."""
+
+    def __init__(self):
+        super().__init__(delay=60)
+        self.cancelled = asyncio.Event()
+
+    async def get_chat_completion(self, request):
+        try:
+            return await super().get_chat_completion(request)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+    async def stream_chat_completion(self, request):
+        # The first chunk arrives at once, then the stream stalls
+        stream = FakeLLMService().stream_chat_completion(request)
+        yield await stream.__anext__()
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.cancelled.set()
+
+
+def test_model_timeouts_use_the_longest_prefix(monkeypatch):
+    monkeypatch.setattr("core.deadline.settings.REQUEST_TIMEOUT_SECONDS", 300)
+    timeouts = {"gpt-4": 120, "gpt-4o": 60}
+    assert model_timeout("gpt-4o-mini", timeouts) == 60
+    assert model_timeout("gpt-4-turbo", timeouts) == 120
+    assert model_timeout("gemini-2.0-flash", timeouts) == 300
+
+
+def test_expired_deadline_returns_504_and_cancels_upstream(client, monkeypatch):
+    service = HangingService()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    before = CANCELLATIONS.labels("deadline", "before_response").value
+
+    response = client.post("/api/v1/chat/completions", json=BODY, headers={"X-Request-Timeout": "0.05"})
+    assert response.status_code == 504
+    assert response.json()["code"] == "deadline_exceeded"
+    assert service.cancelled.is_set()
+    assert CANCELLATIONS.labels("deadline", "before_response").value - before == 1
+
+
+def test_deadline_cuts_a_stalled_stream(client, monkeypatch):
+    service = HangingService()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    before = CANCELLATIONS.labels("deadline", "streaming").value
+
+    response = client.post("/api/v1/chat/completions", json={**BODY, "stream": True},
+                           headers={"X-Request-Timeout": "0.2"})
+    assert response.status_code == 200
+    assert "Hel" in response.text and "[DONE]" not in response.text
+    assert service.cancelled.is_set()
+    assert CANCELLATIONS.labels("deadline", "streaming").value - before == 1
+
+
+def test_per_model_default_deadline_applies_without_header(client, monkeypatch):
+    monkeypatch.setattr(service_factory, "get_service", lambda name: HangingService())
+    monkeypatch.setattr("core.deadline.settings.MODEL_REQUEST_TIMEOUTS", {"gpt-3.5": 0.05})
+    response = client.post("/api/v1/chat/completions", json=BODY)
+    assert response.status_code == 504
+
+
+def test_invalid_timeout_header_is_rejected(client, fake_service):
+    response = client.post("/api/v1/chat/completions", json=BODY, headers={"X-Request-Timeout": "soon"})
+    assert response.status_code == 400
+    assert fake_service.chat_calls == []
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_the_upstream_call(monkeypatch):
+    from main import app
+    service = HangingService()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    before = CANCELLATIONS.labels("client_disconnect", "before_response").value
+    messages = [{"type": "http.request", "body": json.dumps(BODY).encode(), "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/v1/chat/completions", "query_string": b"",
+        "headers": [(b"content-type", b"application/json")], "http_version": "1.1", "scheme": "http",
+        "server": ("test", 80), "client": ("test", 1), "root_path": "",
+    }
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    assert service.cancelled.is_set()
+    assert sent == []
+    assert CANCELLATIONS.labels("client_disconnect", "before_response").value - before == 1
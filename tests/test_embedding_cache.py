@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+from config import settings
+from core.embedding_cache import EmbeddingCache, MmapVectorStore, embedding_cache, text_key
+
+
+def test_mmap_store_survives_reopen(tmp_path):
+    prefix = str(tmp_path / "openai-model")
+    store = MmapVectorStore(prefix, dim=3)
+    store.MERGE_THRESHOLD = 2
+    store.append([text_key("a"), text_key("b")], np.array([[1, 2, 3], [4, 5, 6]]))
+    store.append([text_key("c")], np.array([[7, 8, 9]]))
+    assert store.get(text_key("b")).tolist() == [4, 5, 6]
+    assert store.get(text_key("c")).tolist() == [7, 8, 9]
+
+    reopened = MmapVectorStore(prefix, dim=3)
+    assert len(reopened) == 3
+    assert isinstance(reopened.get(text_key("a")), np.memmap)
+    assert reopened.get(text_key("c")).tolist() == [7, 8, 9]
+    assert reopened.get(text_key("missing")) is None
+
+
+def test_cache_falls_back_to_disk_tier(tmp_path):
+    scope = ("openai", "text-embedding-3-small", None)
+    cache = EmbeddingCache(max_entries=10, directory=str(tmp_path))
+    cache.set_many(scope, ["hello"], [[0.5, 0.25]])
+    cache.persist_many(scope, ["hello"], [[0.5, 0.25]])
+
+    restarted = EmbeddingCache(max_entries=10, directory=str(tmp_path))
+    assert restarted.get_many(scope, ["hello", "world"]) == [[0.5, 0.25], None]
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get_many(("openai", "other-model", None), ["hello"]) == [None]
+
+
+def test_endpoint_fetches_only_distinct_misses(client, fake_service, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_EMBEDDING_CACHE", True)
+    embedding_cache.clear()
+    url = "/api/v1/embeddings"
+
+    client.post(url, json={"model": "text-embedding-3-small", "input": ["a", "bb"]})
+    response = client.post(url, json={"model": "text-embedding-3-small", "input": ["ccc", "a", "ccc", "bb"]})
+
+    assert fake_service.embedding_calls[-1].input == ["ccc"]
+    assert response.headers["X-Cache-Hits"] == "2"
+    assert response.headers["X-Cache-Misses"] == "1"
+    data = response.json()["data"]
+    assert [item["index"] for item in data] == [0, 1, 2, 3]
+    assert [item["embedding"][0] for item in data] == [3.0, 1.0, 3.0, 2.0]
+    embedding_cache.clear()
+
+
+def test_lookups_see_consistent_rows_during_appends(tmp_path):
+    store = MmapVectorStore(str(tmp_path / "openai-model"), dim=2)
+    store.MERGE_THRESHOLD = 16
+    done = threading.Event()
+
+    def writer():
+        for i in range(0, 400, 4):
+            store.append([text_key(str(j)) for j in range(i, i + 4)], np.array([[j, -j] for j in range(i, i + 4)]))
+        done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not done.is_set():
+        for j in range(0, 400, 7):
+            vector = store.get(text_key(str(j)))
+            assert vector is None or vector.tolist() == [j, -j]
+    thread.join()
+    assert len(store) == 400 and store.get(text_key("399")).tolist() == [399, -399]
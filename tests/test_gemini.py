@@ -1,7 +1,11 @@
 import pytest
 import os
+import asyncio
+import time
+import httpx
 from services.gemini_service import GeminiService
 from core.models import ChatCompletionRequest, Message, Role, TextEmbeddingRequest
+from core.utils import calculate_cache_key
 
 @pytest.fixture
 def gemini_service():
@@ -54,4 +58,65 @@ async def test_get_model_info(gemini_service):
 
 @pytest.mark.asyncio
 async def test_health_check(gemini_service):
-    assert await gemini_service.health_check() is True 
\ No newline at end of file
+    assert await gemini_service.health_check() is True 
+
+@pytest.mark.asyncio
+async def test_parallel_chat_completions_overlap(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    delay, calls = 0.2, 5
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "candidates": [{"content": {"role": "model", "parts": [{"text": "Hello!"}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 2, "totalTokenCount": 5},
+        })
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        service = GeminiService(client=client)
+        request = ChatCompletionRequest(
+            model="gemini-2.0-flash-lite",
+            messages=[Message(role=Role.USER, content="Say hello!")]
+        )
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[service.get_chat_completion(request) for _ in range(calls)])
+        elapsed = time.perf_counter() - started
+
+    # Serialised calls would take calls * delay; overlapping ones take about one delay
+    assert elapsed < delay * 2
+    assert all(r.choices[0].message.content == "Hello!" for r in responses)
+    assert responses[0].usage.total_tokens == 5
+
+
+@pytest.mark.asyncio
+async def test_list_models_reads_every_page_of_the_rest_catalogue(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    pages = {
+        None: {"models": [{"name": "models/gemini-pro", "inputTokenLimit": 30720,
+                           "supportedGenerationMethods": ["generateContent"]},
+                          {"name": "models/text-embedding-004", "supportedGenerationMethods": ["embedContent"]}],
+               "nextPageToken": "next"},
+        "next": {"models": [{"name": "models/gemini-2.0-flash-lite", "inputTokenLimit": 1048576}]},
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=pages[request.url.params.get("pageToken")])
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        models = await GeminiService(client=client).list_models()
+    assert [(m.id, m.max_tokens) for m in models] == [("gemini-pro", 30720), ("gemini-2.0-flash-lite", 1048576)]
+    assert all(m.capabilities == ["chat_completion"] for m in models)
+
+
+def test_cache_keys_cover_everything_sent_upstream(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    service = GeminiService()
+
+    def key(**fields):
+        request = ChatCompletionRequest(model="gemini-2.0-flash-lite", messages=[{"role": "user", "content": "hi"}],
+                                        temperature=0, **fields)
+        return calculate_cache_key("gemini", service.convert_request(request))
+
+    assert key(stop="\n") != key(stop=".") != key()
+    # Penalties never reach generateContent, so they don't split the cache
+    assert key(presence_penalty=1.0) == key()
@@ -0,0 +1,101 @@
+import httpx
+import pytest
+from core.models import Provider
+from services import service_factory
+from services.health import CircuitState, HealthMonitor
+from tests.conftest import FakeLLMService
+from tests.test_resilience import FlakyService, caller, chat_request, status_error
+
+
+def monitor(**overrides):
+    options = dict(probe_interval=0, probe_timeout=1, alpha=0.5, failure_threshold=2,
+                   error_rate_threshold=0.5, min_samples=10, cooldown=30, routing_hysteresis=0.2)
+    options.update(overrides)
+    return HealthMonitor(**options)
+
+
+def test_consecutive_failures_open_the_circuit_and_a_trial_closes_it(monkeypatch):
+    health = monitor()
+    health.record("openai", 0.1, False)
+    assert health.allow("openai")
+    health.record("openai", 0.1, False)
+    assert health.status()["openai"]["circuit"] == "open"
+    assert not health.allow("openai")
+
+    # After the cooldown exactly one trial call is let through
+    opened_at = health._providers["openai"].opened_at
+    monkeypatch.setattr("services.health.time.monotonic", lambda: opened_at + 31)
+    assert health.allow("openai")
+    assert health._providers["openai"].state == CircuitState.HALF_OPEN
+    assert not health.allow("openai")
+    health.record("openai", 0.2, True)
+    assert health.status()["openai"]["circuit"] == "closed"
+    assert health.allow("openai")
+
+
+def test_routing_prefers_healthy_then_clearly_faster_providers(monkeypatch):
+    health = monitor(alpha=1.0)
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    assert health.route("gpt-3.5-turbo", "openai") == ("openai", "gpt-3.5-turbo")
+
+    # A marginally faster equivalent does not take the traffic, a clearly faster one does...
+    health.record("openai", 1.0, True)
+    health.record("gemini", 0.9, True)
+    assert health.route("gpt-3.5-turbo", "openai") == ("openai", "gpt-3.5-turbo")
+    health.record("gemini", 0.5, True)
+    assert health.route("gpt-3.5-turbo", "openai") == ("gemini", "gemini-2.0-flash-lite")
+
+    # ...and keeps it until the default is clearly faster again
+    health.record("gemini", 0.9, True)
+    assert health.route("gpt-3.5-turbo", "openai")[0] == "gemini"
+    health.record("gemini", 1.5, True)
+    assert health.route("gpt-3.5-turbo", "openai")[0] == "openai"
+
+    # An open circuit moves traffic whatever the latencies
+    health.record("openai", 0.1, False)
+    health.record("openai", 0.1, False)
+    assert health.route("gpt-3.5-turbo", "openai") == ("gemini", "gemini-2.0-flash-lite")
+
+
+@pytest.mark.asyncio
+async def test_probe_failures_count_and_recovery_half_opens(monkeypatch):
+    health = monitor(failure_threshold=1)
+    service = FakeLLMService()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+
+    async def down():
+        raise httpx.ConnectError("refused")
+    monkeypatch.setattr(service, "health_check", down)
+    assert not await health.probe("openai")
+    assert health.status()["openai"]["circuit"] == "open"
+    assert "refused" in health.status()["openai"]["last_probe"]["error"]
+
+    monkeypatch.undo()
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    assert await health.probe("openai")
+    assert health.status()["openai"]["circuit"] == "half_open"
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_is_skipped_in_favour_of_failover(monkeypatch, fresh_health):
+    primary = FlakyService([status_error(503)] * 5)
+    secondary = FakeLLMService()
+    secondary.provider = Provider.GEMINI
+    monkeypatch.setattr(fresh_health, "failure_threshold", 3)
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    monkeypatch.setattr(service_factory, "get_service", lambda name: secondary)
+
+    await caller().call(primary, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert fresh_health.status()["openai"]["circuit"] == "open"
+    # The next request goes straight to the healthy provider
+    response, served_by = await caller().call(primary, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert served_by is secondary
+    assert len(primary.chat_calls) == 3
+
+
+def test_health_endpoint_reports_cached_provider_health(client, fake_service, fresh_health):
+    for _ in range(fresh_health.failure_threshold):
+        fresh_health.record("gemini", 0.1, False)
+    data = client.get("/health").json()
+    assert data["status"] == "degraded"
+    assert data["provider_health"]["gemini"]["circuit"] == "open"
@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from core.models import ChatCompletionRequest, Provider
+from core.rate_limit import RateLimiter
+from services import service_factory
+from services.hedging import HEDGE_WINS, HEDGES, HedgeBudget, Hedger
+from tests.conftest import FakeLLMService
+
+
+class SlowFirstService(FakeLLMService):
+    """The first call hangs for `first_delay`; later ones answer at once."""
+
+    def __init__(self, first_delay):
+        super().__init__()
+        self.first_delay = first_delay
+        self.attempts = 0
+        self.cancelled = 0
+
+    async def get_chat_completion(self, request):
+        self.attempts += 1
+        if self.attempts == 1:
+            try:
+                await asyncio.sleep(self.first_delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return await super().get_chat_completion(request)
+
+
+def hedger(**overrides):
+    options = dict(enabled=True, delay=0.01, percentile=0.95, fallback_delay=1.0, min_delay=0.0,
+                   budget=HedgeBudget(1.0, 10), cross_provider=False)
+    options.update(overrides)
+    return Hedger(**options)
+
+
+def chat_request(**fields):
+    fields.setdefault("temperature", 0)
+    return ChatCompletionRequest(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}], **fields)
+
+
+def test_only_requests_safe_to_repeat_are_eligible():
+    h = hedger()
+    assert h.eligible(chat_request())
+    assert not h.eligible(chat_request(temperature=0.7))
+    assert h.eligible(chat_request(temperature=0.7, hedge=True))
+    assert not h.eligible(chat_request(hedge=False))
+    assert not hedger(enabled=False).eligible(chat_request())
+
+
+def test_hedge_delay_follows_the_model_not_the_provider(fresh_health):
+    for _ in range(20):
+        fresh_health.record("openai", 0.2, True, "gpt-3.5-turbo")
+        fresh_health.record("openai", 8.0, True, "gpt-4")
+    h = hedger(delay=None)
+    assert h.hedge_delay("openai", "gpt-3.5-turbo") == 0.2
+    assert h.hedge_delay("openai", "gpt-4") == 8.0
+    assert h.hedge_delay("openai", "gpt-4o") == h.fallback_delay
+
+
+def test_budget_limits_hedges_to_a_fraction_of_requests():
+    budget = HedgeBudget(0.05, 10)
+    granted = 0
+    for _ in range(200):
+        budget.deposit()
+        granted += budget.withdraw()
+    assert granted == 10
+
+
+@pytest.mark.asyncio
+async def test_slow_first_attempt_is_hedged_and_cancelled():
+    service = SlowFirstService(first_delay=5)
+    before = HEDGE_WINS.labels("openai").value
+    response, served_by = await hedger().call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert served_by is service
+    assert service.attempts == 2
+    assert service.cancelled == 1
+    assert HEDGE_WINS.labels("openai").value - before == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_answers_and_spent_budget_send_no_hedge():
+    service = SlowFirstService(first_delay=0.05)
+    before = HEDGES.labels("openai").value
+    await hedger(budget=HedgeBudget(0.05, 10)).call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert service.attempts == 1
+    await hedger(delay=1).call(FakeLLMService(), chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert HEDGES.labels("openai").value == before
+
+
+@pytest.mark.asyncio
+async def test_hedge_goes_to_the_fastest_equivalent_provider(monkeypatch, fresh_health):
+    primary = SlowFirstService(first_delay=5)
+    secondary = FakeLLMService()
+    secondary.provider = Provider.GEMINI
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    monkeypatch.setattr(service_factory, "get_service", lambda name: secondary)
+    fresh_health.record("openai", 2.0, True)
+    fresh_health.record("gemini", 0.1, True)
+
+    response, served_by = await hedger(cross_provider=True).call(
+        primary, chat_request(), lambda s, r: s.get_chat_completion(r)
+    )
+    assert served_by is secondary
+    assert secondary.chat_calls[0].model == "gemini-2.0-flash-lite"
+    assert primary.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_hedges_are_charged_to_their_provider(monkeypatch):
+    limiter = RateLimiter(True, user_rpm=0, user_tpm=0, key_rpm=0, key_tpm=0, provider_rpm=1, provider_tpm=0)
+    monkeypatch.setattr("services.resilience.rate_limiter", limiter)
+
+    service = SlowFirstService(first_delay=5)
+    await hedger().call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert service.attempts == 2
+
+    # The provider's limit is now spent, so the next slow request waits for its first attempt
+    service = SlowFirstService(first_delay=0.05)
+    before = HEDGES.labels("openai").value
+    await hedger().call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert service.attempts == 1
+    assert HEDGES.labels("openai").value == before
@@ -0,0 +1,47 @@
+import httpx
+import pytest
+from core.models import ChatCompletionRequest, Message, Provider, Role
+from services.http_client import HTTPClientManager
+from services.openai_service import OpenAIService
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_per_provider():
+    manager = HTTPClientManager()
+    client = manager.get(Provider.OPENAI)
+    assert manager.get(Provider.OPENAI) is client
+    assert manager.get(Provider.GEMINI) is not client
+
+    stats = manager.stats()
+    assert stats["openai"] == {"connections": 0, "in_use": 0, "idle": 0, "waiters": 0, "closed": False}
+
+    await manager.close()
+    assert client.is_closed
+    assert manager.get(Provider.OPENAI) is not client
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_openai_service_reuses_injected_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers["Authorization"])
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "created": 1,
+            "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        service = OpenAIService(client=client)
+        request = ChatCompletionRequest(model="gpt-3.5-turbo", messages=[Message(role=Role.USER, content="hi")])
+        for _ in range(3):
+            response = await service.get_chat_completion(request)
+            assert response.choices[0].message.content == "hi"
+        assert service.client is client
+
+    assert seen == ["Bearer test-key"] * 3
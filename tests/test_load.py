@@ -0,0 +1,64 @@
+import httpx
+import pytest
+from benchmarks.load import Call, compare, run_fixed_concurrency, run_fixed_rate, upstream_seconds
+from benchmarks.mock_providers import Latency, MockBehaviour, create_app
+from core.models import ChatCompletionRequest, Message, Role, TextEmbeddingRequest
+from services.gemini_service import GeminiService
+from services.openai_service import OpenAIService
+
+
+def mock_client(**behaviour):
+    app = create_app(MockBehaviour(Latency("fixed:0"), tokens_per_second=10_000, **behaviour))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock")
+
+
+def chat(model, **fields):
+    return ChatCompletionRequest(model=model, messages=[Message(role=Role.USER, content="Say hello")], **fields)
+
+
+@pytest.mark.asyncio
+async def test_mock_providers_speak_both_wire_protocols(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("GEMINI_API_KEY", "mock")
+    async with mock_client(completion_tokens=5) as client:
+        openai, gemini = OpenAIService(client=client), GeminiService(client=client)
+
+        response = await openai.get_chat_completion(chat("gpt-4o-mini", max_tokens=3))
+        assert response.usage.completion_tokens == 3 and response.choices[0].message.content
+        chunks = [chunk async for chunk in openai.stream_chat_completion(chat("gpt-4o-mini"))]
+        assert len(chunks) == 6 and chunks[-1].choices[0].finish_reason == "length"
+        embeddings = await openai.get_embeddings(TextEmbeddingRequest(model="text-embedding-3-small",
+                                                                      input=["a", "b"], dimensions=8))
+        assert [len(item.embedding) for item in embeddings.data] == [8, 8]
+        assert "gpt-4o-mini" in [model.id for model in await openai.list_models()]
+
+        response = await gemini.get_chat_completion(chat("gemini-2.0-flash-lite"))
+        assert response.usage.completion_tokens == 5 and response.choices[0].finish_reason == "length"
+        chunks = [chunk async for chunk in gemini.stream_chat_completion(chat("gemini-2.0-flash-lite"))]
+        assert len(chunks) == 5 and chunks[0].choices[0].delta.role == Role.ASSISTANT
+        assert await gemini.health_check()
+
+
+@pytest.mark.asyncio
+async def test_load_runs_report_errors_and_latency():
+    calls = [Call.parse({"path": "/v1/chat/completions", "body": {"model": "gpt-4", "messages": [
+        {"role": "user", "content": "hi"}], "stream": stream}}) for stream in (False, True)]
+    async with mock_client(error_rate=0.5, error_statuses=[503]) as client:
+        result = await run_fixed_concurrency(client, calls, concurrency=4, duration=0.2)
+        assert result["requests"] == result["succeeded"] + result["errors"].get("503", 0)
+        assert set(result["errors"]) <= {"503"} and result["succeeded"] > 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] and result["ttft_ms"] is not None
+
+        result = await run_fixed_rate(client, calls, qps=50, duration=0.2, max_in_flight=10)
+        assert result["requests"] == 10 and result["load"] == {"mode": "qps", "qps": 50, "dropped": 0}
+
+
+def test_regressions_are_flagged_against_a_baseline():
+    assert upstream_seconds("parse;dur=0.4, upstream;dur=250.00, total;dur=251.2") == 0.25
+    baseline = {"throughput_rps": 100.0, "error_rate": 0.0, "latency_ms": {"p50": 100.0, "p95": 200.0, "p99": 300.0},
+                "ttft_ms": None, "overhead_ms": {"p50": 2.0, "p99": 5.0}}
+    same = {**baseline, "latency_ms": {"p50": 105.0, "p95": 210.0, "p99": 300.0}}
+    assert compare(same, baseline, tolerance=0.10) == []
+    worse = {**baseline, "throughput_rps": 80.0, "error_rate": 0.05, "overhead_ms": {"p50": 3.0, "p99": 5.0}}
+    regressions = compare(worse, baseline, tolerance=0.10)
+    assert [r.split(":")[0] for r in regressions] == ["throughput_rps", "overhead_ms.p50", "error_rate"]
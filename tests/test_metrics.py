@@ -0,0 +1,63 @@
+from core.metrics import MetricsRegistry
+from core.telemetry import ERRORS, REQUEST_DURATION, STREAM_TTFT, TOKENS, UPSTREAM_DURATION
+
+BODY = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def test_label_lookups_are_cached_and_collectors_run_on_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("things_total", "Things", ["kind", "status"])
+    counter.labels("a", 200).inc()
+    counter.labels("a", "200").inc()
+    assert counter.labels("a", 200) is counter.labels("a", "200")
+
+    gauge = registry.gauge("level", "Level")
+
+    @registry.collector
+    def collect():
+        gauge.set(7)
+
+    @registry.collector
+    def broken():
+        raise RuntimeError("pool went away")
+
+    text = registry.render()
+    assert 'things_total{kind="a",status="200"} 2.0' in text
+    assert "level 7" in text
+
+
+def test_chat_request_records_latency_upstream_and_tokens(client, fake_service):
+    requests = REQUEST_DURATION.labels("chat", "openai", "gpt-3.5-turbo").count
+    upstream = UPSTREAM_DURATION.labels("openai").count
+    prompt = TOKENS.labels("openai", "gpt-3.5-turbo", "prompt").value
+
+    assert client.post("/api/v1/chat/completions", json=BODY).status_code == 200
+    assert REQUEST_DURATION.labels("chat", "openai", "gpt-3.5-turbo").count == requests + 1
+    assert UPSTREAM_DURATION.labels("openai").count == upstream + 1
+    assert TOKENS.labels("openai", "gpt-3.5-turbo", "prompt").value == prompt + 3
+
+    text = client.get("/metrics").text
+    assert 'gateway_http_request_duration_seconds_count{method="POST",route="/api/v1/chat/completions",status="200"}' in text
+    assert 'gateway_overhead_seconds_count{endpoint="chat"}' in text
+    assert 'gateway_cache_entries{cache="response"}' in text
+
+
+def test_route_label_keeps_path_parameters_templated(client, fake_service):
+    client.get("/api/v1/models/gpt-3.5-turbo")
+    text = client.get("/metrics").text
+    assert 'route="/api/v1/models/{model_id}"' in text
+    assert 'route="/api/v1/models/gpt-3.5-turbo"' not in text
+
+
+def test_streams_record_time_to_first_token(client, fake_service):
+    before = STREAM_TTFT.labels("openai", "gpt-3.5-turbo").count
+    response = client.post("/api/v1/chat/completions", json={**BODY, "stream": True})
+    assert response.status_code == 200
+    assert STREAM_TTFT.labels("openai", "gpt-3.5-turbo").count == before + 1
+
+
+def test_errors_are_counted_by_code(client, fake_service):
+    before = ERRORS.labels("invalid_request", 400).value
+    response = client.post("/api/v1/chat/completions", json=BODY, headers={"X-Priority": "urgent"})
+    assert response.status_code == 400
+    assert ERRORS.labels("invalid_request", 400).value == before + 1
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from api.routers import models as models_router
+from core.errors import ModelNotFoundError
+from services.model_catalog import ModelCatalog
+
+
+@pytest.mark.asyncio
+async def test_catalogue_serves_stale_while_revalidating(fake_service):
+    catalog = ModelCatalog(ttl=0)
+    assert [m.id for m in await catalog.list_models("openai")] == ["gpt-3.5-turbo", "text-embedding-3-small"]
+    assert fake_service.list_calls == 1
+
+    # Expired: answered from memory right away, refreshed in the background
+    assert (await catalog.get_model("openai", "gpt-3.5-turbo")).max_tokens == 16385
+    assert fake_service.list_calls == 1
+    await asyncio.sleep(0.01)
+    assert fake_service.list_calls == 2
+    await catalog.stop()
+
+
+@pytest.mark.asyncio
+async def test_validation_and_context_windows(fake_service):
+    catalog = ModelCatalog(ttl=60)
+    catalog.validate("openai", "anything")  # not loaded yet, so not checked
+
+    await catalog.start(["openai"])
+    catalog.validate("openai", "gpt-3.5-turbo")
+    with pytest.raises(ModelNotFoundError):
+        catalog.validate("openai", "gpt-9")
+
+    assert catalog.max_tokens("openai", "gpt-3.5-turbo") == 16385
+    # Listed without a context length: falls back to the known defaults
+    assert catalog.max_tokens("openai", "text-embedding-3-small") == 8191
+    assert catalog.max_tokens("openai", "unknown") is None
+    await catalog.stop()
+
+
+def test_models_endpoints_use_catalogue(client, fake_service, monkeypatch):
+    monkeypatch.setattr(models_router, "model_catalog", ModelCatalog(ttl=60))
+    assert len(client.get("/api/v1/models").json()) == 2
+    assert client.get("/api/v1/models/gpt-3.5-turbo").json()["id"] == "gpt-3.5-turbo"
+    assert client.get("/api/v1/models/gpt-9").status_code == 404
+    assert fake_service.list_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_cold_lookups_share_one_load(fake_service):
+    catalog = ModelCatalog(ttl=60)
+    results = await asyncio.gather(*[catalog.get_model("openai", "gpt-3.5-turbo") for _ in range(5)])
+    assert all(model.id == "gpt-3.5-turbo" for model in results)
+    assert fake_service.list_calls == 1
@@ -0,0 +1,91 @@
+import pytest
+from core.errors import InvalidRequestError, RateLimitError
+from core.rate_limit import GCRA, LimitScope, RateLimiter, rate_limiter
+
+
+def test_gcra_allows_a_full_bucket_then_spaces_requests():
+    limiter = GCRA(limit=2, period=60)
+    for _ in range(2):
+        assert limiter.wait("k", 1, now=0) == 0.0
+        limiter.charge("k", 1, now=0)
+    assert limiter.wait("k", 1, now=0) == pytest.approx(30)
+    assert limiter.wait("k", 1, now=30) == 0.0
+    assert limiter.remaining("k", now=0) == 0
+    assert limiter.remaining("other", now=0) == 2
+
+
+def test_gcra_sweeps_refilled_keys():
+    limiter = GCRA(limit=10, period=1)
+    for i in range(1025):
+        limiter.charge(str(i), 1, now=0)
+    # Once the table has doubled since the last sweep, a charge drops the refilled keys
+    for i in range(1026):
+        limiter.charge(f"late-{i}", 1, now=5)
+    assert len(limiter) == 1026
+
+
+def test_rejection_charges_no_scope_and_reconcile_refunds():
+    limiter = RateLimiter(True, user_rpm=1, user_tpm=0, key_rpm=0, key_tpm=0, provider_rpm=0, provider_tpm=100)
+    reservation = limiter.acquire("alice", None, "openai", 60)
+    with pytest.raises(RateLimitError) as exc:
+        limiter.acquire("alice", None, "openai", 30)
+    assert exc.value.details["scope"] == "user"
+    assert int(exc.value.headers["Retry-After"]) > 0
+
+    # Only the admitted request counts against the provider's tokens...
+    with pytest.raises(RateLimitError):
+        limiter.acquire("bob", None, "openai", 60)
+    # ...and reconciling with the actual usage gives the difference back
+    reservation.settle(10)
+    limiter.acquire("bob", None, "openai", 60)
+
+
+def test_unlimited_checks_share_one_settled_reservation():
+    disabled = RateLimiter(False, user_rpm=1, user_tpm=0, key_rpm=0, key_tpm=0, provider_rpm=0, provider_tpm=0)
+    reservation = disabled.acquire("alice", None, "openai", 60)
+    assert reservation is disabled.acquire("bob", None, "openai", 60) and reservation.settled
+
+    # A user limit doesn't apply to anonymous requests, so they share it as well
+    limiter = RateLimiter(True, user_rpm=1, user_tpm=0, key_rpm=0, key_tpm=0, provider_rpm=0, provider_tpm=0)
+    shared = limiter.acquire(None, None, "openai", 60)
+    assert shared is limiter.acquire(None, None, "openai", 60)
+    headers = {}
+    shared.write_headers(headers)
+    assert headers == {}
+
+    limiter.acquire("alice", None, "openai", 60).write_headers(headers)
+    assert headers["X-RateLimit-Remaining-Requests"] == "0"
+
+
+def test_chat_endpoint_returns_429_with_headers(client, fake_service, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "users", LimitScope("user", 1, 0))
+    body = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}], "user": "noisy"}
+
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Limit-Requests"] == "1"
+    assert response.headers["X-RateLimit-Remaining-Requests"] == "0"
+
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 429
+    assert response.json()["code"] == "rate_limit_exceeded"
+    assert int(response.headers["Retry-After"]) == 60
+    assert len(fake_service.chat_calls) == 1
+
+
+def test_failed_requests_get_their_estimate_back(client, fake_service, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "users", LimitScope("user", 0, 1000))
+
+    async def fail(request):
+        raise InvalidRequestError("rejected upstream")
+    monkeypatch.setattr(fake_service, "get_chat_completion", fail)
+    monkeypatch.setattr(fake_service, "get_embeddings", fail)
+    chat = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 600, "user": "u"}
+    embeddings = {"model": "text-embedding-3-small", "input": "hi " * 600, "user": "u"}
+
+    # Without refunds the second request would find the 1000-token budget already spent
+    for _ in range(2):
+        assert client.post("/api/v1/chat/completions", json=chat).status_code == 400
+        assert client.post("/api/v1/embeddings", json=embeddings).status_code == 400
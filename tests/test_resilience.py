@@ -0,0 +1,170 @@
+import httpx
+import pytest
+from config import settings
+from core.errors import (
+    AuthenticationError, ContextLengthExceededError, ProviderError, RateLimitError, ServiceUnavailableError,
+    UpstreamTimeoutError
+)
+from core.models import ContextPolicy, Provider
+from core.rate_limit import RateLimiter
+from core.utils import equivalent_models
+from services import service_factory
+from services.resilience import RETRIES, ResilientCaller, classify_error
+from tests.conftest import FakeLLMService
+
+
+def status_error(status, body=None, headers=None):
+    request = httpx.Request("POST", "https://upstream.test/v1/chat/completions")
+    response = httpx.Response(status, json=body or {"error": {"message": "boom"}}, headers=headers, request=request)
+    return httpx.HTTPStatusError("upstream error", request=request, response=response)
+
+
+class FlakyService(FakeLLMService):
+    def __init__(self, failures, provider=Provider.OPENAI):
+        super().__init__()
+        self.failures = list(failures)
+        self.provider = provider
+
+    async def get_chat_completion(self, request):
+        if self.failures:
+            self.chat_calls.append(request)
+            raise self.failures.pop(0)
+        return await super().get_chat_completion(request)
+
+
+def test_upstream_errors_are_classified():
+    error, retryable = classify_error(status_error(429, headers={"Retry-After": "2"}), "openai")
+    assert isinstance(error, RateLimitError) and retryable
+    assert error.headers == {"Retry-After": "2"}
+
+    error, retryable = classify_error(status_error(401), "openai")
+    assert isinstance(error, AuthenticationError) and not retryable
+
+    body = {"error": {"message": "This model's maximum context length is 16385 tokens"}}
+    error, retryable = classify_error(status_error(400, body), "openai")
+    assert isinstance(error, ContextLengthExceededError) and not retryable
+
+    error, retryable = classify_error(status_error(503), "openai")
+    assert isinstance(error, ProviderError) and retryable
+    assert error.details["upstream_status"] == 503
+
+    error, retryable = classify_error(httpx.ReadTimeout("slow"), "openai")
+    assert isinstance(error, UpstreamTimeoutError) and error.status_code == 504 and retryable
+
+
+def caller(**overrides):
+    options = dict(max_attempts=3, base_delay=0.001, max_delay=0.002, budget=5, failover=True)
+    options.update(overrides)
+    return ResilientCaller(**options)
+
+
+def chat_request():
+    from core.models import ChatCompletionRequest
+    return ChatCompletionRequest(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+
+
+@pytest.mark.asyncio
+async def test_retryable_failures_are_retried_until_success():
+    service = FlakyService([status_error(503), httpx.ConnectError("refused")])
+    before = RETRIES.labels("openai", "provider_error").value
+    response, served_by = await caller().call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert served_by is service
+    assert len(service.chat_calls) == 3
+    assert RETRIES.labels("openai", "provider_error").value - before == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried_or_failed_over(monkeypatch):
+    service = FlakyService([status_error(400)])
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    with pytest.raises(Exception) as exc:
+        await caller().call(service, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert exc.value.status_code == 400
+    assert len(service.chat_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_exhausted_primary_fails_over_to_mapped_model(monkeypatch):
+    primary = FlakyService([status_error(503)] * 3)
+    secondary = FakeLLMService()
+    secondary.provider = Provider.GEMINI
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    monkeypatch.setattr(service_factory, "get_service", lambda name: secondary)
+
+    response, served_by = await caller().call(primary, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert served_by is secondary
+    assert len(primary.chat_calls) == 3
+    assert secondary.chat_calls[0].model == "gemini-2.0-flash-lite"
+    assert response.provider == Provider.GEMINI
+
+
+@pytest.mark.asyncio
+async def test_local_load_shedding_is_not_failed_over(monkeypatch):
+    primary = FlakyService([ServiceUnavailableError("overloaded", {"reason": "queue_full"})])
+    secondary = FakeLLMService()
+    secondary.provider = Provider.GEMINI
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    monkeypatch.setattr(service_factory, "get_service", lambda name: secondary)
+
+    with pytest.raises(ServiceUnavailableError):
+        await caller().call(primary, chat_request(), lambda s, r: s.get_chat_completion(r))
+    assert secondary.chat_calls == []
+
+
+@pytest.mark.asyncio
+async def test_failover_targets_get_their_own_context_window_and_limits(monkeypatch):
+    secondary = FakeLLMService()
+    secondary.provider = Provider.GEMINI
+    monkeypatch.setattr(service_factory.service_registry, "available_providers", lambda: ["openai", "gemini"])
+    monkeypatch.setattr(service_factory, "get_service", lambda name: secondary)
+    monkeypatch.setattr(settings, "CONTEXT_POLICY", ContextPolicy.REJECT)
+    limiter = RateLimiter(True, user_rpm=0, user_tpm=0, key_rpm=0, key_tpm=0, provider_rpm=1, provider_tpm=0)
+    monkeypatch.setattr("services.resilience.rate_limiter", limiter)
+    single = caller(max_attempts=1)
+    attempt = lambda s, r: s.get_chat_completion(r)
+
+    # A conversation too long for the equivalent model's window is not failed over
+    monkeypatch.setattr("services.resilience.model_catalog.max_tokens", lambda provider, model: 4)
+    with pytest.raises(ProviderError):
+        await single.call(FlakyService([status_error(503)]), chat_request(), attempt)
+    assert secondary.chat_calls == []
+
+    # One that fits is, once: the failover spends gemini's only request
+    monkeypatch.setattr("services.resilience.model_catalog.max_tokens", lambda provider, model: 1000)
+    response, served_by = await single.call(FlakyService([status_error(503)]), chat_request(), attempt)
+    assert served_by is secondary
+    with pytest.raises(ProviderError):
+        await single.call(FlakyService([status_error(503)]), chat_request(), attempt)
+    assert len(secondary.chat_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_rate_limits_do_not_trip_the_circuit(fresh_health):
+    service = FlakyService([status_error(429)] * 10)
+    for _ in range(5):
+        with pytest.raises(RateLimitError):
+            await caller(max_attempts=2, failover=False).call(
+                service, chat_request(), lambda s, r: s.get_chat_completion(r)
+            )
+    assert fresh_health.is_closed("openai")
+    assert "openai" not in fresh_health.status()
+
+
+def test_equivalents_stay_within_a_tier():
+    assert "gemini" not in equivalent_models("gpt-4")
+    assert equivalent_models("gpt-3.5-turbo")["gemini"] == "gemini-2.0-flash-lite"
+
+
+def test_chat_endpoint_reports_serving_provider_and_upstream_errors(client, monkeypatch):
+    service = FlakyService([status_error(500)] * 2)
+    monkeypatch.setattr(service_factory, "get_service", lambda name: service)
+    monkeypatch.setattr("api.routers.chat.resilient", caller(max_attempts=2, failover=False))
+    body = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]}
+
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 502
+    assert response.json()["code"] == "provider_error"
+
+    response = client.post("/api/v1/chat/completions", json=body)
+    assert response.status_code == 200
+    assert response.headers["X-Provider"] == "openai"
@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from core.errors import ServiceUnavailableError
+from core.scheduler import SHED, Priority, Scheduler
+
+
+def make_scheduler(concurrency=1, queue_size=10, timeout=5.0):
+    return Scheduler(
+        True, concurrency, {},
+        {Priority.INTERACTIVE: queue_size, Priority.BATCH: queue_size},
+        {Priority.INTERACTIVE: timeout, Priority.BATCH: timeout}
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded_per_provider():
+    scheduler = make_scheduler(concurrency=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*[scheduler.run("openai", Priority.INTERACTIVE, call) for _ in range(6)])
+    assert peak == 2
+    assert scheduler.stats()["openai"]["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_are_served_before_batch():
+    scheduler = make_scheduler()
+    order = []
+
+    async def call(name):
+        order.append(name)
+
+    await scheduler.acquire("openai", Priority.INTERACTIVE)
+    waiting = [
+        asyncio.create_task(scheduler.run("openai", Priority.BATCH, lambda: call("batch"))),
+        asyncio.create_task(scheduler.run("openai", Priority.INTERACTIVE, lambda: call("interactive"))),
+    ]
+    await asyncio.sleep(0)
+    scheduler.release("openai")
+    await asyncio.gather(*waiting)
+    assert order == ["interactive", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_expired_deadline_are_shed():
+    scheduler = make_scheduler(queue_size=1, timeout=0.05)
+    await scheduler.acquire("openai", Priority.INTERACTIVE)
+    queued = asyncio.create_task(scheduler.acquire("openai", Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+
+    before = SHED.labels("openai", "interactive", "queue_full").value
+    with pytest.raises(ServiceUnavailableError) as exc:
+        await scheduler.acquire("openai", Priority.INTERACTIVE)
+    assert exc.value.status_code == 503
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    assert SHED.labels("openai", "interactive", "queue_full").value == before + 1
+
+    with pytest.raises(ServiceUnavailableError) as exc:
+        await queued
+    assert exc.value.details["reason"] == "deadline"
+    assert scheduler.stats()["openai"]["queued_interactive"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = make_scheduler()
+    await scheduler.acquire("openai", Priority.INTERACTIVE)
+    waiter = asyncio.create_task(scheduler.acquire("openai", Priority.BATCH))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    scheduler.release("openai")
+    assert scheduler.stats()["openai"] == {
+        "active": 0, "max_concurrency": 1, "queued_interactive": 0, "queued_batch": 0
+    }
+
+
+def test_invalid_priority_header_is_rejected(client, fake_service):
+    body = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]}
+    response = client.post("/api/v1/chat/completions", json=body, headers={"X-Priority": "urgent"})
+    assert response.status_code == 400
+    response = client.post("/api/v1/chat/completions", json=body, headers={"X-Priority": "batch"})
+    assert response.status_code == 200
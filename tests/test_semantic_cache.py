@@ -0,0 +1,94 @@
+import asyncio
+import numpy as np
+import pytest
+from config import settings
+from core.semantic_cache import SemanticCache, VectorIndex, normalize_prompt, semantic_cache
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  What is   the\nCapital of France? ") == "what is the capital of france?"
+
+
+def test_index_evicts_oldest_beyond_capacity():
+    index = VectorIndex(dim=2, capacity=2)
+    index.add_many([[1, 0], [0, 1]], ["x", "y"])
+    index.add([-1, 0], "z")
+    assert len(index) == 2
+    # "x" was evicted, so the closest remaining entry to it is "y"
+    assert index.search([1, 0.01])[1] == "y"
+    assert index.search([-1, 0])[1] == "z"
+
+
+def test_clustered_index_finds_near_duplicates():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((600, 16)).astype(np.float32)
+    index = VectorIndex(dim=16, capacity=1000, nlist=8, nprobe=3, train_size=256)
+    index.add_many(vectors, list(range(600)))
+    assert index.centroids is not None
+
+    for target in (0, 255, 256, 599):
+        score, payload = index.search(vectors[target] + 0.01)
+        assert payload == target
+        assert score > 0.99
+
+
+@pytest.mark.asyncio
+async def test_index_trains_off_the_event_loop():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 16)).astype(np.float32)
+    index = VectorIndex(dim=16, capacity=1000, nlist=8, nprobe=3, train_size=256)
+    index.add_many(vectors[:280], list(range(280)))
+    # Not trained yet: lookups scan exhaustively, and entries keep arriving meanwhile
+    assert index.centroids is None and index._training is not None
+    index.add_many(vectors[280:], list(range(280, 300)))
+    assert index.search(vectors[10])[1] == 10
+
+    await index._training
+    assert index.centroids is not None
+    for target in (0, 279, 299):
+        assert index.search(vectors[target] + 0.01)[1] == target
+
+
+def test_capacity_bounds_all_scopes_together():
+    cache = SemanticCache(threshold=0.9, capacity=3, max_scopes=8)
+    cache.add("a", [1.0, 0.0], b"a1")
+    cache.add("b", [1.0, 0.0], b"b1")
+    cache.add("a", [0.0, 1.0], b"a2")
+    cache.add("b", [0.0, 1.0], b"b2")
+    assert cache.stats()["entries"] == 3
+    # The oldest entry overall went, whichever scope it was in
+    assert cache.lookup("a", [1.0, 0.0]) is None
+    assert cache.lookup("b", [1.0, 0.0])[1] == b"b1"
+    assert cache.lookup("a", [0.0, 1.0])[1] == b"a2"
+
+
+def test_cache_applies_threshold_per_scope():
+    cache = SemanticCache(threshold=0.9, capacity=10, max_scopes=1)
+    cache.add(("openai", "gpt-4"), [1.0, 0.0], b"cached")
+    assert cache.lookup(("openai", "gpt-4"), [0.99, 0.05])[1] == b"cached"
+    assert cache.lookup(("openai", "gpt-4"), [0.5, 0.5]) is None
+    assert cache.lookup(("gemini", "gpt-4"), [1.0, 0.0]) is None
+
+    cache.add(("gemini", "gpt-4"), [1.0, 0.0], b"other")  # drops the least recently used scope
+    assert cache.stats()["scopes"] == 1
+    assert cache.lookup(("openai", "gpt-4"), [1.0, 0.0]) is None
+
+
+def test_chat_endpoint_serves_near_duplicates(client, fake_service, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    semantic_cache.clear()
+
+    def ask(content: str):
+        return client.post("/api/v1/chat/completions", json={
+            "model": "gpt-3.5-turbo", "temperature": 0, "messages": [{"role": "user", "content": content}]
+        })
+
+    first = ask("What is the capital of France?")
+    second = ask("what is  the capital of FRANCE?")
+
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["X-Cache-Layer"] == "semantic"
+    assert len(fake_service.chat_calls) == 1
+    assert fake_service.embedding_calls[0].input == "what is the capital of france?"
+    semantic_cache.clear()
@@ -0,0 +1,60 @@
+import json
+from config import settings
+from core.cache import response_cache
+from core.embedding_cache import embedding_cache
+from core.models import ChatCompletionResponse, Provider, TextEmbeddingResponse, Usage
+from core.serialization import dumps, loads, model_response
+from services.openai_service import OpenAIService
+
+
+def test_dumps_matches_pydantic_and_keeps_headers():
+    response = ChatCompletionResponse(
+        id="chat-1", created=1, model="gpt-4",
+        choices=[{"index": 0, "message": {"role": "assistant", "content": "héllo"}, "finish_reason": "stop"}],
+        usage={"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}, provider=Provider.OPENAI
+    )
+    assert loads(dumps(response)) == json.loads(response.model_dump_json())
+
+    class Injected:
+        status_code = 201
+        raw_headers = [(b"x-provider", b"openai")]
+    rendered = model_response(response, Injected())
+    assert rendered.status_code == 201 and rendered.headers["X-Provider"] == "openai"
+    assert model_response(dumps(response)).body == rendered.body
+
+
+def test_embedding_responses_skip_per_float_validation(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    payload = {"object": "list", "model": "text-embedding-3-small",
+               "data": [{"object": "embedding", "index": 1, "embedding": [0.5, 0.25]},
+                        {"object": "embedding", "index": 0, "embedding": [1.0, 0.0]}],
+               "usage": {"prompt_tokens": 2, "total_tokens": 2}}
+    response = OpenAIService().convert_response(payload, request_type="embedding")
+    assert [item.embedding for item in response.data] == [[1.0, 0.0], [0.5, 0.25]]
+    assert response.usage.completion_tokens == 0
+    expected = TextEmbeddingResponse(id=response.id, model=payload["model"], provider=Provider.OPENAI,
+                                     data=[{"index": 0, "embedding": [1.0, 0.0]}, {"index": 1, "embedding": [0.5, 0.25]}],
+                                     usage=Usage(prompt_tokens=2, completion_tokens=0, total_tokens=2))
+    assert loads(dumps(response)) == json.loads(expected.model_dump_json())
+
+
+def test_endpoints_return_the_same_json_and_headers(client, fake_service, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_CACHE", True)
+    response_cache.clear()
+    body = {"model": "gpt-3.5-turbo", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+
+    miss = client.post("/api/v1/chat/completions", json=body)
+    hit = client.post("/api/v1/chat/completions", json=body)
+    assert miss.status_code == hit.status_code == 200
+    assert miss.headers["X-Provider"] == "openai" and miss.headers["content-type"] == "application/json"
+    assert (miss.headers["X-Cache"], hit.headers["X-Cache"]) == ("MISS", "HIT")
+    assert miss.content == hit.content and miss.json()["choices"][0]["message"]["content"] == "Hello!"
+    response_cache.clear()
+
+    monkeypatch.setattr(settings, "ENABLE_EMBEDDING_CACHE", True)
+    embedding_cache.clear()
+    response = client.post("/api/v1/embeddings", json={"model": "text-embedding-3-small", "input": ["a", "bb"]})
+    assert response.status_code == 200 and response.headers["X-Cache-Misses"] == "2"
+    assert [item["embedding"][0] for item in response.json()["data"]] == [1.0, 2.0]
+    assert "serialize;dur=" in response.headers["Server-Timing"]
+    embedding_cache.clear()
@@ -0,0 +1,42 @@
+import pytest
+from core.errors import InvalidRequestError, ServiceUnavailableError
+from core.models import Provider
+from services.service_factory import ServiceRegistry
+
+
+class DummyService:
+    instances = 0
+
+    def __init__(self):
+        DummyService.instances += 1
+
+
+class BrokenService:
+    def __init__(self):
+        raise ValueError("API key is not set")
+
+
+@pytest.fixture
+def registry():
+    DummyService.instances = 0
+    return ServiceRegistry({"openai": DummyService, "gemini": BrokenService})
+
+
+def test_service_is_built_once(registry):
+    service = registry.get("openai")
+    assert registry.get(Provider.OPENAI) is service
+    assert DummyService.instances == 1
+
+
+def test_misconfigured_provider_is_marked_unavailable(registry):
+    registry.warm_up()
+    assert registry.available_providers() == ["openai"]
+    assert registry.status()["gemini"] == {"available": False, "error": "API key is not set"}
+    with pytest.raises(ServiceUnavailableError) as exc_info:
+        registry.get("gemini")
+    assert exc_info.value.status_code == 503
+
+
+def test_unknown_provider(registry):
+    with pytest.raises(InvalidRequestError):
+        registry.get("cohere")
@@ -0,0 +1,87 @@
+import asyncio
+import concurrent.futures
+import pytest
+from core.singleflight import COALESCED, SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    before = COALESCED.labels("test").value
+    results = await asyncio.gather(*[flights.do("key", upstream, label="test") for _ in range(5)])
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert COALESCED.labels("test").value - before == 4
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_cancel_followers():
+    flights = SingleFlight()
+    started = asyncio.Event()
+
+    async def upstream():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "result"
+
+    leader = asyncio.create_task(flights.do("key", upstream))
+    await started.wait()
+    follower = asyncio.create_task(flights.do("key", upstream))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "result"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_every_caller_leaves():
+    flights = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def upstream():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.create_task(flights.do("key", upstream))
+    await asyncio.sleep(0.01)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_cached():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(flights.do("key", failing), flights.do("key", failing), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(flights) == 0
+
+
+def test_chat_endpoint_coalesces_identical_requests(client, fake_service):
+    fake_service.delay = 0.2
+    body = {"model": "gpt-3.5-turbo", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+    # Entering the client keeps one event loop for all requests, so they really overlap
+    with client, concurrent.futures.ThreadPoolExecutor(3) as pool:
+        responses = list(pool.map(lambda _: client.post("/api/v1/chat/completions", json=body), range(3)))
+    assert all(r.status_code == 200 for r in responses)
+    assert len(fake_service.chat_calls) == 1
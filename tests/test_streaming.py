@@ -0,0 +1,121 @@
+import asyncio
+import json
+import httpx
+import pytest
+from core.models import ChatCompletionRequest, Message, Role
+from core.streaming import buffered, prime, sse_events
+from services.gemini_service import GeminiService
+from services.openai_service import OpenAIService
+
+
+def chat_request(model: str) -> ChatCompletionRequest:
+    return ChatCompletionRequest(
+        model=model,
+        stream=True,
+        messages=[
+            Message(role=Role.SYSTEM, content="Be brief."),
+            Message(role=Role.USER, content="Say hello!"),
+        ]
+    )
+
+
+def sse_body(events) -> bytes:
+    return "".join(f"data: {json.dumps(e) if not isinstance(e, str) else e}\n\n" for e in events).encode()
+
+
+@pytest.mark.asyncio
+async def test_openai_stream_relays_chunks(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    events = [
+        {"id": "c1", "created": 1, "model": "gpt-3.5-turbo",
+         "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Hel"}, "finish_reason": None}]},
+        {"id": "c1", "created": 1, "model": "gpt-3.5-turbo",
+         "choices": [{"index": 0, "delta": {"content": "lo"}, "finish_reason": "stop"}]},
+        "[DONE]",
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=sse_body(events), headers={"Content-Type": "text/event-stream"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        service = OpenAIService(client=client)
+        chunks = [c async for c in service.stream_chat_completion(chat_request("gpt-3.5-turbo"))]
+
+    assert [c.choices[0].delta.content for c in chunks] == ["Hel", "lo"]
+    assert chunks[-1].choices[0].finish_reason == "stop"
+    assert all(c.object == "chat.completion.chunk" and c.provider == "openai" for c in chunks)
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_maps_to_chunk_schema(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    events = [
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": "Hi"}]}}]},
+        {"candidates": [{"content": {"role": "model", "parts": [{"text": " there"}]}, "finishReason": "MAX_TOKENS"}]},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith("/models/gemini-2.0-flash-lite:streamGenerateContent")
+        body = json.loads(request.content)
+        assert body["systemInstruction"] == {"parts": [{"text": "Be brief."}]}
+        assert body["contents"] == [{"role": "user", "parts": [{"text": "Say hello!"}]}]
+        return httpx.Response(200, content=sse_body(events), headers={"Content-Type": "text/event-stream"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        service = GeminiService(client=client)
+        chunks = [c async for c in service.stream_chat_completion(chat_request("gemini-2.0-flash-lite"))]
+
+    assert chunks[0].choices[0].delta.role == Role.ASSISTANT
+    assert chunks[1].choices[0].delta.role is None
+    assert "".join(c.choices[0].delta.content for c in chunks) == "Hi there"
+    assert chunks[-1].choices[0].finish_reason == "length"
+
+
+@pytest.mark.asyncio
+async def test_buffered_applies_backpressure_and_closes_source():
+    produced = []
+    closed = asyncio.Event()
+
+    async def source():
+        try:
+            for i in range(100):
+                produced.append(i)
+                yield i
+        finally:
+            closed.set()
+
+    stream = buffered(source(), maxsize=4)
+    assert await stream.__anext__() == 0
+    await asyncio.sleep(0.01)
+    # One item consumed, at most `maxsize` queued plus one blocked in put()
+    assert len(produced) <= 6
+
+    await stream.aclose()
+    await asyncio.wait_for(closed.wait(), 1)
+    assert len(produced) < 100
+
+
+@pytest.mark.asyncio
+async def test_prime_surfaces_errors_before_first_chunk():
+    async def failing():
+        raise httpx.ConnectError("boom")
+        yield
+
+    with pytest.raises(httpx.ConnectError):
+        await prime(buffered(failing(), maxsize=4))
+
+
+@pytest.mark.asyncio
+async def test_sse_events_terminates_with_done(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    async def chunks():
+        yield OpenAIService().convert_response(
+            {"id": "c1", "created": 1, "model": "m", "choices": [{"index": 0, "delta": {"content": "x"}}]},
+            request_type="chunk"
+        )
+
+    events = [e async for e in sse_events(chunks())]
+    assert json.loads(events[0][len("data: "):])["choices"][0]["delta"] == {"content": "x"}
+    assert events[-1] == "data: [DONE]\n\n"
@@ -0,0 +1,82 @@
+import base64
+import random
+from core.models import Message, Role
+from core.tokenizer import CL100K_PATTERN, TOKENS_PER_MESSAGE, TOKENS_PER_REPLY, BPEEncoding, TokenCounter
+
+
+def byte_vocab(*merges: bytes):
+    ranks = {bytes([i]): i for i in range(256)}
+    for merge in merges:
+        ranks[merge] = len(ranks)
+    return ranks
+
+
+def write_vocab(directory, name, ranks):
+    lines = [f"{base64.b64encode(token).decode()} {rank}" for token, rank in ranks.items()]
+    (directory / f"{name}.tiktoken").write_text("\n".join(lines) + "\n")
+
+
+def test_bpe_merges_lowest_rank_pairs_first():
+    encoding = BPEEncoding("test", byte_vocab(b"he", b"ll", b"hell", b"hello", b" w"), CL100K_PATTERN)
+    assert encoding.count("hello") == 1
+    assert encoding.count("help") == 3  # "he" + "l" + "p"
+    assert encoding.count("hello world") == 6  # "hello", " w", "o", "r", "l", "d"
+
+
+def test_counter_loads_vocab_once_and_caches_counts(tmp_path):
+    write_vocab(tmp_path, "cl100k_base", byte_vocab(b"hi", b" there"))
+    counter = TokenCounter(str(tmp_path), cache_size=16)
+
+    assert counter.count("hi there", "gpt-4") == 2
+    assert counter.count_many(["hi there", "hi"], "gpt-3.5-turbo") == [2, 1]
+    assert counter.cache_info().hits == 1
+    assert counter.cache_info().misses == 2
+
+
+def test_count_messages_includes_chat_framing(tmp_path):
+    write_vocab(tmp_path, "cl100k_base", byte_vocab(b"us", b"er", b"user", b"hi"))
+    counter = TokenCounter(str(tmp_path), cache_size=16)
+    messages = [Message(role=Role.USER, content="hi"), Message(role=Role.USER, content="hi", name="bo")]
+
+    assert counter.message_counts(messages, "gpt-4") == [TOKENS_PER_MESSAGE + 2, TOKENS_PER_MESSAGE + 2 + 1 + 2]
+    assert counter.count_messages(messages, "gpt-4") == 2 * TOKENS_PER_MESSAGE + 7 + TOKENS_PER_REPLY
+
+
+def test_model_encodings_and_estimate_fallback(tmp_path):
+    counter = TokenCounter(str(tmp_path), cache_size=16)
+    assert counter.encoding_for_model("gpt-4o-mini") == "o200k_base"
+    assert counter.encoding_for_model("gpt-4-turbo") == "cl100k_base"
+    assert counter.encoding_for_model("gemini-2.0-flash-lite") == "cl100k_base"
+    # No vocabulary files: an integer estimate rather than a float
+    assert counter.count("one two three four five six seven eight nine ten") == 13
+
+
+def test_heap_merge_matches_pairwise_rescans():
+    def rescan(ranks, data):
+        parts = [data[i:i + 1] for i in range(len(data))]
+        while True:
+            pairs = [(ranks[a + b], i) for i, (a, b) in enumerate(zip(parts, parts[1:])) if a + b in ranks]
+            if not pairs:
+                return parts
+            _, i = min(pairs)
+            parts[i:i + 2] = [parts[i] + parts[i + 1]]
+
+    vocab = byte_vocab(b"ab", b"ba", b"aa", b"aba", b"abab", b"bb", b"aab", b"baba")
+    encoding = BPEEncoding("test", vocab, CL100K_PATTERN)
+    rng = random.Random(7)
+    for _ in range(200):
+        data = bytes(rng.choice(b"ab") for _ in range(rng.randint(1, 40)))
+        assert encoding._merge(data) == rescan(encoding.ranks, data)
+    # A long unbroken piece, e.g. base64, stays fast
+    assert len(encoding._merge(b"ab" * 50000)) == 25000
+
+
+def test_count_cache_does_not_keep_texts(tmp_path):
+    counter = TokenCounter(str(tmp_path), cache_size=2)
+    long_text = "word " * 1000
+    assert counter.count(long_text) == counter.count(long_text) == 1300
+    assert all(isinstance(key, int) for key in {**counter._recent, **counter._older})
+    for text in "abcdef":
+        counter.count(text)
+    assert counter.cache_info().hits == 1 and counter.cache_info().misses == 7
+    assert counter.cache_info().currsize <= 2
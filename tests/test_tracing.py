@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+import pytest
+from config import settings
+from core.profiler import SlowRequestProfiler
+from core.tracing import StageTrace, current_trace, stage
+
+BODY = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def timings(header):
+    return {name: float(dur.split("=")[1]) for name, dur in (part.split(";") for part in header.split(", "))}
+
+
+def test_server_timing_breaks_down_the_request(client, fake_service):
+    fake_service.delay = 0.05
+    response = client.post("/api/v1/chat/completions", json=BODY)
+    assert response.status_code == 200
+    stages = timings(response.headers["Server-Timing"])
+    assert list(stages)[0] == "parse" and list(stages)[-2:] == ["serialize", "total"]
+    assert {"handler", "queue", "upstream"} <= set(stages)
+    assert stages["upstream"] >= 50
+    # Stages are exclusive, so they add up to no more than the total
+    assert sum(stages.values()) - stages["total"] <= stages["total"] + 0.01
+
+
+def test_nested_stages_record_only_their_own_time():
+    trace = StageTrace()
+    token = current_trace.set(trace)
+    try:
+        with stage("outer"):
+            time.sleep(0.02)
+            with stage("inner"):
+                time.sleep(0.03)
+            with stage("inner"):
+                time.sleep(0.01)
+    finally:
+        current_trace.reset(token)
+    assert 0.04 <= trace.stages["inner"] < 0.06
+    assert 0.02 <= trace.stages["outer"] < 0.035
+
+
+def test_stage_timings_are_logged_as_fields(client, fake_service, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "STAGE_TIMING_LOG_ENABLED", True)
+    with caplog.at_level(logging.INFO, logger="llm_gateway"):
+        client.post("/api/v1/chat/completions", json=BODY)
+    record = next(r for r in caplog.records if hasattr(r, "stages"))
+    assert record.status_code == 200 and "upstream" in record.stages
+
+
+@pytest.mark.asyncio
+async def test_profiler_keeps_the_slowest_requests_of_the_minute(tmp_path):
+    profiler = SlowRequestProfiler(enabled=True, directory=str(tmp_path), slowest_per_minute=2, interval=0.002)
+    profiler.start()
+
+    async def waiting_upstream(seconds):
+        await asyncio.sleep(seconds)
+
+    async def request(label, seconds):
+        profile = profiler.track(label)
+        started = time.perf_counter()
+        await waiting_upstream(seconds)
+        # Busy on the loop for a while too, so running frames get sampled
+        while time.perf_counter() - started < seconds * 2:
+            pass
+        profiler.finish(profile, time.perf_counter() - started)
+
+    try:
+        for label, seconds in [("GET /a", 0.03), ("GET /b", 0.01), ("GET /c", 0.05)]:
+            await asyncio.ensure_future(request(label, seconds))
+    finally:
+        profiler.stop()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert len(files) == 2 and not any("GET_b" in name for name in files)
+    folded = next(tmp_path.glob("*GET_c*")).read_text()
+    # Suspended samples follow the await chain down to what it waits on
+    assert "<locals>.waiting_upstream (test_tracing.py" in folded and ";sleep (tasks.py" in folded
+    stack, count = folded.splitlines()[0].rsplit(" ", 1)
+    assert stack.startswith("test_profiler_keeps_the_slowest_requests_of_the_minute.<locals>.request") and int(count) > 0
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+import pytest
+from config import settings
+from core.errors import InvalidRequestError
+from core.models import ModelInfo, Provider, Usage
+from core.usage import JSONLUsageSink, SQLiteUsageSink, UsageRecord, UsageTracker, usage_tracker
+from services.model_catalog import model_catalog
+
+
+def make_record(user="alice", tokens=10, timestamp=None, status_code=200):
+    return UsageRecord(
+        timestamp=timestamp or time.time(), endpoint="chat", provider="openai", model="gpt-3.5-turbo", user=user,
+        cache="miss", prompt_tokens=tokens, completion_tokens=1, total_tokens=tokens + 1, latency_ms=5.0,
+        status_code=status_code
+    )
+
+
+@pytest.mark.asyncio
+async def test_flush_rolls_up_per_minute_in_memory():
+    tracker = UsageTracker(True, buffer_size=100, flush_interval=1, batch_size=2, retention_minutes=60)
+    for record in [make_record(), make_record(), make_record(status_code=500), make_record(user="bob")]:
+        tracker.push(record)
+    await tracker.flush()
+
+    rows = await tracker.query(0, time.time() + 60, user="alice")
+    assert len(rows) == 1
+    assert rows[0]["requests"] == 3
+    assert rows[0]["prompt_tokens"] == 30
+    assert rows[0]["errors"] == 1
+    assert tracker.stats()["buffered"] == 0
+
+
+def test_ring_buffer_drops_oldest_when_full():
+    tracker = UsageTracker(True, buffer_size=2, flush_interval=1, batch_size=10, retention_minutes=60)
+    for tokens in [1, 2, 3]:
+        tracker.push(make_record(tokens=tokens))
+    assert tracker.stats()["dropped"] == 1
+    assert [r.prompt_tokens for r in tracker._buffer] == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sink_upserts_rollups_across_batches(tmp_path):
+    sink = SQLiteUsageSink(str(tmp_path / "usage.db"))
+    tracker = UsageTracker(True, buffer_size=100, flush_interval=1, batch_size=1, retention_minutes=60, sink=sink)
+    minute = time.time() // 60 * 60
+    tracker.push(make_record(timestamp=minute + 1))
+    tracker.push(make_record(timestamp=minute + 2))
+    await tracker.flush()
+
+    rows = await tracker.query(minute, minute + 60, provider="openai")
+    assert [(row["requests"], row["total_tokens"]) for row in rows] == [(2, 22)]
+    assert tracker.stats()["written"] == 2
+    sink.close()
+
+
+def test_jsonl_sink_rotates_files(tmp_path):
+    sink = JSONLUsageSink(str(tmp_path), max_bytes=1, backups=2)
+    for _ in range(4):
+        sink.write([make_record()], {})
+    files = sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("usage.jsonl"))
+    assert files == ["usage.jsonl", "usage.jsonl.1", "usage.jsonl.2"]
+    assert json.loads((tmp_path / "usage.jsonl").read_text())["user"] == "alice"
+
+
+def test_usage_endpoint_reports_chat_and_embedding_usage(client, fake_service):
+    user = f"usage-test-{time.time()}"
+    chat = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}], "user": user}
+    assert client.post("/api/v1/chat/completions", json=chat).status_code == 200
+    embeddings = {"model": "text-embedding-3-small", "input": ["a b", "c"], "user": user}
+    assert client.post("/api/v1/embeddings", json=embeddings).status_code == 200
+    asyncio.run(usage_tracker.flush())
+
+    body = client.get("/api/v1/usage", params={"user": user}).json()
+    assert body["totals"]["requests"] == 2
+    assert body["totals"]["total_tokens"] == 5 + 3
+    assert {row["endpoint"] for row in body["rollups"]} == {"chat", "embeddings"}
+    assert all(row["latency_ms_sum"] > 0 for row in body["rollups"])
+
+
+def test_failed_requests_are_recorded_as_errors(client, fake_service, monkeypatch):
+    async def fail(request):
+        raise InvalidRequestError("rejected upstream")
+    monkeypatch.setattr(fake_service, "get_chat_completion", fail)
+    monkeypatch.setattr(settings, "VALIDATE_MODELS", False)
+    listed, unlisted = f"usage-failure-{time.time()}", f"bogus-{time.time()}"
+    monkeypatch.setattr(model_catalog, "_models", {"openai": {
+        listed: ModelInfo(id=listed, name=listed, provider=Provider.OPENAI)}})
+    for model in (listed, unlisted):
+        chat = {"model": model, "messages": [{"role": "user", "content": "hi"}]}
+        assert client.post("/api/v1/chat/completions", json=chat).status_code == 400
+    assert client.post("/api/v1/chat/completions", json={"messages": []}).status_code == 422
+    asyncio.run(usage_tracker.flush())
+
+    rows = client.get("/api/v1/usage", params={"model": listed}).json()["rollups"]
+    assert [(row["endpoint"], row["provider"], row["requests"], row["errors"]) for row in rows] == [
+        ("chat", "openai", 1, 1)]
+    # Models the catalogue does not list never become labels or rollup keys
+    assert client.get("/api/v1/usage", params={"model": unlisted}).json()["rollups"] == []
+    assert unlisted not in client.get("/metrics").text
+    unlabelled = client.get("/api/v1/usage", params={"model": "unknown", "endpoint": "chat"}).json()["totals"]
+    assert unlabelled["errors"] >= 2